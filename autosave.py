@@ -0,0 +1,115 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from file_utils import content_hash, atomic_write_text
+from tracing import span
+
+
+class AutoSaver(QObject):
+    """延迟合并写入的自动保存引擎
+
+    编辑时只记录“哪个片段脏了”，空闲 interval_ms 毫秒后才在 GUI 线程取一次快照，
+    再交给后台线程写盘。内容哈希未变化时跳过写入。
+    设置了 backup 时写盘后立即在后台线程记入备份的变更日志，不必等 saved 信号到达界面线程
+    （关闭窗口时 shutdown() 返回后马上就要提交最后的备份）。
+    """
+    saved = Signal(str, str)          # project_path, filename
+    save_failed = Signal(str, str)    # file_path, error
+
+    def __init__(self, metadata_store, interval_ms=500, parent=None):
+        super().__init__(parent)
+        self.metadata_store = metadata_store
+        # GitBackup 或 None，可以随时替换
+        self.backup = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._submit_pending)
+
+        # (project_path, filename) -> 获取 (text, tags, code_type) 的回调
+        self._pending = {}
+        # 单线程执行器保证同一文件的写入顺序
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+        self._last_future = None
+        self._lock = threading.Lock()
+        # file_path -> 已落盘内容的哈希
+        self._clean_hashes = {}
+
+    def set_interval(self, interval_ms):
+        self._timer.setInterval(interval_ms)
+
+    def mark_clean(self, file_path, text):
+        """记录刚从磁盘读入的内容，后续内容未变时不再写入"""
+        with self._lock:
+            self._clean_hashes[file_path] = content_hash(text)
+
+    def is_clean(self, file_path, text):
+        """text 是否与最近一次读入或写入的内容相同"""
+        with self._lock:
+            return self._clean_hashes.get(file_path) == content_hash(text)
+
+    def schedule(self, project_path, filename, snapshot):
+        """标记片段为脏，重新开始空闲计时"""
+        self._pending[(project_path, filename)] = snapshot
+        self._timer.start()
+
+    def has_pending(self):
+        return bool(self._pending)
+
+    def flush(self, wait=True):
+        """立即提交所有待保存内容，wait 为 True 时阻塞到写盘完成"""
+        self._timer.stop()
+        self._submit_pending()
+        if wait and self._last_future is not None:
+            self._last_future.result()
+
+    def shutdown(self):
+        self.flush(wait=True)
+        self._executor.shutdown(wait=True)
+
+    def _submit_pending(self):
+        pending, self._pending = self._pending, {}
+        for (project_path, filename), snapshot in pending.items():
+            text, tags, code_type = snapshot()
+            self._last_future = self._executor.submit(
+                self._write, project_path, filename, text, tags, code_type
+            )
+
+    def _write(self, project_path, filename, text, tags, code_type):
+        # 后台线程执行
+        with span("autosave", file=filename):
+            self._save(project_path, filename, text, tags, code_type)
+
+    def _save(self, project_path, filename, text, tags, code_type):
+        # text 为 None 时只保存元数据（如只读预览中的文件）
+        file_path = os.path.join(project_path, filename)
+        changed = False
+        if text is not None:
+            digest = content_hash(text)
+            with self._lock:
+                clean = self._clean_hashes.get(file_path) == digest
+        if text is not None and not clean:
+            try:
+                atomic_write_text(file_path, text)
+            except Exception as e:
+                self.save_failed.emit(file_path, str(e))
+                return
+            with self._lock:
+                self._clean_hashes[file_path] = digest
+            changed = True
+
+        try:
+            if self.metadata_store.set_snippet(project_path, filename, tags, code_type):
+                changed = True
+        except Exception as e:
+            self.save_failed.emit(self.metadata_store.metadata_path(project_path), str(e))
+            return
+
+        if changed:
+            backup = self.backup
+            if backup is not None:
+                backup.record_snippet(project_path, filename)
+            self.saved.emit(project_path, filename)
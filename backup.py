@@ -0,0 +1,234 @@
+import os
+import time
+import shutil
+import argparse
+import threading
+import subprocess
+
+from file_utils import internal_path, is_internal_name, METADATA_FILENAME, METADATA_JOURNAL_FILENAME
+
+# 备份提交使用的身份
+BACKUP_AUTHOR = ("CodeCapsule Backup", "backup@codecapsule.local")
+# 远程仓库中备份所在的分支
+BACKUP_BRANCH = "main"
+# 提交说明中最多列出的文件数
+MESSAGE_FILES = 20
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+class GitBackup:
+    """把主文件夹增量备份到本地 git 仓库（.codecapsule/backup.git），可推送到远程仓库（如本地的裸仓库）
+
+    不扫描整个主文件夹：保存、外部修改、导入等操作通过 record() 把变化的路径记入变更日志，
+    commit() 只对这些路径执行 git update-index，再用 write-tree/commit-tree 生成提交，
+    未变化的子树直接沿用索引中缓存的树对象；开启 core.splitIndex 后每次只写入很小的增量索引。
+    单次编辑后的备份耗时与主文件夹的大小基本无关。
+    变更日志同时追加到 .codecapsule/backup_journal，程序意外退出后下次提交时仍会备份这些路径。
+    只有第一次备份（仓库还没有提交）时才对整个主文件夹执行 git add -A。
+    """
+
+    def __init__(self, code_dir, remote=None):
+        if shutil.which("git") is None:
+            raise BackupError("没有找到 git 命令")
+        self.code_dir = os.path.abspath(str(code_dir))
+        self.git_dir = internal_path(self.code_dir, "backup.git")
+        self.journal_path = internal_path(self.code_dir, "backup_journal")
+        self.remote = remote
+        # 尚未提交的相对路径（文件或项目目录）
+        self._pending = set()
+        self._lock = threading.Lock()
+        # 同一时间只有一个提交或推送在进行
+        self._git_lock = threading.Lock()
+        self._load_journal()
+
+    # ---- 变更日志 ----
+    def record(self, paths):
+        """记录发生变化的路径（绝对路径或相对于主文件夹的路径，文件或项目目录均可），可在任意线程调用"""
+        rows = []
+        for path in paths:
+            rel = os.path.relpath(os.path.join(self.code_dir, str(path)), self.code_dir)
+            if rel.startswith(os.pardir) or rel == os.curdir or is_internal_name(rel.split(os.sep, 1)[0]):
+                continue
+            rows.append(rel.replace(os.sep, "/"))
+        if not rows:
+            return
+        with self._lock:
+            new = [row for row in rows if row not in self._pending]
+            self._pending.update(new)
+            if new:
+                self._append_journal(new)
+
+    def record_snippet(self, project_path, filename):
+        """片段内容和元数据都可能变化"""
+        self.record([os.path.join(project_path, name) for name in (filename, METADATA_FILENAME, METADATA_JOURNAL_FILENAME)])
+
+    def has_pending(self):
+        return bool(self._pending)
+
+    def _load_journal(self):
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                self._pending = {line.rstrip("\n") for line in f if line.strip()}
+        except FileNotFoundError:
+            pass
+
+    def _append_journal(self, rows):
+        try:
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write("".join(row + "\n" for row in rows))
+        except OSError as e:
+            print(f"写入备份日志失败: {e}")
+
+    def _rewrite_journal(self):
+        # 调用时已持有 self._lock
+        try:
+            if self._pending:
+                with open(self.journal_path, 'w', encoding='utf-8') as f:
+                    f.write("".join(row + "\n" for row in sorted(self._pending)))
+            elif os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+        except OSError as e:
+            print(f"写入备份日志失败: {e}")
+
+    # ---- git ----
+    def _git(self, *args, input=None):
+        result = subprocess.run(
+            ["git", f"--git-dir={self.git_dir}", f"--work-tree={self.code_dir}", *args],
+            cwd=self.code_dir, input=input, capture_output=True,
+        )
+        if result.returncode != 0:
+            raise BackupError(f"git {args[0]} 失败: {result.stderr.decode('utf-8', errors='replace').strip()}")
+        return result.stdout.decode('utf-8', errors='replace').strip()
+
+    def _head(self):
+        try:
+            return self._git("rev-parse", "--verify", "--quiet", "HEAD")
+        except BackupError:
+            return None
+
+    def _ensure_repo(self):
+        if os.path.isdir(self.git_dir):
+            return
+        os.makedirs(self.git_dir)
+        self._git("init", "--quiet", f"--initial-branch={BACKUP_BRANCH}")
+        name, email = BACKUP_AUTHOR
+        for key, value in (("user.name", name), ("user.email", email), ("core.splitIndex", "true"),
+                           ("commit.gpgsign", "false"), ("core.quotePath", "false")):
+            self._git("config", key, value)
+        # 程序内部文件（索引、快照、备份仓库本身）和项目中的子目录（不是片段）不备份
+        with open(os.path.join(self.git_dir, "info", "exclude"), 'a', encoding='utf-8') as f:
+            f.write(".codecapsule*\n/*/*/\n")
+
+    def _expand(self, paths):
+        """把变更日志中的路径分成要加入/更新的文件和已删除的路径"""
+        files, removed = [], []
+        for rel in paths:
+            full = os.path.join(self.code_dir, rel)
+            if os.path.isdir(full):
+                # 新增的项目或导入的文件夹：只列出这一个目录
+                with os.scandir(full) as it:
+                    files.extend(f"{rel}/{entry.name}" for entry in it
+                                 if not is_internal_name(entry.name) and entry.is_file())
+                # 目录中已删除的文件
+                removed.append(rel)
+            elif os.path.isfile(full):
+                files.append(rel)
+            else:
+                removed.append(rel)
+        return files, removed
+
+    def commit(self, message=None):
+        """把变更日志中的路径提交为一个备份提交，返回提交的哈希；没有变化时返回 None"""
+        with self._git_lock:
+            with self._lock:
+                paths, self._pending = self._pending, set()
+            try:
+                return self._commit(paths, message)
+            except (BackupError, OSError):
+                # 失败的路径放回去，下次再试
+                with self._lock:
+                    self._pending |= paths
+                raise
+            finally:
+                with self._lock:
+                    self._rewrite_journal()
+
+    def _commit(self, paths, message):
+        self._ensure_repo()
+        head = self._head()
+        if head is None:
+            # 第一次备份：整个主文件夹
+            self._git("add", "--all", ".")
+            return self._commit_index(None, message or f"首次备份 {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        if not paths:
+            return None
+        files, removed = self._expand(sorted(paths))
+        if removed:
+            # 从索引中删除已不存在的文件和目录（目录下仍存在的文件随后重新加入）
+            self._git("rm", "-r", "-f", "--cached", "--quiet", "--ignore-unmatch", "--", *removed)
+        if files:
+            self._git("update-index", "--add", "--remove", "-z", "--stdin",
+                      input="".join(path + "\0" for path in files).encode('utf-8'))
+        changed = sorted(paths)
+        if message is None:
+            shown = "\n".join(changed[:MESSAGE_FILES])
+            more = f"\n… 等 {len(changed)} 项" if len(changed) > MESSAGE_FILES else ""
+            message = f"备份 {time.strftime('%Y-%m-%d %H:%M:%S')}：{len(changed)} 项变化\n\n{shown}{more}\n"
+        return self._commit_index(head, message)
+
+    def _commit_index(self, head, message):
+        """把当前索引提交到 HEAD 之上；与 HEAD 的树相同时不提交"""
+        # write-tree 只重新计算索引中失效的子树
+        tree = self._git("write-tree")
+        if head is not None and tree == self._git("rev-parse", f"{head}^{{tree}}"):
+            return None
+        commit = self._git("commit-tree", tree, *(["-p", head] if head is not None else []), "-m", message)
+        self._git("update-ref", "HEAD", commit, *([head] if head is not None else []))
+        return commit
+
+    def full_commit(self, message=None):
+        """不依赖变更日志，对整个主文件夹执行 git add -A 后提交（用于修复备份）"""
+        with self._git_lock:
+            self._ensure_repo()
+            self._git("add", "--all", ".")
+            with self._lock:
+                self._pending.clear()
+                self._rewrite_journal()
+            return self._commit_index(self._head(), message or f"完整备份 {time.strftime('%Y-%m-%d %H:%M:%S')}")
+
+    def push(self):
+        """把备份推送到远程仓库；远程是还不存在的本地路径时先创建裸仓库"""
+        if not self.remote:
+            return False
+        with self._git_lock:
+            if self._head() is None:
+                return False
+            if os.path.isabs(self.remote) and not os.path.exists(self.remote):
+                subprocess.run(["git", "init", "--bare", "--quiet", f"--initial-branch={BACKUP_BRANCH}", self.remote],
+                               capture_output=True, check=True)
+            self._git("push", "--quiet", self.remote, f"HEAD:refs/heads/{BACKUP_BRANCH}")
+        return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把主文件夹备份到本地 git 仓库（.codecapsule/backup.git）")
+    parser.add_argument("--code-dir", default=os.path.join(os.getcwd(), "code_dir"))
+    parser.add_argument("--remote", help="推送到这个远程仓库（URL 或本地路径，不存在的本地路径会创建为裸仓库）")
+    parser.add_argument("--full", action="store_true", help="扫描整个主文件夹，而不只是变更日志中的路径")
+    parser.add_argument("paths", nargs="*", help="额外记入变更日志的路径")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        backup = GitBackup(args.code_dir, args.remote)
+        backup.record(args.paths)
+        commit = backup.full_commit() if args.full else backup.commit()
+        pushed = backup.push()
+    except BackupError as e:
+        parser.exit(1, f"{e}\n")
+    print(f"{'提交 ' + commit[:12] if commit else '没有变化'}{'，已推送' if pushed else ''}，"
+          f"用时 {(time.perf_counter() - started) * 1000:.0f} ms")
@@ -0,0 +1,272 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 基准测试总在无窗口的 offscreen 平台上运行，结果不受窗口管理器影响
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6 import __version__ as PYSIDE_VERSION
+from PySide6.QtCore import QEventLoop, QTimer, QSettings, qVersion
+from PySide6.QtWidgets import QApplication
+
+import main
+from main import CodeCapsule
+from library import WORDS, generate_library, tag_pool
+
+# 比基线慢这么多（比例）时视为退化
+REGRESSION_THRESHOLD = 0.2
+# 测量时使用的设置，不读取开发者本机的设置；卡顿看门狗和备份会在测量期间占用时间，关闭
+BENCHMARK_SETTINGS = {
+    "storage_backend": "json",
+    "autosave_interval_ms": 500,
+    "stall_threshold_ms": 0,
+    "backup_enabled": "false",
+}
+
+
+def isolate_settings(path, values=BENCHMARK_SETTINGS):
+    """让 CodeCapsule 从临时的 ini 文件 path 读写设置，其中只有 values；返回实际生效的设置"""
+    main.SETTINGS_LOCATION = (path, QSettings.IniFormat)
+    settings = main.app_settings()
+    settings.clear()
+    for key, value in values.items():
+        settings.setValue(key, value)
+    settings.sync()
+    return {key: settings.value(key) for key in settings.allKeys()}
+
+
+def summarize(samples):
+    """毫秒数的统计：中位数、p95、最小值、最大值"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+    return {"median": statistics.median(ordered), "p95": p95, "min": ordered[0], "max": ordered[-1], "runs": len(ordered)}
+
+
+def wait_for(signal, trigger, predicate=lambda *args: True, timeout_ms=120000):
+    """调用 trigger 后运行事件循环，直到 signal 发出且 predicate(*args) 为真，返回耗时（毫秒）"""
+    loop = QEventLoop()
+    finished = []
+
+    def on_signal(*args):
+        if predicate(*args):
+            finished.append(time.perf_counter())
+            loop.quit()
+
+    signal.connect(on_signal)
+    QTimer.singleShot(timeout_ms, loop.quit)
+    started = time.perf_counter()
+    try:
+        trigger()
+        if not finished:
+            loop.exec()
+    finally:
+        signal.disconnect(on_signal)
+    if not finished:
+        raise TimeoutError(f"等待信号超时（{timeout_ms} ms）")
+    return (finished[0] - started) * 1000
+
+
+def timed(func, *args):
+    """同步调用 func，并处理它排入事件队列的工作（如重绘、排队的信号），返回耗时（毫秒）"""
+    started = time.perf_counter()
+    func(*args)
+    QApplication.processEvents()
+    return (time.perf_counter() - started) * 1000
+
+
+class HotPathBenchmark:
+    """在一个真实的 CodeCapsule 窗口上测量常用操作的耗时"""
+
+    def __init__(self, app, code_dir, runs=20, seed=0):
+        self.app = app
+        self.code_dir = code_dir
+        self.runs = runs
+        self.rng = random.Random(seed)
+        self.window = CodeCapsule(code_dir)
+
+    def start(self):
+        """显示窗口，等到启动完成、首次深度扫描结束且索引加载完毕"""
+        window = self.window
+        window.show()
+        wait_for(window.scanner.finished, lambda: None,
+                 lambda generation, folders: generation == window.folder_bar._scan_generation)
+        if window.search_index is None:
+            wait_for(window.startup_finished, lambda: None)
+        # 索引线程只有一个线程，排在它后面的空任务完成时，索引已经载入并与磁盘同步
+        window.index_executor.submit(lambda: None).result()
+        QApplication.processEvents()
+        self.projects = sorted(window.scanner.projects)
+
+    def close(self):
+        self.window.close()
+
+    def run(self):
+        results = {}
+        for name, bench in (
+            ("update_folder_list", self.bench_update_folder_list),
+            ("update_folder_list_deep", self.bench_update_folder_list_deep),
+            ("update_snippet_list_switch", self.bench_update_snippet_list_switch),
+            ("update_snippet_list_refresh", self.bench_update_snippet_list_refresh),
+            ("on_snippet_clicked", self.bench_on_snippet_clicked),
+            ("save", self.bench_save),
+            ("search_global", lambda: self.bench_search(None)),
+            ("search_project", lambda: self.bench_search(self.window.current_project)),
+        ):
+            results[name] = summarize(bench())
+        return results
+
+    # ---- 各项基准 ----
+    def _scan(self, deep):
+        folder_bar = self.window.folder_bar
+        return wait_for(self.window.scanner.finished, lambda: folder_bar.update_folder_list(deep),
+                        lambda generation, folders: generation == folder_bar._scan_generation)
+
+    def bench_update_folder_list(self):
+        """重新扫描主文件夹，直到扫描完成、文件夹列表已更新"""
+        return [self._scan(False) for _ in range(self.runs)]
+
+    def bench_update_folder_list_deep(self):
+        """连同每个项目中的片段一起扫描（启动和切换主文件夹时的路径）"""
+        return [self._scan(True) for _ in range(max(1, self.runs // 4))]
+
+    def _open_project(self, project_path):
+        window = self.window
+        window.current_project = project_path
+        elapsed = []
+        # 只计 update_snippet_list 本身；之后等后台对该项目的重新扫描合并进列表，再开始下一次测量
+        wait_for(window.scanner.project_scanned, lambda: elapsed.append(timed(window.update_snippet_list)),
+                 lambda path, entries: path == project_path)
+        QApplication.processEvents()
+        return elapsed[0]
+
+    def bench_update_snippet_list_switch(self):
+        """在两个项目之间来回切换：载入列表并打开默认片段"""
+        first, second = self.projects[0], self.projects[len(self.projects) // 2]
+        if first == self.window.snippet_model.project_path:
+            # 第一次也必须是切换（同一项目只做增量刷新，不会重新扫描）
+            first, second = second, first
+        return [self._open_project(second if i % 2 else first) for i in range(self.runs)]
+
+    def bench_update_snippet_list_refresh(self):
+        """当前项目不变时的增量刷新"""
+        return [timed(self.window.update_snippet_list) for _ in range(self.runs)]
+
+    def bench_on_snippet_clicked(self):
+        """打开片段：读文件、载入编辑器并高亮可见区域"""
+        window = self.window
+        filenames = [entry.filename for entry in window.scanner.projects[window.current_project]]
+        return [timed(window.on_snippet_clicked, self.rng.choice(filenames)) for _ in range(self.runs)]
+
+    def bench_save(self):
+        """修改当前片段的内容和标签后立即保存：写文件、写 metadata.json，并处理 saved 信号"""
+        window = self.window
+        tags = tag_pool(10)
+        samples = []
+        for i in range(self.runs):
+            window.content_edit.appendPlainText(f"# edit {i}")
+            window.tags_edit.setText(", ".join(self.rng.sample(tags, 2)))
+            window.on_text_changed()
+            samples.append(timed(window.autosaver.flush))
+        return samples
+
+    def bench_search(self, project_path):
+        """对索引执行一次查询并显示结果"""
+        window = self.window
+        queries = [self.rng.choice(WORDS)[:self.rng.randint(2, 5)] for _ in range(self.runs)]
+        samples = [timed(window.run_search, query, project_path) for query in queries]
+        window.run_search("", project_path)
+        return samples
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """与基线结果逐项比较中位数，返回变慢超过 threshold 的项目名"""
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not before["median"]:
+            continue
+        change = stats["median"] / before["median"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  <- 变慢"
+        print(f"{name:30s} {before['median']:9.2f} -> {stats['median']:9.2f} ms ({change:+.0%}){flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在合成的主文件夹上测量文件夹列表、片段列表、打开片段、保存和搜索的耗时")
+    parser.add_argument("--code-dir", help="使用已有的主文件夹（复制到临时目录中测量，保存测试不会修改原文件）；"
+                                           "不指定时按下面的参数在临时目录中生成")
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--snippets", type=int, default=500, help="每个项目的片段数")
+    parser.add_argument("--min-size", type=int, default=200)
+    parser.add_argument("--max-size", type=int, default=4000)
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--tags-per-snippet", type=int, default=3)
+    parser.add_argument("--distribution", choices=("zipf", "uniform"), default="zipf")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=20, help="每项测量的次数")
+    parser.add_argument("--json", help="把结果写入这个 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果比较，有退化时退出码为 1")
+    args = parser.parse_args()
+
+    library = {key: getattr(args, key) for key in
+               ("projects", "snippets", "min_size", "max_size", "tags", "tags_per_snippet", "distribution", "seed")}
+    with tempfile.TemporaryDirectory(prefix="codecapsule-bench-") as tmp:
+        code_dir = os.path.join(tmp, "code_dir")
+        if args.code_dir is None:
+            started = time.perf_counter()
+            generate_library(code_dir, **library)
+            print(f"生成主文件夹 {args.projects} × {args.snippets}，用时 {time.perf_counter() - started:.1f}s")
+        else:
+            # 保存测试会给片段追加内容、修改标签，只在副本上进行；备份仓库用不到，不复制
+            library = {"code_dir": os.path.abspath(args.code_dir)}
+            started = time.perf_counter()
+            shutil.copytree(args.code_dir, code_dir, ignore=shutil.ignore_patterns("backup.git"))
+            print(f"复制主文件夹 {args.code_dir}，用时 {time.perf_counter() - started:.1f}s")
+
+        # 与直接运行 main.py 一样以仓库目录为工作目录（默认主文件夹、图标等都相对于它）
+        os.chdir(ROOT)
+        app = QApplication(sys.argv[:1])
+        settings = isolate_settings(os.path.join(tmp, "settings.ini"))
+        # 程序自身的诊断输出会干扰计时，测量期间不显示
+        with contextlib.redirect_stdout(io.StringIO()):
+            bench = HotPathBenchmark(app, code_dir, args.runs, args.seed)
+            bench.start()
+            results = bench.run()
+            bench.close()
+
+    for name, stats in results.items():
+        print(f"{name:30s} 中位数 {stats['median']:9.2f} ms  p95 {stats['p95']:9.2f} ms  "
+              f"({stats['min']:.2f}-{stats['max']:.2f}, {stats['runs']} 次)")
+    output = {
+        "library": library,
+        "settings": settings,
+        "environment": {"python": platform.python_version(), "qt": qVersion(), "pyside": PYSIDE_VERSION,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=1)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("library") != library:
+            print(f"注意：基线使用的主文件夹参数不同：{baseline.get('library')}")
+        if baseline.get("settings", settings) != settings:
+            print(f"注意：基线使用的设置不同：{baseline.get('settings')}")
+        if compare(results, baseline):
+            sys.exit(1)
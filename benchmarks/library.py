@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from metadata_store import MetadataStore
+from snippet_store import code_type_for
+
+# 生成的片段按这个比例使用各种扩展名
+EXTENSIONS = [(".py", 4), (".java", 2), (".sh", 2), (".txt", 1), (".js", 1)]
+# 片段内容从这些词中随机组合，搜索基准也从这里取查询词
+WORDS = (
+    "def class return import from while for if else try except with yield lambda "
+    "print value result buffer config request response handler client server cache "
+    "index query filter parse render update delete insert select token stream batch "
+    "worker thread signal event timer layout widget model view editor snippet project "
+    "你好 世界 配置 缓存 索引 查询"
+).split()
+
+
+def tag_pool(count):
+    return [f"tag{i:03d}" for i in range(count)]
+
+
+def pick_tags(rng, pool, weights, count):
+    """不重复地抽取 count 个标签；weights 为 None 时均匀分布"""
+    tags = []
+    while len(tags) < min(count, len(pool)):
+        tag = rng.choices(pool, weights)[0]
+        if tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def snippet_text(rng, size):
+    """生成大约 size 字节、按行排列的文本"""
+    lines = []
+    length = 0
+    while length < size:
+        indent = "    " * rng.randint(0, 2)
+        line = indent + " ".join(rng.choices(WORDS, k=rng.randint(3, 10)))
+        lines.append(line)
+        length += len(line.encode("utf-8")) + 1
+    return "\n".join(lines) + "\n"
+
+
+def generate_library(code_dir, projects=20, snippets=100, min_size=200, max_size=4000,
+                     tags=50, tags_per_snippet=3, distribution="zipf", seed=0):
+    """在 code_dir 下生成 projects 个项目，每个项目 snippets 个片段和对应的 metadata.json
+
+    目录结构与 setup_default_folder 写出的示例相同：code_dir/项目/片段文件 + metadata.json。
+    片段大小在 [min_size, max_size] 字节之间均匀分布；每个片段有 0 到 tags_per_snippet 个标签，
+    distribution 为 "zipf" 时少数标签出现得特别多（更接近真实的标签分布），为 "uniform" 时均匀分布。
+    相同的参数和 seed 总是生成相同的内容。
+    """
+    rng = random.Random(seed)
+    pool = tag_pool(tags)
+    weights = [1 / (rank + 1) for rank in range(len(pool))] if distribution == "zipf" else None
+    extensions = [ext for ext, weight in EXTENSIONS for _ in range(weight)]
+    metadata_store = MetadataStore()
+    os.makedirs(code_dir, exist_ok=True)
+    for p in range(projects):
+        project_path = os.path.join(code_dir, f"project{p:04d}")
+        os.makedirs(project_path, exist_ok=True)
+        metadata = {}
+        for s in range(snippets):
+            filename = f"snippet{s:05d}{rng.choice(extensions)}"
+            with open(os.path.join(project_path, filename), "w", encoding="utf-8") as f:
+                f.write(snippet_text(rng, rng.randint(min_size, max_size)))
+            metadata[filename] = {
+                "tags": pick_tags(rng, pool, weights, rng.randint(0, tags_per_snippet)),
+                "code_type": code_type_for(filename),
+            }
+        metadata_store.save(project_path, metadata)
+    return code_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成用于基准测试的主文件夹")
+    parser.add_argument("code_dir")
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--snippets", type=int, default=100, help="每个项目的片段数")
+    parser.add_argument("--min-size", type=int, default=200, help="片段最小字节数")
+    parser.add_argument("--max-size", type=int, default=4000, help="片段最大字节数")
+    parser.add_argument("--tags", type=int, default=50, help="标签总数")
+    parser.add_argument("--tags-per-snippet", type=int, default=3)
+    parser.add_argument("--distribution", choices=("zipf", "uniform"), default="zipf", help="标签的分布")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate_library(args.code_dir, args.projects, args.snippets, args.min_size, args.max_size,
+                     args.tags, args.tags_per_snippet, args.distribution, args.seed)
+    print(f"生成 {args.projects} 个项目 × {args.snippets} 个片段，用时 {time.perf_counter() - started:.1f}s")
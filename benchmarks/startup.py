@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from startup_snapshot import snapshot_path
+
+
+def run_once(code_dir, offscreen=False, timeout=120):
+    """启动一次 main.py --benchmark-startup，返回从创建进程起算的 (首次绘制, 可交互) 毫秒数"""
+    env = dict(os.environ)
+    if offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    spawned_at = time.time()
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "main.py"), "--code-dir", code_dir, "--benchmark-startup"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=timeout,
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            times = json.loads(line[len("STARTUP "):])
+            # 解释器启动和 import 之前的时间也算进去
+            offset = (times["main_started_at"] - spawned_at) * 1000
+            return times["first_paint"] + offset, times["interactive"] + offset
+    raise RuntimeError(f"没有得到启动耗时，退出码 {result.returncode}\n{result.stderr[-2000:]}")
+
+
+def summarize(samples):
+    return {"median": statistics.median(samples), "min": min(samples), "max": max(samples)}
+
+
+def benchmark(code_dir, runs=5, offscreen=False):
+    """分别测量没有快照（首次启动）和有快照时的启动耗时"""
+    code_dir = os.path.abspath(code_dir)
+    results = {}
+    for mode in ("cold", "snapshot"):
+        paint, interactive = [], []
+        if mode == "snapshot":
+            # 先正常启动退出一次，生成快照
+            run_once(code_dir, offscreen)
+        for _ in range(runs):
+            if mode == "cold":
+                try:
+                    os.remove(snapshot_path(code_dir))
+                except FileNotFoundError:
+                    pass
+            first_paint, ready = run_once(code_dir, offscreen)
+            paint.append(first_paint)
+            interactive.append(ready)
+        results[mode] = {"first_paint_ms": summarize(paint), "interactive_ms": summarize(interactive)}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="测量启动到首次绘制、可交互的耗时")
+    parser.add_argument("code_dir", help="用于测试的主文件夹")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--offscreen", action="store_true", help="不显示窗口（QT_QPA_PLATFORM=offscreen）")
+    parser.add_argument("--json", help="把结果写入这个 JSON 文件")
+    args = parser.parse_args()
+
+    results = benchmark(args.code_dir, args.runs, args.offscreen)
+    for mode, label in (("cold", "无快照"), ("snapshot", "有快照")):
+        paint = results[mode]["first_paint_ms"]
+        interactive = results[mode]["interactive_ms"]
+        print(f"{label}：首次绘制 {paint['median']:.0f} ms（{paint['min']:.0f}-{paint['max']:.0f}），"
+              f"可交互 {interactive['median']:.0f} ms（{interactive['min']:.0f}-{interactive['max']:.0f}）")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
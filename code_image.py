@@ -0,0 +1,178 @@
+import os
+import sys
+
+from PySide6.QtCore import Qt, QBuffer, QByteArray, QIODevice, QPointF, QRectF
+from PySide6.QtGui import QColor, QFont, QFontMetricsF, QGuiApplication, QImage, QPainter
+
+from syntax_lexers import get_lexer
+from syntax_highlight import FORMATS
+
+# 默认主题，配色与 md2img 的预览一致
+DEFAULT_THEME = {
+    "name": "light",
+    "background": "#F5F5F5",
+    "code_background": "#E0E0E0",
+    "text": "#1F1F1F",
+    "line_number": "#999999",
+    "font_family": "monospace",
+    "font_size": 13,
+    "padding": 20,
+    "code_padding": 12,
+    "radius": 6,
+    "tab_size": 4,
+    "max_lines": 400,
+}
+# QImage.save 的 PNG 质量参数：越高压缩越少、编码越快，文件稍大
+PNG_QUALITY = 80
+
+
+def theme_key(theme=None):
+    """参与渲染缓存键的主题信息，不需要创建 QGuiApplication"""
+    theme = dict(DEFAULT_THEME, **(theme or {}))
+    return "native:" + ",".join(f"{name}={theme[name]}" for name in sorted(theme))
+
+
+def ensure_gui_app():
+    """QPainter 绘制文字需要 QGuiApplication；命令行或子进程中没有时以 offscreen 方式创建"""
+    app = QGuiApplication.instance()
+    if app is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        app = QGuiApplication(sys.argv[:1])
+    return app
+
+
+class CodeImageRenderer:
+    """用 QPainter 把代码片段直接画到 QImage 上：等宽字体、行号、内边距和语法高亮
+
+    字体和字体度量在构造时创建一次，之后每次渲染复用，不依赖外部程序。
+    """
+
+    def __init__(self, theme=None):
+        ensure_gui_app()
+        self.theme = dict(DEFAULT_THEME, **(theme or {}))
+        base = QFont(self.theme["font_family"])
+        base.setStyleHint(QFont.TypeWriter)
+        base.setFixedPitch(True)
+        base.setPixelSize(self.theme["font_size"])
+        # (粗体, 斜体) -> (QFont, QFontMetricsF)
+        self._fonts = {}
+        for bold in (False, True):
+            for italic in (False, True):
+                font = QFont(base)
+                font.setBold(bold)
+                font.setItalic(italic)
+                self._fonts[bold, italic] = (font, QFontMetricsF(font))
+        self._metrics = self._fonts[False, False][1]
+        self._line_height = self._metrics.lineSpacing()
+        self._colors = {key: QColor(self.theme[key]) for key in ("background", "code_background", "text", "line_number")}
+        # 词法类型 -> (颜色, 粗体, 斜体)，与编辑器高亮使用同一套配色
+        self._styles = {
+            kind: (fmt.foreground().color(), fmt.fontWeight() >= QFont.Bold, fmt.fontItalic())
+            for kind, fmt in FORMATS.items()
+        }
+
+    def key(self):
+        return theme_key(self.theme)
+
+    def render(self, text, code_type="txt"):
+        """返回渲染好的 QImage"""
+        lines = text.expandtabs(self.theme["tab_size"]).rstrip("\n").split("\n")
+        truncated = len(lines) > self.theme["max_lines"]
+        if truncated:
+            lines = lines[:self.theme["max_lines"]]
+        tokens = self._lex(lines, code_type)
+
+        metrics = self._metrics
+        padding = self.theme["padding"]
+        code_padding = self.theme["code_padding"]
+        gutter = metrics.horizontalAdvance(str(len(lines))) + code_padding
+        text_width = max((metrics.horizontalAdvance(line) for line in lines), default=0)
+        code_width = code_padding * 2 + gutter + text_width
+        code_height = code_padding * 2 + self._line_height * (len(lines) + (1 if truncated else 0))
+        width = int(padding * 2 + code_width + 1)
+        height = int(padding * 2 + code_height + 1)
+
+        # 背景不透明，不需要 alpha 通道，PNG 编码更快
+        image = QImage(width, height, QImage.Format_RGB32)
+        image.fill(self._colors["background"])
+        painter = QPainter(image)
+        try:
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setRenderHint(QPainter.TextAntialiasing)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(self._colors["code_background"])
+            radius = self.theme["radius"]
+            painter.drawRoundedRect(QRectF(padding, padding, code_width, code_height), radius, radius)
+
+            x0 = padding + code_padding
+            text_x = x0 + gutter
+            y = padding + code_padding + metrics.ascent()
+            for number, (line, line_tokens) in enumerate(zip(lines, tokens), 1):
+                self._draw_run(painter, x0 + gutter - code_padding - metrics.horizontalAdvance(str(number)), y,
+                               str(number), self._colors["line_number"], False, False)
+                self._draw_line(painter, text_x, y, line, line_tokens)
+                y += self._line_height
+            if truncated:
+                self._draw_run(painter, text_x, y, "…", self._colors["line_number"], False, False)
+        finally:
+            painter.end()
+        return image
+
+    def render_png(self, text, code_type="txt"):
+        """返回 PNG 字节，可直接交给 QPixmap.loadFromData 或写入文件"""
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        self.render(text, code_type).save(buffer, "PNG", PNG_QUALITY)
+        buffer.close()
+        return bytes(data)
+
+    def _lex(self, lines, code_type):
+        lexer = get_lexer(code_type)
+        if lexer is None:
+            return [[] for _ in lines]
+        result = []
+        state = 0
+        for line in lines:
+            line_tokens, state = lexer.lex(line, state)
+            result.append(line_tokens)
+        return result
+
+    def _draw_line(self, painter, x, y, line, line_tokens):
+        # 按词法结果分段绘制，未覆盖的部分使用默认文字颜色
+        pos = 0
+        for start, length, kind in line_tokens:
+            if start > pos:
+                x = self._draw_run(painter, x, y, line[pos:start], self._colors["text"], False, False)
+            color, bold, italic = self._styles.get(kind, (self._colors["text"], False, False))
+            x = self._draw_run(painter, x, y, line[start:start + length], color, bold, italic)
+            pos = start + length
+        if pos < len(line):
+            self._draw_run(painter, x, y, line[pos:], self._colors["text"], False, False)
+
+    def _draw_run(self, painter, x, y, text, color, bold, italic):
+        font, metrics = self._fonts[bold, italic]
+        painter.setFont(font)
+        painter.setPen(color)
+        painter.drawText(QPointF(x, y), text)
+        return x + metrics.horizontalAdvance(text)
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description="把一个代码文件渲染为 PNG")
+    parser.add_argument("path")
+    parser.add_argument("--code-type", default="txt")
+    parser.add_argument("--out", default="snippet.png")
+    args = parser.parse_args()
+
+    with open(args.path, 'r', encoding='utf-8', errors='replace') as f:
+        source = f.read()
+    renderer = CodeImageRenderer()
+    started = time.perf_counter()
+    png = renderer.render_png(source, args.code_type)
+    print(f"渲染用时 {(time.perf_counter() - started) * 1000:.1f} ms")
+    with open(args.out, 'wb') as f:
+        f.write(png)
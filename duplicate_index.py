@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from file_utils import atomic_write_text, file_content_hash, internal_path, iter_projects, is_snippet_name
+
+INDEX_VERSION = 1
+# 每个线程池任务计算哈希的文件数；片段大多很小，逐个提交时调度开销比计算本身还大
+HASH_BATCH_SIZE = 256
+
+
+def _hash_file(path):
+    try:
+        return file_content_hash(path)
+    except OSError:
+        return None
+
+
+def _hash_files(paths):
+    return [_hash_file(path) for path in paths]
+
+
+class DuplicateIndex:
+    """内容哈希 -> 片段位置 的索引，用于发现跨项目内容完全相同的片段
+
+    每个文件的 (mtime_ns, size, 哈希) 持久化在 .codecapsule/content_index.json 中，
+    刷新时 (mtime, size) 未变的文件直接沿用缓存的哈希，只需 stat；变化的文件在线程池中重新计算。
+    片段用 "项目名/文件名" 标识，与 SearchIndex 相同。
+    """
+
+    def __init__(self, code_dir):
+        self.code_dir = str(code_dir)
+        self.index_path = internal_path(self.code_dir, "content_index.json")
+        # key -> [mtime_ns, size, 哈希]
+        self._files = {}
+        # 哈希 -> set(key)
+        self._locations = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._files)
+
+    # ---- 持久化 ----
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+            return False
+        if data.get("version") != INDEX_VERSION:
+            return False
+        locations = {}
+        for key, (_, _, digest) in data["files"].items():
+            locations.setdefault(digest, set()).add(key)
+        with self._lock:
+            self._files = data["files"]
+            self._locations = locations
+            self._dirty = False
+        return True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps({"version": INDEX_VERSION, "files": self._files}, ensure_ascii=False, separators=(",", ":"))
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        atomic_write_text(self.index_path, payload)
+
+    # ---- 增量更新 ----
+    def refresh(self, workers=None, cancelled=None):
+        """stat 所有片段，只为 (mtime, size) 变化的文件重新计算哈希，删除已不存在的文件；返回重新计算的文件数"""
+        seen = set()
+        stale = []
+        for project_name, project_path in iter_projects(self.code_dir):
+            with os.scandir(project_path) as it:
+                for entry in it:
+                    if cancelled is not None and cancelled():
+                        return 0
+                    if not is_snippet_name(entry.name) or not entry.is_file():
+                        continue
+                    key = f"{project_name}/{entry.name}"
+                    seen.add(key)
+                    st = entry.stat()
+                    cached = self._files.get(key)
+                    if cached is None or cached[:2] != [st.st_mtime_ns, st.st_size]:
+                        stale.append((key, entry.path, st.st_mtime_ns, st.st_size))
+        if stale:
+            # 读文件和 sha1 都会释放 GIL，线程池即可并行
+            batches = [stale[i:i + HASH_BATCH_SIZE] for i in range(0, len(stale), HASH_BATCH_SIZE)]
+            with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) * 2)) as executor:
+                for batch, digests in zip(batches, executor.map(_hash_files, [[item[1] for item in batch] for batch in batches])):
+                    if cancelled is not None and cancelled():
+                        executor.shutdown(cancel_futures=True)
+                        return 0
+                    for (key, _, mtime_ns, size), digest in zip(batch, digests):
+                        if digest is not None:
+                            self._set(key, [mtime_ns, size, digest])
+        with self._lock:
+            for key in set(self._files) - seen:
+                self._remove(key)
+        return len(stale)
+
+    def update_document(self, project_path, filename):
+        """片段保存或新建后更新单个文件"""
+        key = f"{os.path.basename(project_path)}/{filename}"
+        path = os.path.join(project_path, filename)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.remove_document(project_path, filename)
+            return
+        cached = self._files.get(key)
+        if cached is not None and cached[:2] == [st.st_mtime_ns, st.st_size]:
+            return
+        digest = _hash_file(path)
+        if digest is not None:
+            self._set(key, [st.st_mtime_ns, st.st_size, digest])
+
+    def remove_document(self, project_path, filename):
+        with self._lock:
+            self._remove(f"{os.path.basename(project_path)}/{filename}")
+
+    # ---- 查询 ----
+    def duplicates_of(self, project_path, filename):
+        """与该片段内容相同的其他片段，返回 [(项目名, 文件名)]；空文件（如刚新建的片段）不算重复"""
+        key = f"{os.path.basename(project_path)}/{filename}"
+        with self._lock:
+            cached = self._files.get(key)
+            if cached is None or cached[1] == 0:
+                return []
+            others = sorted(self._locations.get(cached[2], ()) - {key})
+        return [tuple(other.split("/", 1)) for other in others]
+
+    def report(self):
+        """整个主文件夹中的重复片段，返回 [(哈希, 文件大小, [(项目名, 文件名)])]
+
+        按浪费的空间（大小 × 多余的份数）从大到小排列；空文件不算重复。
+        """
+        with self._lock:
+            groups = [(digest, self._files[next(iter(keys))][1], sorted(keys))
+                      for digest, keys in self._locations.items() if len(keys) > 1]
+        groups = [group for group in groups if group[1] > 0]
+        groups.sort(key=lambda group: (group[1] * (len(group[2]) - 1), len(group[2])), reverse=True)
+        return [(digest, size, [tuple(key.split("/", 1)) for key in keys]) for digest, size, keys in groups]
+
+    # ---- 内部方法 ----
+    def _set(self, key, record):
+        with self._lock:
+            self._remove(key)
+            self._files[key] = record
+            self._locations.setdefault(record[2], set()).add(key)
+            self._dirty = True
+
+    def _remove(self, key):
+        record = self._files.pop(key, None)
+        if record is None:
+            return
+        keys = self._locations.get(record[2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._locations[record[2]]
+        self._dirty = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="列出主文件夹中内容完全相同的代码片段")
+    parser.add_argument("code_dir", nargs="?", default=os.path.join(os.getcwd(), "code_dir"))
+    parser.add_argument("--workers", type=int, help="计算哈希的线程数")
+    parser.add_argument("--limit", type=int, default=50, help="最多列出多少组")
+    args = parser.parse_args()
+
+    index = DuplicateIndex(args.code_dir)
+    started = time.perf_counter()
+    index.load()
+    hashed = index.refresh(args.workers)
+    index.save()
+    print(f"{len(index)} 个片段，重新计算哈希 {hashed} 个，用时 {time.perf_counter() - started:.2f}s")
+    groups = index.report()
+    for digest, size, locations in groups[:args.limit]:
+        print(f"{len(locations)} 份相同内容（{size} 字节，{digest[:12]}）：")
+        for project_name, filename in locations:
+            print(f"    {project_name}/{filename}")
+    print(f"共 {len(groups)} 组重复，{sum(len(locations) - 1 for _, _, locations in groups)} 个多余的片段")
@@ -0,0 +1,123 @@
+import os
+import mmap
+
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QPlainTextEdit
+from PySide6.QtGui import QTextCursor
+from PySide6.QtCore import Signal
+
+# 超过这个大小的文件以只读预览方式打开
+PREVIEW_THRESHOLD = 1024 * 1024
+# 每次载入的字节数
+CHUNK_SIZE = 128 * 1024
+# 块末尾向后寻找换行的最大距离，避免一行被切成两半
+MAX_LINE_EXTEND = 4096
+
+
+class ChunkedFileReader:
+    """用 mmap 按块读取文件，块边界尽量落在换行处，且不会切断 UTF-8 多字节字符"""
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # 空文件不能 mmap
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    @property
+    def at_end(self):
+        return self.offset >= self.size
+
+    def read_chunk(self):
+        """返回下一块文本，读到末尾时返回空字符串；无法解码的字节替换为 �"""
+        if self.at_end:
+            return ""
+        end = min(self.offset + self.chunk_size, self.size)
+        if end < self.size:
+            newline = self._map.find(b"\n", end, min(end + MAX_LINE_EXTEND, self.size))
+            if newline != -1:
+                end = newline + 1
+            else:
+                # 没有换行时退到字符边界：UTF-8 后续字节的形式为 10xxxxxx
+                while end > self.offset and self._map[end] & 0xC0 == 0x80:
+                    end -= 1
+        data = self._map[self.offset:end]
+        self.offset = end
+        return data.decode('utf-8', errors='replace')
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+def is_utf8(data):
+    try:
+        data.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+class FilePreview(QWidget):
+    """大文件或非 UTF-8 文件的只读预览：先显示第一块，滚动到底部附近时再载入下一块"""
+    edit_requested = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._reader = None
+
+        self.info_label = QLabel()
+        self.info_label.setStyleSheet("QLabel { color: #666; }")
+        self.edit_button = QPushButton("仍然编辑")
+        self.edit_button.clicked.connect(self.edit_requested.emit)
+        banner = QHBoxLayout()
+        banner.setContentsMargins(0, 0, 0, 0)
+        banner.addWidget(self.info_label, 1)
+        banner.addWidget(self.edit_button)
+
+        self.text_view = QPlainTextEdit()
+        self.text_view.setReadOnly(True)
+        self.text_view.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text_view.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(banner)
+        layout.addWidget(self.text_view)
+        self.setLayout(layout)
+
+    def open(self, path, reason):
+        """打开文件并显示第一块，reason 说明为什么以预览方式打开"""
+        self.close_file()
+        self._reader = ChunkedFileReader(path)
+        self.info_label.setText(f"{reason}，只读预览（{self._reader.size / 1024 / 1024:.1f} MB）")
+        self.text_view.setPlainText(self._reader.read_chunk())
+        self._close_if_done()
+
+    def close_file(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self.text_view.clear()
+
+    def on_scrolled(self, value):
+        scroll_bar = self.text_view.verticalScrollBar()
+        if self._reader is not None and value >= scroll_bar.maximum() - scroll_bar.pageStep():
+            self.load_more()
+
+    def load_more(self):
+        if self._reader is None:
+            return
+        cursor = QTextCursor(self.text_view.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(self._reader.read_chunk())
+        self._close_if_done()
+
+    def _close_if_done(self):
+        # 全部载入后释放映射，文件可以被其他程序替换或删除
+        if self._reader.at_end:
+            self._reader.close()
+            self._reader = None
@@ -0,0 +1,106 @@
+import os
+import stat
+import hashlib
+import tempfile
+
+# 以此前缀开头的文件/目录属于程序内部使用（临时文件、缓存等），不作为代码片段展示
+INTERNAL_PREFIX = ".codecapsule"
+METADATA_FILENAME = "metadata.json"
+# 元数据的追加日志，定期合并进 metadata.json
+METADATA_JOURNAL_FILENAME = "metadata.journal"
+
+
+def is_internal_name(name):
+    """判断文件名是否为程序内部文件"""
+    return name.startswith(INTERNAL_PREFIX)
+
+
+def is_snippet_name(name):
+    """判断项目目录中的文件是否为代码片段"""
+    return name not in (METADATA_FILENAME, METADATA_JOURNAL_FILENAME) and not is_internal_name(name)
+
+
+def content_hash(text):
+    """计算文本内容的哈希，用于判断内容是否发生变化"""
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    return hashlib.sha1(text).hexdigest()
+
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    """分块读取文件计算哈希，结果与 content_hash(文件内容) 相同"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# os.umask 只能先设置再恢复，在导入时读取一次；写文件时再读，临时的 0 可能被其他线程创建的文件用上
+_UMASK = _read_umask()
+
+
+def atomic_write_text(path, text, encoding="utf-8", durable=False):
+    """先写临时文件再重命名，避免写入中途崩溃导致文件损坏
+
+    durable 为 True 时重命名前把临时文件刷到磁盘、重命名后再刷新目录，
+    返回时即使断电也能读到完整的新内容（之后要删除其他文件时需要这样做）。
+    """
+    atomic_write_bytes(path, text.encode(encoding), durable)
+
+
+def atomic_write_bytes(path, data, durable=False):
+    """atomic_write_text 的二进制版本"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=INTERNAL_PREFIX + "-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        # 保留原文件权限，新文件使用默认权限
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durable:
+        fsync_directory(directory)
+
+
+def fsync_directory(directory):
+    """把目录项的变化（新建、重命名、删除文件）刷到磁盘；Windows 不支持打开目录，直接跳过"""
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def internal_path(code_dir, *parts):
+    """程序在主文件夹下的内部数据目录（索引、缓存等）"""
+    return os.path.join(str(code_dir), INTERNAL_PREFIX, *parts)
+
+
+def iter_projects(code_dir):
+    """列出主文件夹下的项目目录，返回 (名称, 路径)"""
+    with os.scandir(code_dir) as it:
+        for entry in it:
+            if not is_internal_name(entry.name) and entry.is_dir():
+                yield entry.name, entry.path
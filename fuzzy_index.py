@@ -0,0 +1,310 @@
+import os
+import re
+import time
+import argparse
+import heapq
+import threading
+import itertools
+
+# 显示的结果数
+RESULT_LIMIT = 50
+# 每次输入时逐个打分的候选数上限：先取文件名中连续出现查询串的路径，不够时再用其余按顺序包含查询字符的路径补足
+SCORE_LIMIT = 200
+# 一次查询中最多取这么多个按顺序包含查询字符的路径，其余的留到空闲时再找
+MATCH_LIMIT = 2000
+# 筛选时每批处理的路径数（空闲时每次只处理一批，不影响输入）
+CHUNK_SIZE = 4096
+# 空闲时每次打分的路径数
+SCORE_CHUNK_SIZE = 512
+# 打分参数（与 fzf 的思路相同：匹配字符、单词开头、连续匹配加分，中间的空隙扣分）
+SCORE_MATCH = 16
+BONUS_BOUNDARY = 8
+BONUS_CONSECUTIVE = 4
+BONUS_FILENAME = 8
+PENALTY_GAP_START = 3
+PENALTY_GAP_EXTENSION = 1
+BOUNDARY_CHARS = "/_-. "
+
+
+def fuzzy_score(query, text, filename_start=0):
+    """query 作为子序列出现在 text 中时返回得分，否则返回 None（两者均为小写）
+
+    先正向找到最早能完成匹配的位置，再从那里反向找最短的匹配窗口，只在窗口内计分，
+    因此 "cfg" 在 "my_config.py" 中按 c-f-g 而不是更分散的位置计分。
+    """
+    n = len(query)
+    qi = 0
+    end = -1
+    for i, ch in enumerate(text):
+        if ch == query[qi]:
+            qi += 1
+            if qi == n:
+                end = i
+                break
+    if end < 0:
+        return None
+    qi = n - 1
+    start = end
+    for i in range(end, -1, -1):
+        if text[i] == query[qi]:
+            qi -= 1
+            if qi < 0:
+                start = i
+                break
+
+    score = 0
+    qi = 0
+    previous_matched = False
+    for i in range(start, end + 1):
+        if qi < n and text[i] == query[qi]:
+            score += SCORE_MATCH
+            if i == 0 or text[i - 1] in BOUNDARY_CHARS:
+                score += BONUS_BOUNDARY
+            if previous_matched:
+                score += BONUS_CONSECUTIVE
+            if i >= filename_start:
+                score += BONUS_FILENAME
+            qi += 1
+            previous_matched = True
+        else:
+            score -= PENALTY_GAP_START if previous_matched else PENALTY_GAP_EXTENSION
+            previous_matched = False
+    return score
+
+
+class _ProjectLines:
+    """一个项目的路径（"项目名/文件名"，小写）、按字符分组的路径，以及用于查找文件名的长字符串"""
+    __slots__ = ("entries", "project_path", "prefix", "names", "lines", "by_char", "haystack")
+
+    def __init__(self, project_path, entries):
+        self.entries = entries
+        self.project_path = project_path
+        self.prefix = os.path.basename(project_path).lower() + "/"
+        # 小写文件名 -> 原文件名（只有大小写不同的文件各自保留）
+        self.names = {}
+        for entry in entries:
+            self.names.setdefault(entry.filename.lower(), []).append(entry.filename)
+        self.lines = [self.prefix + name for name in self.names]
+        self.by_char = {ch: [line for line in self.lines if ch in line] for ch in set().union(*self.lines)}
+        # 每行一个小写文件名，首尾都有换行符；在 C 层用 str.find 查找文件名中连续出现的查询串
+        self.haystack = "\n" + "\n".join(self.names) + "\n"
+
+    def find_lines(self, needle, limit, found):
+        """把文件名中含有 needle（可以以换行符开头，表示文件名的开头）的路径加入 found，直到 found 有 limit 个"""
+        haystack = self.haystack
+        pos = haystack.find(needle)
+        while pos >= 0 and len(found) < limit:
+            start = haystack.rfind("\n", 0, pos + 1) + 1
+            end = haystack.find("\n", pos + len(needle))
+            found.setdefault(self.prefix + haystack[start:end])
+            pos = haystack.find(needle, end)
+
+
+class FuzzyIndex:
+    """所有项目中片段路径的模糊匹配索引（Ctrl+P 快速打开）
+
+    数据来自 WorkspaceScanner.projects，与 GlobalSnippetIndex 一样只为列表被替换的项目重新生成，
+    每个项目另外按字符分组保存路径。每次查询的耗时有上限，只对最多 SCORE_LIMIT 个候选逐个打分：
+    - 文件名与查询相同、以查询开头或包含查询的路径，用字典和 str.find 在全部片段中查找，总会参与打分；
+    - 不够时从包含查询中最少见字符的路径开始，在 C 层用正则取最多 MATCH_LIMIT 个
+      按顺序包含查询字符的路径补足。
+    输入一两个字符时匹配的路径数以万计，这样不必为了显示前几十个结果而遍历、打分全部路径。
+    剩下的工作由 complete_pending() 在空闲时分批完成：先筛完所有匹配的路径，再对它们全部打分，
+    之后再查询同一个词直接返回完整的排序；下一次查询以这次的查询开头时（逐字输入），
+    也只需在这次的匹配结果中继续筛选。
+    refresh() 可以在后台线程中调用，生成完的数据整体替换，查询时不会看到一半的结果。
+    """
+
+    def __init__(self, projects):
+        # project_path -> [SnippetEntry]，由扫描器维护
+        self._projects = projects
+        # project_path -> _ProjectLines，只会整体替换
+        self._data = {}
+        self._lock = threading.Lock()
+        # (数据, 查询, 完整的匹配结果)，用于逐字输入时缩小范围
+        self._narrowed = None
+        # [数据, 查询, 正则, 剩余候选的迭代器, 已找到的匹配]，空闲时继续筛选
+        self._pending = None
+        # [数据, 查询, 剩余匹配的迭代器, 目前得分最高的路径]，筛完后空闲时继续打分
+        self._scoring = None
+        # (数据, 查询, 全部匹配中得分最高的路径)
+        self._ranked = None
+
+    def __len__(self):
+        return sum(len(project.entries) for project in self._data.values())
+
+    def refresh(self, blocking=True):
+        """与扫描器的缓存同步，只处理列表被替换的项目；返回是否有变化
+
+        blocking 为 False 且另一个线程正在同步时直接返回 False，查询沿用现有的数据。
+        """
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            # 扫描器在后台线程中整体替换各项目的列表，先取一份快照再使用
+            snapshot = dict(self._projects)
+            data = {}
+            changed = len(snapshot) != len(self._data)
+            for project_path, entries in snapshot.items():
+                project = self._data.get(project_path)
+                if project is None or project.entries is not entries:
+                    project = _ProjectLines(project_path, entries)
+                    changed = True
+                data[project_path] = project
+            if changed:
+                self._data = data
+            return changed
+        finally:
+            self._lock.release()
+
+    def search(self, query, limit=RESULT_LIMIT):
+        """返回按得分排序的 [(project_path, filename)]"""
+        self.refresh(blocking=False)
+        data = self._data
+        query = "".join(query.lower().split())
+        self._pending = self._scoring = None
+        if not query:
+            return []
+        ranked = self._ranked
+        if ranked is not None and ranked[0] is data and ranked[1] == query:
+            return self._targets(data, ranked[2], limit)
+
+        pool = self._filename_hits(data, query)
+        candidates = self._candidates(data, query)
+        narrowed = self._narrowed
+        if narrowed is not None and narrowed[0] is data and narrowed[1] == query:
+            # 空闲时已经为这个查询筛完，候选就是完整的匹配结果
+            matched = candidates
+        else:
+            # 从头到尾只匹配一次，没有回溯：[^a]*a[^b]*b...
+            subsequence = re.compile("".join(f"[^{re.escape(ch)}]*{re.escape(ch)}" for ch in query))
+            self._pending = [data, query, subsequence, iter(candidates), []]
+            if len(pool) < SCORE_LIMIT:
+                while self._pending is not None and len(self._pending[4]) < MATCH_LIMIT:
+                    self._filter_chunk()
+            matched = self._narrowed[2] if self._pending is None else self._pending[4]
+        for line in matched:
+            if len(pool) >= SCORE_LIMIT:
+                break
+            pool.setdefault(line)
+
+        best = heapq.nlargest(RESULT_LIMIT, self._scored(query, pool))
+        if self._pending is None:
+            if len(matched) <= len(pool) and all(line in pool for line in matched):
+                # 所有匹配都已打过分，排序是完整的
+                self._ranked = (data, query, [line for _, _, line in best])
+            else:
+                self._scoring = [data, query, iter(matched), best]
+        return self._targets(data, [line for _, _, line in best], limit)
+
+    def has_pending(self):
+        """最近一次查询的结果是否还不完整（还有没筛选或没打分的路径）"""
+        return self._pending is not None or self._scoring is not None
+
+    def complete_pending(self):
+        """为最近一次查询再筛选或打分一批路径，返回是否还有剩余"""
+        if self._pending is not None:
+            self._filter_chunk()
+            return True
+        if self._scoring is None:
+            return False
+        data, query, remaining, best = self._scoring
+        chunk = list(itertools.islice(remaining, SCORE_CHUNK_SIZE))
+        best[:] = heapq.nlargest(RESULT_LIMIT, itertools.chain(best, self._scored(query, chunk)))
+        if len(chunk) < SCORE_CHUNK_SIZE:
+            self._scoring = None
+            self._ranked = (data, query, [line for _, _, line in best])
+            return False
+        return True
+
+    def _filter_chunk(self):
+        data, query, pattern, remaining, matched = self._pending
+        chunk = list(itertools.islice(remaining, CHUNK_SIZE))
+        matched.extend(filter(pattern.match, chunk))
+        if len(chunk) < CHUNK_SIZE:
+            self._pending = None
+            self._narrowed = (data, query, matched)
+            self._scoring = [data, query, iter(matched), []]
+
+    @staticmethod
+    def _scored(query, lines):
+        for line in lines:
+            score = fuzzy_score(query, line, line.index("/") + 1)
+            if score is not None:
+                # 得分相同时路径短的在前
+                yield score, -len(line), line
+
+    @staticmethod
+    def _filename_hits(data, query):
+        """文件名与查询相同、以查询开头或包含查询的路径（有序去重的字典），后两种合计最多 SCORE_LIMIT 个
+
+        查询中含有 "/" 时按最后一个 "/" 之后的部分查找文件名，再要求整个查询连续出现在路径中。
+        """
+        name = query.rsplit("/", 1)[-1]
+        found = {}
+        if not name:
+            return found
+        for project in data.values():
+            if name in project.names:
+                found.setdefault(project.prefix + name)
+        for needle in ("\n" + name, name):
+            for project in data.values():
+                if len(found) >= SCORE_LIMIT:
+                    break
+                project.find_lines(needle, SCORE_LIMIT, found)
+        if "/" in query:
+            found = {line: None for line in found if query in line}
+        return found
+
+    def _candidates(self, data, query):
+        """可能匹配 query 的路径：包含最少见字符的路径，或上一次较短查询的匹配结果"""
+        counts = {ch: sum(len(project.by_char.get(ch, ())) for project in data.values()) for ch in set(query)}
+        rarest = min(counts, key=counts.get)
+        narrowed = self._narrowed
+        if narrowed is not None and narrowed[0] is data and query.startswith(narrowed[1]) \
+                and len(narrowed[2]) <= counts[rarest]:
+            return narrowed[2]
+        return list(itertools.chain.from_iterable(project.by_char.get(rarest, ()) for project in data.values()))
+
+    @staticmethod
+    def _targets(data, lines, limit):
+        """把路径换回 (project_path, 原文件名)；项目名或文件名只有大小写不同时一个路径对应多个片段"""
+        by_prefix = {}
+        for project in data.values():
+            by_prefix.setdefault(project.prefix, []).append(project)
+        targets = []
+        for line in lines:
+            prefix, name = line.split("/", 1)
+            for project in by_prefix.get(prefix + "/", ()):
+                targets.extend((project.project_path, filename) for filename in project.names.get(name, ()))
+        return targets[:limit]
+
+
+if __name__ == "__main__":
+    from snippet_store import scan_project
+    from file_utils import iter_projects
+
+    parser = argparse.ArgumentParser(description="在主文件夹的所有片段中模糊查找，并显示逐字输入时每次查询的耗时")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("--code-dir", default=os.path.join(os.getcwd(), "code_dir"))
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--no-idle", action="store_true",
+                        help="两次输入之间不补完筛选和打分（相当于连续快速输入），默认与快速打开窗口一样在输入间隙补完")
+    args = parser.parse_args()
+
+    projects = {project_path: scan_project(project_path) for _, project_path in iter_projects(args.code_dir)}
+    index = FuzzyIndex(projects)
+    started = time.perf_counter()
+    index.refresh()
+    print(f"{len(index)} 个片段，建立索引用时 {(time.perf_counter() - started) * 1000:.0f} ms")
+    for query in args.queries:
+        for end in range(1, len(query) + 1):
+            started = time.perf_counter()
+            results = index.search(query[:end], args.limit)
+            print(f"{query[:end]!r:24} {(time.perf_counter() - started) * 1000:6.1f} ms")
+            while not args.no_idle and index.complete_pending():
+                pass
+        if not args.no_idle:
+            results = index.search(query, args.limit)
+        for project_path, filename in results:
+            print(f"    {os.path.basename(project_path)}/{filename}")
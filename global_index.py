@@ -0,0 +1,97 @@
+import os
+import heapq
+import itertools
+from operator import attrgetter
+
+
+def _lower_name(entry):
+    return entry.filename.lower()
+
+
+# 排序方式 -> (全局归并的排序键, 项目内的排序键, 是否倒序)，与 SqliteCatalog.ORDERS 使用相同的名称；
+# 同一项目内项目名相同，项目内排序只需比较文件名
+ORDERS = {
+    "mtime": (attrgetter("mtime"), attrgetter("mtime"), True),
+    "name": (lambda entry: (entry.filename.lower(), entry.project), _lower_name, False),
+    "project": (lambda entry: (os.path.basename(entry.project).lower(), entry.filename.lower()), _lower_name, False),
+}
+
+
+class GlobalSnippetIndex:
+    """所有项目片段的全局视图，支持按修改时间/名称/项目排序并分页读取
+
+    数据直接来自 WorkspaceScanner.projects（深度扫描、单项目扫描和文件监听的差异都会更新它，
+    且每次都整体替换某个项目的列表）。每个项目按各排序方式排好的结果单独缓存，
+    只有列表被替换的项目才重新排序；全局顺序由各项目的有序列表惰性归并得到，
+    翻页时只归并到需要的位置。
+    """
+
+    def __init__(self, projects):
+        # project_path -> [SnippetEntry]，由扫描器维护
+        self._projects = projects
+        # (order, project_path) -> (原列表, 排好序的列表)
+        self._project_sorted = {}
+        # order -> (项目快照, 归并迭代器, 已取出的结果)
+        self._merged = {}
+
+    def count(self):
+        return sum(len(entries) for entries in list(self._projects.values()))
+
+    def query(self, order="mtime", offset=0, limit=200):
+        """返回排序后的第 offset 条起的 limit 条 SnippetEntry"""
+        return self._page(self._merged_for(order), offset, limit)
+
+    def iter_sorted(self, order="mtime", page_size=200):
+        """按页依次取出全部结果，交给 SnippetListModel 在滚动时载入
+
+        整个过程都使用开始时的快照：翻页期间某个项目被重新扫描（自动保存、外部修改）时，
+        后面的页不会因为顺序变了而漏掉或重复片段，这些变化在下次调用时才体现。
+        """
+        merged = self._merged_for(order)
+        offset = 0
+        while True:
+            page = self._page(merged, offset, page_size)
+            if not page:
+                return
+            yield from page
+            offset += len(page)
+
+    @staticmethod
+    def _page(merged, offset, limit):
+        _, iterator, taken = merged
+        missing = offset + limit - len(taken)
+        if missing > 0:
+            taken.extend(itertools.islice(iterator, missing))
+        return taken[offset:offset + limit]
+
+    def _merged_for(self, order):
+        # 扫描器在后台线程中整体替换各项目的列表，先取一份快照再使用
+        snapshot = list(self._projects.items())
+        cached = self._merged.get(order)
+        if cached is not None and self._same_snapshot(cached[0], snapshot):
+            return cached
+        key, _, reverse = ORDERS[order]
+        lists = [self._sorted_project(order, project_path, entries) for project_path, entries in snapshot]
+        cached = (snapshot, heapq.merge(*lists, key=key, reverse=reverse), [])
+        self._merged[order] = cached
+        # 丢弃已经不存在的项目的排序缓存
+        current = {project_path for project_path, _ in snapshot}
+        for cache_key in [k for k in self._project_sorted if k[1] not in current]:
+            del self._project_sorted[cache_key]
+        return cached
+
+    def _sorted_project(self, order, project_path, entries):
+        cached = self._project_sorted.get((order, project_path))
+        if cached is not None and cached[0] is entries:
+            return cached[1]
+        _, key, reverse = ORDERS[order]
+        result = sorted(entries, key=key, reverse=reverse)
+        self._project_sorted[order, project_path] = (entries, result)
+        return result
+
+    @staticmethod
+    def _same_snapshot(old, new):
+        return len(old) == len(new) and all(
+            old_path == new_path and old_entries is new_entries
+            for (old_path, old_entries), (new_path, new_entries) in zip(old, new)
+        )
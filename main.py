@@ -1,57 +1,60 @@
 import sys
 import os
-import json
+import time
+
+# 开始执行 main 的时间，启动耗时（首次绘制、可交互）都相对于它计算
+STARTUP_STARTED = time.perf_counter()
+
 from pathlib import Path
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLineEdit, QListWidget, QStackedWidget, QTextEdit,
-    QComboBox, QSplitter, QFormLayout, QFileDialog, QLabel, QScrollArea, QInputDialog
+    QPushButton, QLabel, QLineEdit, QListWidget, QStackedWidget, QPlainTextEdit,
+    QComboBox, QSplitter, QFormLayout, QFileDialog, QListView, QInputDialog
 )
-from PySide6.QtCore import Qt, QSettings, QFileSystemWatcher
-from PySide6.QtGui import QIcon, QFontMetrics, QFont
-
-
-class SnippetCard(QWidget):
-    """自定义代码片段卡片"""
-    def __init__(self, filename, mod_time, parent=None):
-        super().__init__(parent)
-        self.filename = filename
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #F5F5F5;
-                border: 1px solid #D3D3D3;
-                border-radius: 5px;
-                padding: 10px;
-                margin: 5px 0;
-            }
-            QWidget:hover {
-                background-color: #E0E0E0;
-            }
-        """)
+from PySide6.QtCore import Qt, QSettings, QItemSelectionModel, Signal, QEvent, QTimer
+from PySide6.QtGui import QIcon, QFontMetrics, QFont, QShortcut, QKeySequence
 
-        layout = QHBoxLayout()
-        layout.setContentsMargins(5, 5, 5, 5)
-
-        # 文件名
-        filename_label = QLabel(filename)
-        filename_label.setStyleSheet("QLabel { font-size: 14px; font-weight: bold; }")
-        layout.addWidget(filename_label)
+from autosave import AutoSaver
+from metadata_store import MetadataStore
+from snippet_list import SnippetListModel, SnippetCardDelegate, FilenameRole, ProjectRole
+from snippet_store import SnippetStore, SnippetEntry, CODE_TYPES
+from search_index import SearchIndex
+from duplicate_index import DuplicateIndex
+from tag_index import TagIndex
+from tag_list import TagListModel, TagRole
+from workspace_scanner import WorkspaceScanner
+from workspace_watcher import WorkspaceWatcher
+from global_index import GlobalSnippetIndex
+from fuzzy_index import FuzzyIndex
+from quick_open import QuickOpenDialog
+from file_preview import FilePreview, PREVIEW_THRESHOLD, is_utf8
+from syntax_highlight import IncrementalHighlighter
+from startup_snapshot import load_snapshot, save_snapshot
+from snippet_import import import_folders, detect_encoding
+from tracing import tracer, span, instant
+from trace_overlay import TraceOverlay
+from stall_watchdog import StallWatchdog
+from file_utils import internal_path
+from backup import GitBackup, BackupError
 
-        layout.addStretch()
+# QSettings 的构造参数；基准测试换成临时的 ini 文件，不读写用户自己的设置
+SETTINGS_LOCATION = ("MyCompany", "CodeCapsule")
 
-        # 修改时间
-        time_label = QLabel(mod_time)
-        time_label.setStyleSheet("QLabel { font-size: 12px; color: #999; }")
-        layout.addWidget(time_label)
 
-        self.setLayout(layout)
+def app_settings():
+    return QSettings(*SETTINGS_LOCATION)
 
 
 class FolderBar(QWidget):
-    def __init__(self, code_dir, on_folder_changed, on_new_folder):
+    def __init__(self, code_dir, metadata_store, scanner, on_folder_changed, on_new_folder):
         super().__init__()
         self.code_dir = code_dir
+        self.metadata_store = metadata_store
+        # 文件夹列表由后台扫描分批填充，不在界面线程中列目录
+        self.scanner = scanner
+        self._scan_generation = None
+        self._folders = set()
         self.on_folder_changed = on_folder_changed
         self.on_new_folder = on_new_folder
         self.setContentsMargins(0, 0, 0, 0)
@@ -135,7 +138,11 @@ class FolderBar(QWidget):
 
         self.folder_list = QListWidget()
         self.folder_list.setSpacing(0)
-        self.update_folder_list()
+        # 文件夹分批加入，列表很长时不必每批都同步重排
+        self.folder_list.setUniformItemSizes(True)
+        self.folder_list.setLayoutMode(QListWidget.Batched)
+        self.scanner.folders_found.connect(self.on_folders_found)
+        self.scanner.finished.connect(self.on_scan_finished)
 
         library_widget = QWidget()
         library_layout = QVBoxLayout()
@@ -145,12 +152,17 @@ class FolderBar(QWidget):
         library_layout.addWidget(self.folder_list)
         library_widget.setLayout(library_layout)
 
-        tags_widget = QListWidget()
-        tags_widget.addItems(["🏷️ Tag 1", "🏷️ Tag 2", "🏷️ Tag 3"])
-        tags_widget.setSpacing(0)
+        # 标签视图：按标签增量更新的模型
+        self.tag_model = TagListModel(self)
+        self.tag_list = QListView()
+        self.tag_list.setModel(self.tag_model)
+        self.tag_list.setUniformItemSizes(True)
+        # 分批布局，行数很多时插入一行不会同步重排整个列表
+        self.tag_list.setLayoutMode(QListView.Batched)
+        self.tag_list.setSpacing(0)
 
         self.stack.addWidget(library_widget)
-        self.stack.addWidget(tags_widget)
+        self.stack.addWidget(self.tag_list)
 
         self.btn_library.clicked.connect(lambda: self.switch_view(0))
         self.btn_tags.clicked.connect(lambda: self.switch_view(1))
@@ -164,11 +176,6 @@ class FolderBar(QWidget):
         library_layout.setStretch(0, 0)
         library_layout.setStretch(1, 1)
 
-        # 监听目录变化
-        self.watcher = QFileSystemWatcher()
-        self.watcher.addPath(str(self.code_dir))
-        self.watcher.directoryChanged.connect(self.update_folder_list)
-
         self.setLayout(layout)
 
     def switch_view(self, index):
@@ -176,57 +183,154 @@ class FolderBar(QWidget):
         self.btn_library.setChecked(index == 0)
         self.btn_tags.setChecked(index == 1)
 
-    def update_folder_list(self):
+    def update_folder_list(self, deep=False):
+        """在后台重新扫描主文件夹；deep 为 True 时顺带扫描每个项目中的片段"""
+        self._scan_generation = self.scanner.scan(self.code_dir, deep)
+
+    def set_code_dir(self, code_dir):
+        """切换主文件夹：清空列表并重新扫描"""
+        self.restore(code_dir, [])
+        self.update_folder_list(deep=True)
+
+    def restore(self, code_dir, folders, selected=None):
+        """显示上次保存的文件夹列表并选中 selected，不触发切换文件夹，也不访问磁盘"""
+        self.code_dir = code_dir
         self.folder_list.clear()
-        for folder in os.listdir(self.code_dir):
-            folder_path = os.path.join(self.code_dir, folder)
-            if os.path.isdir(folder_path):
+        self._folders = set()
+        self.folder_list.blockSignals(True)
+        try:
+            self.add_folders(folders)
+        finally:
+            self.folder_list.blockSignals(False)
+        if selected is not None:
+            self.select_folder(selected)
+
+    def folder_names(self):
+        return [self.folder_list.item(row).text().replace("📁 ", "") for row in range(self.folder_list.count())]
+
+    def on_folders_found(self, generation, folders):
+        # 只添加新出现的文件夹，保持当前选中项不变
+        if generation == self._scan_generation:
+            self.add_folders(folders)
+
+    def on_scan_finished(self, generation, folders):
+        # 扫描完成后移除已不存在的文件夹
+        if generation == self._scan_generation:
+            self.remove_folders(self._folders - set(folders))
+
+    def apply_delta(self, delta):
+        """只增删变化的文件夹，其余项和选中状态保持不变"""
+        self.add_folders(delta.folders_added)
+        self.remove_folders(delta.folders_removed)
+
+    def add_folders(self, folders):
+        for folder in folders:
+            if folder not in self._folders:
+                self._folders.add(folder)
                 self.folder_list.addItem(f"📁 {folder}")
         # 默认选中第一个文件夹
-        if self.folder_list.count() > 0:
+        if self.folder_list.currentRow() < 0 and self.folder_list.count() > 0:
             self.folder_list.setCurrentRow(0)
 
+    def remove_folders(self, folders):
+        removed = self._folders & set(folders)
+        if not removed:
+            return
+        for row in range(self.folder_list.count() - 1, -1, -1):
+            if self.folder_list.item(row).text().replace("📁 ", "") in removed:
+                self.folder_list.takeItem(row)
+        self._folders -= removed
+
+    def select_folder(self, folder_name):
+        """只同步选中状态，不触发切换文件夹"""
+        items = self.folder_list.findItems(f"📁 {folder_name}", Qt.MatchExactly)
+        if items:
+            self.folder_list.blockSignals(True)
+            self.folder_list.setCurrentItem(items[0])
+            self.folder_list.blockSignals(False)
+
     def create_new_folder(self):
         folder_name, ok = QInputDialog.getText(self, "新建文件夹", "请输入文件夹名称:")
         if ok and folder_name:
-            new_folder_path = os.path.join(self.code_dir, folder_name)
-            if not os.path.exists(new_folder_path):
-                os.makedirs(new_folder_path)
-                # 创建空的 metadata.json
-                with open(os.path.join(new_folder_path, "metadata.json"), "w", encoding="utf-8") as f:
-                    json.dump({}, f, indent=4)
-                self.update_folder_list()
+            try:
+                # 创建文件夹和空的 metadata.json
+                SnippetStore(self.code_dir, self.metadata_store).create_project(folder_name)
+            except (ValueError, OSError) as e:
+                print(f"新建文件夹失败: {e}")
+            else:
+                self._folders.add(folder_name)
+                self.folder_list.addItem(f"📁 {folder_name}")
+                self.select_folder(folder_name)
                 self.on_new_folder()
 
 
 class CodeCapsule(QMainWindow):
-    def __init__(self):
+    # 标签计数变化（可能来自后台线程），在 GUI 线程中更新标签视图
+    tags_changed = Signal(dict)
+    # 文件夹导入的进度和结果（来自后台线程）
+    import_progress = Signal(int, int)
+    import_finished = Signal(object)
+    # 与某个片段内容相同的其他片段：project_path, filename, [(项目名, 文件名)]
+    duplicates_found = Signal(str, str, list)
+    # 启动完成（第一个片段已打开，或主文件夹为空时首次扫描结束），参数为各阶段耗时（毫秒）
+    startup_finished = Signal(dict)
+
+    def __init__(self, code_dir=None):
         super().__init__()
         self.setWindowTitle("代码胶囊")
         self.current_project = None
+        self._syncing_selection = False
 
         self.base_dir = Path.cwd()
         self.default_folder = self.base_dir / "code_dir"
         self.code_dir = self.default_folder
+        self.metadata_store = MetadataStore()
+        self.metadata_store.add_listener(self.on_metadata_loaded)
+        self.tag_index = None
+        # 使用 SQLite 后端且首次同步完成后，“所有片段”、标签列表和按标签列出片段都直接查询数据库
+        self.catalog = None
+        self._catalog_tags = {}
         self.setup_default_folder()
 
-        self.folder_bar = FolderBar(str(self.code_dir), self.on_folder_changed, self.on_new_folder)
+        self.scanner = WorkspaceScanner(self)
+        self.scanner.project_scanned.connect(self.on_project_scanned)
+        self.scanner.progress.connect(self.on_scan_progress)
+        self.scanner.finished.connect(self.on_scan_finished)
+        # 跨项目的“所有片段”视图直接使用扫描器的缓存，只重新排序发生变化的项目
+        self.global_index = GlobalSnippetIndex(self.scanner.projects)
+        # "project"：当前项目；"all"：所有项目的片段
+        self.view_mode = "project"
+        self.folder_bar = FolderBar(str(self.code_dir), self.metadata_store, self.scanner, self.on_folder_changed, self.on_new_folder)
+        # 监听主文件夹和项目文件夹，外部修改合并后只把差异应用到列表和索引
+        self.watcher = WorkspaceWatcher(self.scanner, self)
+        self.scanner.changes_found.connect(self.on_workspace_changed)
 
-        self.content_edit = QTextEdit()
+        # 纯文本编辑器：片段内容不会被当作富文本解析，大段文本也比 QTextEdit 快得多
+        self.content_edit = QPlainTextEdit()
         self.content_edit.setReadOnly(True)
+        # 按代码类型增量高亮，只同步处理可见区域
+        self.highlighter = IncrementalHighlighter(self.content_edit)
+        # 大文件和非 UTF-8 文件的只读预览，与编辑器共用同一位置，第一次用到时才创建
+        self.preview = None
+        self.editor_stack = QStackedWidget()
+        self.editor_stack.addWidget(self.content_edit)
         self.tags_edit = QLineEdit()
         self.tags_edit.setPlaceholderText("Add Tag")
         self.code_type_combo = QComboBox()
-        self.code_type_combo.addItems(["txt", "python", "java", "bash"])
+        self.code_type_combo.addItems(CODE_TYPES)
         self.open_button = QPushButton("打开文件夹")
 
-        # 中间代码片段列表（自定义组件）
-        self.snippet_container = QWidget()
-        self.snippet_layout = QVBoxLayout()
-        self.snippet_container.setLayout(self.snippet_layout)
-        self.snippet_scroll = QScrollArea()
-        self.snippet_scroll.setWidget(self.snippet_container)
-        self.snippet_scroll.setWidgetResizable(True)
+        # 中间代码片段列表（模型/视图，只绘制可见的卡片）
+        self.snippet_model = SnippetListModel(self)
+        self.snippet_list = QListView()
+        self.snippet_list.setModel(self.snippet_model)
+        self.snippet_list.setItemDelegate(SnippetCardDelegate(self.snippet_list))
+        self.snippet_list.setUniformItemSizes(True)
+        self.snippet_list.setLayoutMode(QListView.Batched)
+        self.snippet_list.setMouseTracking(True)
+        self.snippet_list.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.snippet_list.setStyleSheet("QListView { border: none; }")
+        self.snippet_list.selectionModel().currentRowChanged.connect(self.on_snippet_row_changed)
 
         # 中间区域顶部添加“+”按钮
         snippet_widget = QWidget()
@@ -236,13 +340,21 @@ class CodeCapsule(QMainWindow):
         self.search_bar = QLineEdit()
         self.search_bar.setPlaceholderText("Search...")
         self.search_bar.setStyleSheet("QLineEdit { padding: 5px; border: 1px solid #D3D3D3; border-radius: 5px; }")
+        self.search_bar.textChanged.connect(self.on_project_search)
         self.new_snippet_button = QPushButton("+")
         self.new_snippet_button.clicked.connect(self.create_new_snippet)
+        # “所有片段”视图的排序方式
+        self.sort_combo = QComboBox()
+        for label, order in (("按修改时间", "mtime"), ("按名称", "name"), ("按项目", "project")):
+            self.sort_combo.addItem(label, order)
+        self.sort_combo.currentIndexChanged.connect(lambda index: self.show_all_snippets())
+        self.sort_combo.hide()
         top_layout.addWidget(self.search_bar)
+        top_layout.addWidget(self.sort_combo)
         top_layout.addWidget(self.new_snippet_button)
 
         snippet_widget_layout.addLayout(top_layout)
-        snippet_widget_layout.addWidget(self.snippet_scroll)
+        snippet_widget_layout.addWidget(self.snippet_list)
         snippet_widget.setLayout(snippet_widget_layout)
 
         # 右侧布局
@@ -251,8 +363,14 @@ class CodeCapsule(QMainWindow):
         metadata_layout = QFormLayout()
         metadata_layout.addRow("标签:", self.tags_edit)
         metadata_layout.addRow("代码类型:", self.code_type_combo)
-        snippet_layout.addWidget(self.content_edit)
+        snippet_layout.addWidget(self.editor_stack)
         snippet_layout.addLayout(metadata_layout)
+        # 当前片段在其他位置的完全相同的副本
+        self.duplicates_label = QLabel()
+        self.duplicates_label.setWordWrap(True)
+        self.duplicates_label.setStyleSheet("QLabel { color: #B35C00; }")
+        self.duplicates_label.hide()
+        snippet_layout.addWidget(self.duplicates_label)
         snippet_layout.addWidget(self.open_button)
         snippet_view.setLayout(snippet_layout)
 
@@ -266,17 +384,150 @@ class CodeCapsule(QMainWindow):
 
         self.open_button.clicked.connect(self.open_folder)
         self.content_edit.textChanged.connect(self.on_text_changed)
+        # 标签和代码类型的修改同样走自动保存
+        self.tags_edit.textChanged.connect(self.on_text_changed)
+        self.code_type_combo.currentTextChanged.connect(self.on_text_changed)
+        self.code_type_combo.currentTextChanged.connect(self.highlighter.set_language)
+
+        settings = app_settings()
+        # 自动保存：停止输入 autosave_interval_ms 毫秒后在后台写盘
+        self.autosaver = AutoSaver(self.metadata_store, int(settings.value("autosave_interval_ms", 500)), self)
+        self.autosaver.saved.connect(self.on_snippet_saved)
+        self.autosaver.save_failed.connect(lambda path, error: print(f"保存文件失败: {path} {error}"))
+        # 搜索索引的加载、刷新和增量更新都在后台线程中进行
+        self.index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+        # 关闭窗口后排队到达的信号（自动保存、增量扫描等）不再提交后台任务
+        self._closing = False
+        self.search_index = None
+        self.duplicate_index = None
+        self._duplicate_query = None
+        self.duplicates_found.connect(self.on_duplicates_found)
+        # 拖入文件夹时在后台导入，状态栏显示进度，可以取消
+        self.import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="folder-import")
+        self._import_running = False
+        self._import_cancelled = False
+        self.cancel_import_button = QPushButton("取消导入")
+        self.cancel_import_button.clicked.connect(self.cancel_import)
+        self.cancel_import_button.hide()
+        self.statusBar().addPermanentWidget(self.cancel_import_button)
+        self.import_progress.connect(lambda done, total: self.statusBar().showMessage(f"正在导入 {done}/{total}"))
+        self.import_finished.connect(self.on_import_finished)
+        # F12 显示/隐藏各 span 的 p50/p95 耗时（同时开启追踪）
+        self.trace_overlay = TraceOverlay(self)
+        QShortcut(QKeySequence("F12"), self, self.trace_overlay.toggle)
+        # Ctrl+P 在所有项目的片段中按文件名模糊查找；索引同样直接使用扫描器的缓存
+        self.quick_open_index = FuzzyIndex(self.scanner.projects)
+        self.quick_open = QuickOpenDialog(self.quick_open_index, self)
+        self.quick_open.snippet_chosen.connect(self.on_quick_open_chosen)
+        QShortcut(QKeySequence("Ctrl+P"), self, self.quick_open.open_palette)
+        # 界面线程卡顿超过 stall_threshold_ms 毫秒时把调用栈记入 .codecapsule/stall.log（0 表示关闭）
+        self.watchdog = None
+        stall_threshold_ms = int(settings.value("stall_threshold_ms", 100))
+        if stall_threshold_ms > 0:
+            self.watchdog = StallWatchdog(stall_threshold_ms, parent=self)
+        # 备份到本地 git 仓库（backup_enabled 设置开启时）：变化的路径记入变更日志，
+        # 第一次变化后 backup_interval_ms 毫秒把这段时间内的所有修改合成一个提交，在后台提交并推送到 backup_remote
+        self.backup = None
+        self.backup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+        self.backup_timer = QTimer(self)
+        self.backup_timer.setSingleShot(True)
+        self.backup_timer.setInterval(int(settings.value("backup_interval_ms", 60000)))
+        self.backup_timer.timeout.connect(self.run_backup)
+        self.setAcceptDrops(True)
+        self.folder_bar.search_bar.textChanged.connect(self.on_global_search)
+        self.tags_changed.connect(self.folder_bar.tag_model.update)
+        self.folder_bar.tag_list.clicked.connect(self.on_tag_clicked)
+        self.folder_bar.library_list.itemClicked.connect(self.on_library_clicked)
+        self.folder_bar.folder_list.itemClicked.connect(self.on_folder_clicked)
 
-        settings = QSettings("MyCompany", "CodeCapsule")
-        folder = settings.value("code_dir", str(self.default_folder))
+        folder = code_dir or settings.value("code_dir", str(self.default_folder))
         if folder and os.path.exists(folder):
             self.code_dir = folder
-            self.folder_bar.code_dir = self.code_dir
-            self.folder_bar.watcher.addPath(str(self.code_dir))
+        # 先按上次退出时的快照显示文件夹和片段列表；扫描、索引和读取片段内容都推迟到窗口第一次绘制之后，
+        # 没有快照时文件夹列表由后台扫描分批填充，第一个文件夹出现时自动选中
+        self.startup_times = {}
+        self._startup_snapshot = load_snapshot(self.code_dir)
+        if self.watchdog is not None:
+            self.watchdog.set_log_path(internal_path(self.code_dir, "stall.log"))
+        self.watcher.set_code_dir(self.code_dir)
+        self.restore_snapshot(self._startup_snapshot)
 
-        # 默认选中第一个文件夹
-        if self.folder_bar.folder_list.count() > 0:
-            self.folder_bar.folder_list.setCurrentRow(0)
+    def restore_snapshot(self, snapshot):
+        """用快照填充文件夹列表和当前项目的片段列表，不访问磁盘"""
+        if snapshot is None:
+            self.folder_bar.restore(str(self.code_dir), [])
+            return
+        project = snapshot["project"]
+        if project not in snapshot["folders"]:
+            project = None
+        self.folder_bar.restore(str(self.code_dir), snapshot["folders"], project)
+        if project is not None:
+            self.current_project = os.path.join(self.code_dir, project)
+            self.snippet_model.load_project(self.current_project, [
+                SnippetEntry(self.current_project, filename, mtime) for filename, mtime in snapshot["entries"]
+            ])
+
+    def event(self, event):
+        # 第一次绘制之后再开始后台扫描和索引，它们会与界面线程争用 GIL，拖慢首次绘制
+        if event.type() == QEvent.Paint and "first_paint" not in self.startup_times:
+            self.mark_startup("first_paint")
+            QTimer.singleShot(0, self.finish_startup)
+        return super().event(event)
+
+    def finish_startup(self):
+        """打开上次的片段，然后在后台与磁盘同步快照中的列表；索引等到可交互之后再加载"""
+        snapshot, self._startup_snapshot = self._startup_snapshot, None
+        # 启动本身（构造窗口、首次绘制）由启动耗时单独衡量，看门狗从这里开始
+        if self.watchdog is not None:
+            self.watchdog.start()
+        if self.current_project and not os.path.isdir(self.current_project):
+            # 上次打开的项目已被删除：移除后列表会自动选中相邻的文件夹
+            stale, self.current_project = self.current_project, None
+            self.snippet_model.load_project(None)
+            self.folder_bar.remove_folders([os.path.basename(stale)])
+        elif self.current_project:
+            current_file = snapshot["current_file"]
+            if current_file and os.path.isfile(os.path.join(self.current_project, current_file)):
+                self.on_snippet_clicked(current_file)
+            else:
+                self.select_default_snippet()
+            # 当前项目单独先扫描，不必等深度扫描轮到它
+            self.scanner.scan_project_async(self.current_project)
+            self.mark_interactive_soon()
+        self.folder_bar.update_folder_list(deep=True)
+
+    def mark_interactive_soon(self):
+        # 等这一轮事件处理完、界面能响应输入时才算可交互
+        if "interactive" not in self.startup_times:
+            QTimer.singleShot(0, lambda: self.mark_startup("interactive"))
+
+    def mark_startup(self, name):
+        if name in self.startup_times:
+            return
+        self.startup_times[name] = (time.perf_counter() - STARTUP_STARTED) * 1000
+        if name == "interactive":
+            # 只记入追踪（--trace / F12）；--benchmark-startup 另外以 JSON 输出
+            instant("startup", first_paint_ms=round(self.startup_times["first_paint"]),
+                    interactive_ms=round(self.startup_times["interactive"]))
+            # 读取持久化的搜索索引会长时间占用 GIL，放到可交互之后
+            self.setup_indexes()
+            self.setup_backup()
+            self.startup_finished.emit(dict(self.startup_times))
+
+    def save_startup_snapshot(self):
+        """保存文件夹列表和当前项目的片段列表，下次启动时先显示它们"""
+        project_path = self.current_project
+        entries = []
+        if project_path:
+            entries = self.scanner.projects.get(project_path)
+            if entries is None and self.snippet_model.project_path == project_path:
+                entries = [self.snippet_model.entry(row) for row in range(self.snippet_model.rowCount())]
+        try:
+            save_snapshot(self.code_dir, self.folder_bar.folder_names(),
+                          os.path.basename(project_path) if project_path else None,
+                          entries or [], self.content_edit.property("current_file"))
+        except OSError as e:
+            print(f"保存启动快照失败: {e}")
 
     def setup_default_folder(self):
         if not os.path.exists(self.default_folder):
@@ -293,8 +544,7 @@ class CodeCapsule(QMainWindow):
                 "snippet1.py": {"tags": ["python", "example"], "code_type": "python"},
                 "snippet2.sh": {"tags": ["bash", "script"], "code_type": "bash"}
             }
-            with open(project1_path / "metadata.json", "w", encoding="utf-8") as f:
-                json.dump(metadata1, f, indent=4)
+            self.metadata_store.save(project1_path, metadata1)
 
             project2_path = self.default_folder / "demo_project2"
             os.makedirs(project2_path)
@@ -303,145 +553,650 @@ class CodeCapsule(QMainWindow):
             metadata2 = {
                 "snippet3.java": {"tags": ["java", "example"], "code_type": "java"}
             }
-            with open(project2_path / "metadata.json", "w", encoding="utf-8") as f:
-                json.dump(metadata2, f, indent=4)
+            self.metadata_store.save(project2_path, metadata2)
             print("在默认文件夹中创建示例文件")
 
     def on_folder_changed(self):
         selected_folder = self.folder_bar.folder_list.currentItem()
         if selected_folder:
+            self.autosaver.flush()
             folder_name = selected_folder.text().replace("📁 ", "")
-            self.current_project = os.path.join(self.code_dir, folder_name)
-            print(f"切换到文件夹: {self.current_project}")
-            self.content_edit.setReadOnly(True)
-            self.content_edit.setText("")
-            self.tags_edit.setText("")
-            self.code_type_combo.setCurrentIndex(0)
-            self.content_edit.setProperty("current_file", None)
-            self.update_snippet_list()
+            self.note_action("folder_switch", folder_name)
+            with span("folder_switch", folder=folder_name):
+                self.clear_search_bars()
+                self.set_view_mode("project")
+                self.current_project = os.path.join(self.code_dir, folder_name)
+                self.content_edit.setProperty("current_file", None)
+                self.content_edit.setReadOnly(True)
+                self.set_editor_text("")
+                self.tags_edit.setText("")
+                self.code_type_combo.setCurrentIndex(0)
+                self.update_snippet_list()
+
+    def on_folder_clicked(self, item):
+        # 在“所有片段”视图中点击当前文件夹时，currentItemChanged 不会触发，需要手动切回
+        if self.view_mode != "project":
+            self.on_folder_changed()
+
+    def on_library_clicked(self, item):
+        if item.text() == "📂 All Snippets":
+            self.autosaver.flush()
+            self.clear_search_bars()
+            self.set_view_mode("all")
+            self.show_all_snippets()
+
+    def set_view_mode(self, mode):
+        self.view_mode = mode
+        self.sort_combo.setVisible(mode == "all")
+        if mode == "project":
+            self.folder_bar.library_list.setCurrentRow(-1)
+
+    def show_all_snippets(self):
+        """所有项目的片段按选定方式排序，滚动时按页载入"""
+        if self.view_mode != "all":
+            return
+        order = self.sort_combo.currentData()
+        # SqliteCatalog 与 GlobalSnippetIndex 提供相同的 iter_sorted/count
+        listing = self.catalog if self.catalog is not None else self.global_index
+        self.snippet_model.show_results(listing.iter_sorted(order))
+        self.statusBar().showMessage(f"所有片段：{listing.count()} 个", 3000)
+        self.select_snippet_row(self.content_edit.property("current_file"))
 
     def on_new_folder(self):
         # 新建文件夹时刷新代码片段列表
         self.on_folder_changed()
 
     def update_snippet_list(self):
-        # 清空现有卡片
-        for i in reversed(range(self.snippet_layout.count())):
-            widget = self.snippet_layout.itemAt(i).widget()
-            if widget:
-                widget.deleteLater()
-
-        # 填充新卡片
+        """刷新代码片段列表：切换项目时重新载入，否则只对变化的行做增量更新"""
         project_path = self.current_project
         if not project_path or not os.path.exists(project_path):
             print(f"无效的项目路径: {project_path}")
+            self.snippet_model.load_project(None)
             return
 
-        metadata_path = os.path.join(project_path, "metadata.json")
-        metadata = {}
-        if os.path.exists(metadata_path):
-            try:
-                metadata = json.load(open(metadata_path, 'r'))
-            except (json.JSONDecodeError, FileNotFoundError) as e:
-                print(f"加载 metadata.json 失败: {e}")
-                metadata = {}
-
-        files = os.listdir(project_path)
-        print(f"当前文件夹中的文件: {files}")
-        for file in files:
-            if file != "metadata.json":
-                file_path = os.path.join(project_path, file)
-                mod_time = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%H:%M")
-                card = SnippetCard(file, mod_time)
-                card.mousePressEvent = lambda event, f=file: self.on_snippet_clicked(f)
-                self.snippet_layout.addWidget(card)
-        self.snippet_layout.addStretch()
-
-        # 默认选中第一个卡片
-        if self.snippet_layout.count() > 1:  # 排除 stretch
-            first_card = self.snippet_layout.itemAt(0).widget()
-            if first_card:
-                self.on_snippet_clicked(first_card.filename)
+        with span("snippet_list") as s:
+            if project_path != self.snippet_model.project_path:
+                # 先显示上一次扫描的结果（切换文件夹无需访问磁盘），再在后台重新扫描该项目
+                self.snippet_model.load_project(project_path, self.scanner.projects.get(project_path))
+                self.scanner.scan_project_async(project_path)
+            else:
+                self.snippet_model.refresh()
+            s.set(rows=self.snippet_model.rowCount())
+        self.select_default_snippet()
+        self.mark_interactive_soon()
+
+    def select_default_snippet(self):
+        # 保持当前选中的片段；没有选中或已被删除时默认选中第一个卡片
+        current_file = self.content_edit.property("current_file")
+        if self.snippet_model.row_of(self.current_project, current_file) is None and self.snippet_model.rowCount() > 0:
+            self.on_snippet_clicked(self.snippet_model.entry(0).filename)
+
+    def on_project_scanned(self, project_path, entries):
+        # 后台扫描完成：只有仍在显示该项目时才合并到列表
+        if project_path == self.current_project and project_path == self.snippet_model.project_path:
+            self.snippet_model.reconcile(entries)
+            self.select_default_snippet()
+        if project_path == self.current_project:
+            self.watcher.watch_files(project_path, [entry.filename for entry in entries])
+
+    def on_workspace_changed(self, delta):
+        """把外部修改的差异应用到文件夹列表、片段列表、编辑器、索引和备份"""
+        self.folder_bar.apply_delta(delta)
+        self.record_backup(
+            [os.path.join(self.code_dir, folder) for folder in delta.folders_added + delta.folders_removed]
+            + [os.path.join(project_path, filename) for project_path, filename in delta.added + delta.removed + delta.modified]
+            + [path for project_path in delta.projects for path in MetadataStore.metadata_files(project_path)]
+        )
+
+        current_project = self.current_project
+        if current_project in delta.projects:
+            entries = self.scanner.projects.get(current_project, [])
+            if any(project == current_project for project, _ in delta.added + delta.removed):
+                self.watcher.watch_files(current_project, [entry.filename for entry in entries])
+            if current_project == self.snippet_model.project_path:
+                self.snippet_model.reconcile(entries)
+                self.select_default_snippet()
+        current_file = self.content_edit.property("current_file")
+        if (current_project, current_file) in delta.modified:
+            self.reload_current_snippet()
+
+        # 标签索引：重新读取变化项目的 metadata.json（未变化时 MetadataStore 直接返回缓存）
+        for folder in delta.folders_removed:
+            project_path = os.path.join(self.code_dir, folder)
+            self.metadata_store.invalidate(project_path)
+            if self.tag_index is not None:
+                self.tag_index.remove_project(project_path)
+        for project_path in delta.projects:
+            self.submit_index_job(self.metadata_store.get, project_path)
+        for index in (self.search_index, self.duplicate_index):
+            if index is None:
+                continue
+            for project_path, filename in delta.removed:
+                self.submit_index_job(index.remove_document, project_path, filename)
+            for project_path, filename in delta.added + delta.modified:
+                self.submit_index_job(index.update_document, project_path, filename)
+        if self.catalog is not None:
+            # 只改了 metadata.json 时上面没有变化的文件，标签和类型要按项目同步进数据库
+            for project_path in delta.projects:
+                self.submit_index_job(self.catalog.refresh_project, project_path)
+            self.submit_index_job(self._emit_catalog_tags)
+        if delta.added or delta.removed or delta.modified:
+            self.lookup_duplicates()
+
+    def reload_current_snippet(self):
+        """当前片段在外部被修改：没有未保存的编辑时重新载入（自己保存引起的事件忽略）"""
+        filename = self.content_edit.property("current_file")
+        if self.autosaver.has_pending():
+            return
+        if self.is_previewing():
+            self.on_snippet_clicked(filename)
+            return
+        file_path = os.path.join(self.current_project, filename)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return
+        if not self.autosaver.is_clean(file_path, text):
+            instant("external_reload", file=file_path)
+            self.on_snippet_clicked(filename)
+
+    def on_scan_finished(self, generation, folders):
+        self.statusBar().showMessage(f"共 {len(folders)} 个项目", 3000)
+        # 在后台建好快速打开的索引，第一次按 Ctrl+P 时不必等待；之后只更新变化的项目
+        self.submit_index_job(self.quick_open_index.refresh)
+        # 首次扫描结束时仍没有打开任何片段（例如主文件夹为空），也算启动完成
+        self.mark_startup("interactive")
+
+    def on_scan_progress(self, done, total):
+        self.statusBar().showMessage(f"正在扫描项目 {done}/{total}")
+
+    def on_snippet_row_changed(self, current, previous):
+        if self._syncing_selection or not current.isValid():
+            return
+        # 搜索结果可能来自其他项目
+        project_path = current.data(ProjectRole)
+        if project_path != self.current_project:
+            self.autosaver.flush()
+            self.current_project = project_path
+            self.folder_bar.select_folder(os.path.basename(project_path))
+        self.on_snippet_clicked(current.data(FilenameRole))
+
+    def on_quick_open_chosen(self, project_path, filename):
+        """切换到快速打开选中的片段所在的项目，再像点击卡片一样打开它"""
+        self.autosaver.flush()
+        self.note_action("quick_open", filename)
+        with span("quick_open", file=filename):
+            self.clear_search_bars()
+            self.set_view_mode("project")
+            self.current_project = project_path
+            self.folder_bar.select_folder(os.path.basename(project_path))
+            # 先记下要打开的片段，刷新列表时就不会默认打开第一个卡片
+            self.content_edit.setProperty("current_file", filename)
+            self.update_snippet_list()
+            self.on_snippet_clicked(filename)
+
+    def select_snippet_row(self, filename):
+        """让列表的选中项与当前打开的片段保持一致，不触发重新加载"""
+        row = self.snippet_model.row_of(self.current_project, filename)
+        if row is None:
+            return
+        self._syncing_selection = True
+        try:
+            self.snippet_list.selectionModel().setCurrentIndex(
+                self.snippet_model.index(row), QItemSelectionModel.ClearAndSelect
+            )
+        finally:
+            self._syncing_selection = False
 
     def on_snippet_clicked(self, filename):
         if not self.current_project:
             print("当前项目路径未设置")
             return
 
-        file_path = os.path.join(self.current_project, filename)
-        print(f"点击代码片段: {file_path}")
+        self.note_action("snippet_click", filename)
+        with span("snippet_click", file=filename):
+            # 切换片段前先把上一个片段的修改写盘
+            with span("autosave_flush"):
+                self.autosaver.flush()
+            self.content_edit.setProperty("current_file", None)
+            file_path = os.path.join(self.current_project, filename)
+            snippet_data = self.metadata_store.get_snippet(self.current_project, filename)
+            # 先切换语言再载入内容，避免按旧语言高亮一遍
+            self.highlighter.set_language(snippet_data["code_type"])
+            self.open_snippet_file(file_path)
+            self.tags_edit.setText(", ".join(snippet_data["tags"]))
+            self.code_type_combo.setCurrentText(snippet_data["code_type"])
+            self.content_edit.setReadOnly(False)
+            self.content_edit.setProperty("current_file", filename)
+            self.select_snippet_row(filename)
+            self.lookup_duplicates()
+
+    def open_snippet_file(self, file_path, force_edit=False):
+        """小文件直接进入编辑器；大文件和非 UTF-8 文件以只读预览打开，除非 force_edit"""
+        with span("file_load", file=os.path.basename(file_path)):
+            self._open_snippet_file(file_path, force_edit)
+
+    def _open_snippet_file(self, file_path, force_edit):
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                self.content_edit.setText(f.read())
+            if force_edit or os.path.getsize(file_path) <= PREVIEW_THRESHOLD:
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+                encoding = "utf-8" if is_utf8(data) else detect_encoding(data) if force_edit else None
+                if encoding is not None:
+                    # 按检测到的编码完整解码，不用替换字符，保存时内容不会丢失
+                    text = data.decode(encoding)
+                    self.set_editor_text(text)
+                    self.autosaver.mark_clean(file_path, text)
+                    return
+                if force_edit:
+                    self.statusBar().showMessage("文件像是二进制内容，无法无损地转为文本，只能预览", 5000)
+                reason = "非 UTF-8 编码"
+            else:
+                reason = "文件较大"
+            preview = self.ensure_preview()
+            preview.open(file_path, reason)
+            self.editor_stack.setCurrentWidget(preview)
         except FileNotFoundError:
             print(f"文件未找到: {file_path}")
-            self.content_edit.setText("文件未找到")
-        metadata_path = os.path.join(self.current_project, "metadata.json")
-        metadata = {}
-        if os.path.exists(metadata_path):
-            try:
-                metadata = json.load(open(metadata_path, 'r'))
-            except (json.JSONDecodeError, FileNotFoundError) as e:
-                print(f"加载 metadata.json 失败: {e}")
-                metadata = {}
-        snippet_data = metadata.get(filename, {})
-        self.tags_edit.setText(", ".join(snippet_data.get("tags", [])))
-        self.code_type_combo.setCurrentText(snippet_data.get("code_type", "txt"))
-        self.content_edit.setReadOnly(False)
-        self.content_edit.setProperty("current_file", filename)
+            self.set_editor_text("文件未找到")
+        except OSError as e:
+            # 例如列表刷新前被替换成同名目录的片段
+            print(f"无法打开文件: {file_path} {e}")
+            self.set_editor_text("无法打开文件")
+
+    def edit_anyway(self):
+        # 把预览中的文件完整载入编辑器；非 UTF-8 内容按检测到的编码载入，保存时会转为 UTF-8
+        filename = self.content_edit.property("current_file")
+        if filename and self.current_project:
+            self.open_snippet_file(os.path.join(self.current_project, filename), force_edit=True)
+
+    def ensure_preview(self):
+        if self.preview is None:
+            self.preview = FilePreview()
+            self.preview.edit_requested.connect(self.edit_anyway)
+            self.editor_stack.addWidget(self.preview)
+        return self.preview
+
+    def is_previewing(self):
+        return self.preview is not None and self.editor_stack.currentWidget() is self.preview
+
+    def set_editor_text(self, text):
+        """程序加载内容时不触发自动保存"""
+        if self.preview is not None:
+            self.preview.close_file()
+        self.editor_stack.setCurrentWidget(self.content_edit)
+        self.content_edit.blockSignals(True)
+        self.content_edit.setPlainText(text)
+        self.content_edit.blockSignals(False)
 
     def on_text_changed(self):
+        # 每次按键只标记为脏，真正的写盘由 AutoSaver 合并后在后台完成
         selected_filename = self.content_edit.property("current_file")
         if selected_filename and self.current_project:
-            file_path = os.path.join(self.current_project, selected_filename)
-            try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(self.content_edit.toPlainText())
-            except Exception as e:
-                print(f"保存文件失败: {e}")
-            metadata_path = os.path.join(self.current_project, "metadata.json")
-            metadata = {}
-            if os.path.exists(metadata_path):
-                try:
-                    metadata = json.load(open(metadata_path, 'r'))
-                except (json.JSONDecodeError, FileNotFoundError) as e:
-                    print(f"加载 metadata.json 失败: {e}")
-                    metadata = {}
-            tags = [tag.strip() for tag in self.tags_edit.text().split(",")]
-            metadata[selected_filename] = {"tags": tags, "code_type": self.code_type_combo.currentText()}
-            try:
-                with open(metadata_path, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, indent=4)
-            except Exception as e:
-                print(f"保存 metadata.json 失败: {e}")
-            self.update_snippet_list()
+            self.autosaver.schedule(self.current_project, selected_filename, self.snapshot_editor)
+
+    def snapshot_editor(self):
+        # 由 AutoSaver 在界面线程中调用，之后在后台写盘
+        self.note_action("save", self.content_edit.property("current_file") or "")
+        tags = [tag.strip() for tag in self.tags_edit.text().split(",")]
+        # 预览中的文件只保存标签和类型，不改动文件内容
+        text = None if self.is_previewing() else self.content_edit.toPlainText()
+        return text, tags, self.code_type_combo.currentText()
+
+    def note_action(self, name, detail=""):
+        if self.watchdog is not None:
+            self.watchdog.note_action(name, detail)
+
+    def on_snippet_saved(self, project_path, filename):
+        # 只刷新被保存的那一行的修改时间，不重建整个列表
+        self.snippet_model.update_mtime(project_path, filename)
+        self.update_documents(project_path, filename)
+        self.record_backup([os.path.join(project_path, filename), *MetadataStore.metadata_files(project_path)])
+        if project_path == self.current_project and filename == self.content_edit.property("current_file"):
+            self.lookup_duplicates()
 
     def create_new_snippet(self):
         if not self.current_project:
             return
         filename, ok = QInputDialog.getText(self, "新建代码片段", "请输入文件名:")
         if ok and filename:
-            file_path = os.path.join(self.current_project, filename)
-            if not os.path.exists(file_path):
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write("")
+            try:
+                SnippetStore(self.code_dir, self.metadata_store).create_snippet(os.path.basename(self.current_project), filename)
+            except (ValueError, OSError) as e:
+                print(f"新建代码片段失败: {e}")
+            else:
+                self.clear_search_bars()
+                self.set_view_mode("project")
                 self.update_snippet_list()
+                self.on_snippet_clicked(filename)
+                self.update_documents(self.current_project, filename)
+                self.record_backup([os.path.join(self.current_project, filename),
+                                    *MetadataStore.metadata_files(self.current_project)])
+
+    def setup_indexes(self):
+        """为当前主文件夹建立标签索引、加载持久化的搜索索引，并在后台与磁盘同步"""
+        # storage_backend 为 sqlite 时使用 SQLite 目录数据库（FTS5），否则使用 JSON 倒排索引
+        settings = app_settings()
+        catalog = None
+        if settings.value("storage_backend", "json") == "sqlite":
+            # 只有使用 SQLite 后端时才导入
+            import sqlite3
+            from sqlite_catalog import SqliteCatalog
+            try:
+                catalog = SqliteCatalog(self.code_dir, self.metadata_store)
+            except (RuntimeError, sqlite3.Error) as e:
+                print(f"无法打开 SQLite 目录数据库，改用 JSON 索引: {e}")
+        search_index = catalog if catalog is not None else SearchIndex(self.code_dir, self.metadata_store)
+        self.search_index = search_index
+        self.catalog = None
+        self._catalog_tags = {}
+
+        # 标签列表的数量来自 TagIndex；使用 SQLite 后端时改由数据库统计，不再建立 TagIndex
+        tag_index = None
+        if catalog is None:
+            tag_index = TagIndex()
+            tag_index.add_listener(self.tags_changed.emit)
+        self.tag_index = tag_index
+        self.folder_bar.tag_model.clear()
+        duplicate_index = DuplicateIndex(self.code_dir)
+        self.duplicate_index = duplicate_index
+
+        def load_and_refresh():
+            if tag_index is not None:
+                try:
+                    with span("tag_index_build"):
+                        tag_index.build(self.code_dir, self.metadata_store)
+                except FileNotFoundError as e:
+                    print(f"构建标签索引失败: {e}")
+            with span("search_index_load"):
+                search_index.load()
+            try:
+                with span("search_index_refresh"):
+                    search_index.refresh(cancelled=lambda: self.search_index is not search_index)
+            except FileNotFoundError as e:
+                print(f"刷新搜索索引失败: {e}")
+            with span("search_index_save"):
+                search_index.save()
+            if catalog is not None and self.search_index is catalog:
+                # 数据库已与磁盘同步，之后的视图改为查询数据库
+                self.catalog = catalog
+                self._emit_catalog_tags()
+            # 内容哈希按 (mtime, size) 缓存，未变化的文件只需 stat
+            try:
+                with span("duplicate_index_refresh"):
+                    duplicate_index.load()
+                    duplicate_index.refresh(cancelled=lambda: self.duplicate_index is not duplicate_index)
+            except FileNotFoundError as e:
+                print(f"刷新重复索引失败: {e}")
+            duplicate_index.save()
+            self._emit_duplicates()
+
+        self.submit_index_job(load_and_refresh)
+
+    def submit_index_job(self, fn, *args):
+        """在索引线程中执行 fn(*args)；窗口关闭、执行器已停止后忽略"""
+        if not self._closing:
+            self.index_executor.submit(fn, *args)
+
+    def update_documents(self, project_path, filename):
+        """片段保存或新建后更新搜索索引和重复索引"""
+        for index in (self.search_index, self.duplicate_index):
+            if index is not None:
+                self.submit_index_job(index.update_document, project_path, filename)
+        if self.catalog is not None:
+            self.submit_index_job(self._emit_catalog_tags)
+
+    def _emit_catalog_tags(self):
+        # 在索引线程中执行：数据库中的标签数与上次相比有变化时更新标签列表（0 表示标签已不存在）
+        catalog = self.catalog
+        if catalog is None:
+            return
+        counts = catalog.tag_counts()
+        changed = {tag: count for tag, count in counts.items() if self._catalog_tags.get(tag) != count}
+        changed.update({tag: 0 for tag in self._catalog_tags if tag not in counts})
+        self._catalog_tags = counts
+        if changed:
+            self.tags_changed.emit(changed)
+
+    def lookup_duplicates(self):
+        """在索引线程中查找当前片段的重复副本（排在已提交的索引更新之后），结果通过 duplicates_found 返回"""
+        filename = self.content_edit.property("current_file")
+        self._duplicate_query = (self.current_project, filename) if filename and self.current_project else None
+        if self._duplicate_query is None:
+            self.duplicates_label.hide()
+            return
+        self.submit_index_job(self._emit_duplicates)
+
+    def _emit_duplicates(self):
+        # 在索引线程中执行
+        query = self._duplicate_query
+        duplicate_index = self.duplicate_index
+        if query is not None and duplicate_index is not None:
+            self.duplicates_found.emit(query[0], query[1], duplicate_index.duplicates_of(*query))
+
+    def on_duplicates_found(self, project_path, filename, locations):
+        if (project_path, filename) != self._duplicate_query:
+            return
+        if not locations:
+            self.duplicates_label.hide()
+            return
+        shown = "，".join(f"{project_name}/{name}" for project_name, name in locations[:5])
+        more = f" 等 {len(locations)} 处" if len(locations) > 5 else ""
+        self.duplicates_label.setText(f"与以下片段内容相同：{shown}{more}")
+        self.duplicates_label.show()
+
+    def on_metadata_loaded(self, project_path, metadata):
+        # 元数据被读入或写入时增量更新标签索引（可能在后台线程中调用）
+        tag_index = self.tag_index
+        if tag_index is not None and os.path.dirname(os.path.normpath(project_path)) == os.path.normpath(self.code_dir):
+            tag_index.update_project(project_path, metadata)
+
+    def on_tag_clicked(self, index):
+        # 列出所有项目中带有该标签的片段
+        tag = index.data(TagRole)
+        self.clear_search_bars()
+        if self.catalog is not None:
+            self.snippet_model.show_results(self.catalog.iter_sorted("project", tag=tag))
+        elif self.tag_index is not None:
+            self.snippet_model.show_snippets(
+                (os.path.join(self.code_dir, project_name), filename)
+                for project_name, filename in self.tag_index.snippets_for(tag)
+            )
+        self.select_snippet_row(self.content_edit.property("current_file"))
+
+    def on_project_search(self, text):
+        # 中间搜索框：只在当前项目中搜索（“所有片段”视图中搜索所有项目）
+        self.run_search(text, None if self.view_mode == "all" else self.current_project)
+
+    def on_global_search(self, text):
+        # 左侧搜索框：在所有项目中搜索
+        self.run_search(text, None)
+
+    def run_search(self, text, project_path):
+        if not text.strip():
+            # 清空搜索后回到当前视图
+            if self.view_mode == "all":
+                self.show_all_snippets()
+                return
+            self.snippet_model.load_project(self.current_project, self.scanner.projects.get(self.current_project))
+            self.select_snippet_row(self.content_edit.property("current_file"))
+            return
+        if self.search_index is None:
+            # 索引在启动完成后才加载
+            return
+        with span("search", query=text, scope="project" if project_path else "all") as s:
+            hits = self.search_index.search(text, project_path)
+            self.snippet_model.show_results(
+                SnippetEntry(os.path.join(self.code_dir, project_name), filename, mtime)
+                for project_name, filename, mtime in hits
+            )
+            s.set(hits=len(hits))
+        self.select_snippet_row(self.content_edit.property("current_file"))
+
+    def clear_search_bars(self):
+        for search_bar in (self.search_bar, self.folder_bar.search_bar):
+            search_bar.blockSignals(True)
+            search_bar.clear()
+            search_bar.blockSignals(False)
+
+    def dragEnterEvent(self, event):
+        if any(os.path.isdir(url.toLocalFile()) for url in event.mimeData().urls()):
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        folders = [url.toLocalFile() for url in event.mimeData().urls() if os.path.isdir(url.toLocalFile())]
+        if folders:
+            event.acceptProposedAction()
+            self.start_import(folders)
+
+    def setup_backup(self):
+        """为当前主文件夹打开备份仓库，并在后台提交上次退出后遗留的修改（第一次使用时为完整备份）"""
+        if self.backup is not None and self.backup.has_pending():
+            # 切换主文件夹前先提交原来的修改
+            self.backup_executor.submit(self._backup_job, self.backup, False)
+        self.backup = self.autosaver.backup = None
+        self.backup_timer.stop()
+        settings = app_settings()
+        if str(settings.value("backup_enabled", "false")).lower() != "true":
+            return
+        try:
+            self.backup = GitBackup(self.code_dir, settings.value("backup_remote") or None)
+        except BackupError as e:
+            print(f"无法启用备份: {e}")
+            return
+        self.autosaver.backup = self.backup
+        self.backup_executor.submit(self._backup_job, self.backup, True)
+
+    def record_backup(self, paths):
+        """把变化的路径记入备份的变更日志，并开始计时；计时期间的其他修改合并到同一个提交"""
+        if self.backup is None or not paths:
+            return
+        self.backup.record(paths)
+        # 关闭窗口后仍记入变更日志，下次启动时提交
+        if not self._closing and not self.backup_timer.isActive():
+            self.backup_timer.start()
+
+    def run_backup(self):
+        if self.backup is not None:
+            self.backup_executor.submit(self._backup_job, self.backup, True)
+
+    @staticmethod
+    def _backup_job(backup, push):
+        # 在备份线程中执行
+        try:
+            with span("backup_commit"):
+                backup.commit()
+            if push:
+                with span("backup_push"):
+                    backup.push()
+        except (BackupError, OSError) as e:
+            print(f"备份失败: {e}")
+
+    def start_import(self, folders):
+        """把拖入的文件夹导入为同名项目（后台进行）"""
+        if self._import_running:
+            self.statusBar().showMessage("上一次导入尚未完成", 3000)
+            return
+        self._import_running = True
+        self._import_cancelled = False
+        self.cancel_import_button.show()
+        instant("import_start", folders=", ".join(folders))
+
+        def progress(done, total):
+            # 每 100 个文件报告一次，避免大量信号堆积在界面线程
+            if done % 100 == 0 or done == total:
+                self.import_progress.emit(done, total)
+
+        def run():
+            try:
+                with span("import"):
+                    result = import_folders(self.code_dir, folders, self.metadata_store, progress=progress,
+                                            cancelled=lambda: self._import_cancelled)
+            except (ValueError, OSError) as e:
+                result = e
+            self.import_finished.emit(result)
+
+        self.import_executor.submit(run)
+
+    def cancel_import(self):
+        self._import_cancelled = True
+
+    def on_import_finished(self, result):
+        self._import_running = False
+        self.cancel_import_button.hide()
+        if isinstance(result, Exception):
+            self.statusBar().showMessage(f"导入失败: {result}", 5000)
+            return
+        # 新文件夹和片段由文件监听合并到列表和索引中；元数据在导入最后才写入，备份整个项目目录
+        self.record_backup({project_path for project_path, _ in result.snippets})
+        message = (f"导入 {result.imported} 个片段，重复 {result.duplicates} 个，跳过 {result.skipped} 个，"
+                   f"失败 {result.failed} 个")
+        self.statusBar().showMessage(("导入已取消：" if result.cancelled else "") + message, 5000)
+
+    def closeEvent(self, event):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        self._closing = True
+        # 扫描器关闭后不能再提交增量扫描
+        self.watcher.stop()
+        # 关闭窗口前确保所有修改已写盘
+        self._import_cancelled = True
+        self.import_executor.shutdown(wait=True)
+        self.autosaver.shutdown()
+        # 退出前提交尚未备份的修改（不推送，下次启动时再推送）
+        self.backup_timer.stop()
+        if self.backup is not None and self.backup.has_pending():
+            self.backup_executor.submit(self._backup_job, self.backup, False)
+        self.backup_executor.shutdown(wait=True)
+        self.save_startup_snapshot()
+        self.scanner.shutdown()
+        for index in (self.search_index, self.duplicate_index):
+            if index is not None:
+                self.index_executor.submit(index.save)
+        self.index_executor.shutdown(wait=True)
+        super().closeEvent(event)
 
     def open_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "选择主文件夹")
         if folder:
+            self.save_startup_snapshot()
             self.code_dir = folder
-            self.folder_bar.code_dir = self.code_dir
-            self.folder_bar.watcher.removePath(str(self.code_dir))
-            self.folder_bar.watcher.addPath(str(self.code_dir))
-            self.folder_bar.update_folder_list()
-            settings = QSettings("MyCompany", "CodeCapsule")
+            if self.watchdog is not None:
+                self.watchdog.set_log_path(internal_path(self.code_dir, "stall.log"))
+            self.watcher.set_code_dir(self.code_dir)
+            self.folder_bar.set_code_dir(self.code_dir)
+            self.setup_indexes()
+            self.setup_backup()
+            settings = app_settings()
             settings.setValue("code_dir", folder)
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="代码胶囊")
+    parser.add_argument("--code-dir", help="主文件夹，默认使用上次打开的文件夹")
+    parser.add_argument("--benchmark-startup", action="store_true",
+                        help="启动完成后输出各阶段耗时（JSON）并退出，供 benchmarks/startup.py 使用")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="记录各操作的耗时，退出时写入 Chrome trace 文件（可用 chrome://tracing 或 Perfetto 打开）")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setWindowIcon(QIcon('logo.svg'))
-    window = CodeCapsule()
+    if args.trace:
+        tracer.enable()
+        app.aboutToQuit.connect(lambda: tracer.export(args.trace))
+    window = CodeCapsule(args.code_dir)
+    if args.benchmark_startup:
+        def report(times):
+            # 换算成墙上时间，基准脚本据此加上解释器自身的启动时间
+            main_started_at = time.time() - (time.perf_counter() - STARTUP_STARTED)
+            print("STARTUP " + json.dumps(dict(times, main_started_at=main_started_at)), flush=True)
+            window.close()
+            app.quit()
+        window.startup_finished.connect(report)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
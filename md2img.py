@@ -1,16 +1,27 @@
 import sys
-import os
-import markdown
-import imgkit
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QTextEdit, QLabel, QScrollArea
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer, Signal
 from PySide6.QtGui import QPixmap
 
+from code_image import CodeImageRenderer, theme_key
+from snippet_render import DEFAULT_STYLE, parse_code_block, render_key, render_png
+
+# 输入停止多久后自动渲染（毫秒）
+PREVIEW_DELAY_MS = 400
+# 最多缓存多少张渲染结果
+RENDER_CACHE_SIZE = 32
+
 
 class MarkdownToImageApp(QMainWindow):
+    # 渲染在后台线程完成，结果带着请求编号回到 GUI 线程
+    rendered = Signal(int, str, bytes)       # generation, key, png
+    render_failed = Signal(int, str)         # generation, error
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Markdown 转图片工具")
@@ -50,49 +61,90 @@ class MarkdownToImageApp(QMainWindow):
         main_layout.setStretch(1, 0)  # 按钮区域
         main_layout.setStretch(2, 1)  # 图片预览区域
 
+        # 后台渲染：单线程执行器，每次新请求都让尚未开始的旧请求作废
+        self.style = DEFAULT_STYLE
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="md2img")
+        # 只有一个代码块的输入用 QPainter 直接绘制（不需要 wkhtmltoimage），在渲染线程中第一次使用时创建
+        self._code_renderer = None
+        self._generation = 0
+        # render_key -> PNG 字节
+        self._cache = OrderedDict()
+        self.rendered.connect(self.on_rendered)
+        self.render_failed.connect(self.on_render_failed)
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(PREVIEW_DELAY_MS)
+        self._debounce.timeout.connect(self.convert_to_image)
+        self.markdown_edit.textChanged.connect(self.request_render)
+
+    def request_render(self):
+        """输入停顿后自动渲染，实现实时预览"""
+        self._debounce.start()
+
     def convert_to_image(self):
-        """将 Markdown 内容转换为图片并显示"""
+        """将 Markdown 内容提交给后台渲染，结果通过 rendered 信号回到界面"""
+        self._debounce.stop()
         markdown_text = self.markdown_edit.toPlainText()
+        self._generation += 1
         if not markdown_text:
             self.image_label.setText("请输入 Markdown 内容")
             return
 
-        try:
-            # 将 Markdown 转换为 HTML
-            html = markdown.markdown(markdown_text, extensions=['fenced_code'])
-
-            # 添加简单的 CSS 样式以美化输出
-            html_with_style = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; padding: 20px; background-color: #f5f5f5; }}
-                    pre, code {{ background-color: #e0e0e0; padding: 5px; border-radius: 3px; }}
-                </style>
-            </head>
-            <body>{html}</body>
-            </html>
-            """
-
-            # 将 HTML 保存为临时文件
-            temp_html_path = "temp.html"
-            with open(temp_html_path, "w", encoding="utf-8") as f:
-                f.write(html_with_style)
-
-            # 使用 imgkit 将 HTML 转换为图片
-            output_image_path = "output.png"
-            imgkit.from_file(temp_html_path, output_image_path)
-
-            # 删除临时 HTML 文件
-            os.remove(temp_html_path)
-
-            # 在界面中显示图片
-            pixmap = QPixmap(output_image_path)
-            self.image_label.setPixmap(pixmap.scaled(600, 400, Qt.KeepAspectRatio))
-            self.image_label.adjustSize()
+        code = parse_code_block(markdown_text)
+        if code is not None:
+            # 与批量导出的 native 引擎使用同样的键
+            text, code_type = code
+            key = render_key(code_type + "\0" + text, theme_key())
+        else:
+            key = render_key(markdown_text, self.style)
+        png = self._cache.get(key)
+        if png is not None:
+            # 相同内容和样式已经渲染过，直接显示
+            self._cache.move_to_end(key)
+            self.show_image(png)
+            return
+        self.image_label.setText("正在渲染...")
+        self._executor.submit(self._render, self._generation, key, markdown_text, self.style, code)
 
+    def _render(self, generation, key, markdown_text, style, code=None):
+        # 后台线程执行；已经有更新的请求时直接跳过
+        if generation != self._generation:
+            return
+        try:
+            if code is not None:
+                if self._code_renderer is None:
+                    self._code_renderer = CodeImageRenderer()
+                png = self._code_renderer.render_png(*code)
+            else:
+                # 其他 Markdown（标题、列表、多个代码块等）仍经 HTML 交给 wkhtmltoimage
+                png = render_png(markdown_text, style)
         except Exception as e:
-            self.image_label.setText(f"转换失败: {str(e)}")
+            self.render_failed.emit(generation, str(e))
+            return
+        self.rendered.emit(generation, key, png)
+
+    def on_rendered(self, generation, key, png):
+        self._cache[key] = png
+        while len(self._cache) > RENDER_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        # 过期请求的结果只进缓存，不覆盖最新的预览
+        if generation == self._generation:
+            self.show_image(png)
+
+    def on_render_failed(self, generation, error):
+        if generation == self._generation:
+            self.image_label.setText(f"转换失败: {error}")
+
+    def show_image(self, png):
+        pixmap = QPixmap()
+        pixmap.loadFromData(png, "PNG")
+        self.image_label.setPixmap(pixmap.scaled(600, 400, Qt.KeepAspectRatio))
+        self.image_label.adjustSize()
+
+    def closeEvent(self, event):
+        self._generation += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+
+from file_utils import atomic_write_text, fsync_directory, iter_projects, METADATA_FILENAME, METADATA_JOURNAL_FILENAME
+from tracing import span
+
+JOURNAL_VERSION = 1
+# 日志中的条目数超过 max(COMPACT_MIN_ENTRIES, 片段数) 时合并进 metadata.json
+COMPACT_MIN_ENTRIES = 256
+
+
+class MetadataStore:
+    """各项目元数据的内存缓存，也是读写标签和 code_type 的唯一入口
+
+    每个项目的元数据由快照 metadata.json 和追加日志 metadata.journal 组成：
+    修改只向日志追加变化的条目（每次 update 一次写入、一次 fsync），写入量与项目大小无关；
+    日志变长后再整体写一次 metadata.json（先写临时文件再重命名）并删除日志。
+    读取时先读快照再按顺序重放日志，重放是幂等的，合并中途崩溃也不会丢失或损坏数据。
+    原有的 metadata.json 就是快照格式，无需转换；合并后只剩 metadata.json，旧版本也能读取。
+
+    读取时只 stat 这两个文件，(mtime, size) 都未变就直接返回已解析的数据；
+    缓存总量超过 max_bytes（按文件大小估算）时淘汰最久未使用的项目。
+    返回的字典由缓存持有，调用方不要直接修改，写入请使用 set_snippet/update 等方法。
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # project_path -> (signature, metadata, size, 日志条目数)
+        self._cache = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """注册 callback(project_path, metadata)，在元数据被重新读入或写入后调用"""
+        self._listeners.append(callback)
+
+    def _notify(self, project_path, metadata):
+        for callback in self._listeners:
+            callback(project_path, metadata)
+
+    @staticmethod
+    def metadata_path(project_path):
+        return os.path.join(project_path, METADATA_FILENAME)
+
+    @staticmethod
+    def journal_path(project_path):
+        return os.path.join(project_path, METADATA_JOURNAL_FILENAME)
+
+    @classmethod
+    def metadata_files(cls, project_path):
+        """保存项目元数据的所有文件（备份、监听外部修改时使用）"""
+        return [cls.metadata_path(project_path), cls.journal_path(project_path)]
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _signature(self, project_path):
+        """快照和日志的 (mtime, size)；两者都不存在时返回 None"""
+        signature = (self._stat(self.metadata_path(project_path)), self._stat(self.journal_path(project_path)))
+        return None if signature == (None, None) else signature
+
+    def get(self, project_path):
+        """返回项目的全部元数据 {filename: {"tags": [...], "code_type": ...}}"""
+        project_path = str(project_path)
+        signature = self._signature(project_path)
+        with self._lock:
+            cached = self._cache.get(project_path)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(project_path)
+                return cached[1]
+            metadata = {}
+            if signature is None:
+                self._drop(project_path)
+            else:
+                with span("metadata_load", project=os.path.basename(project_path)):
+                    metadata, entries = self._read(project_path)
+                self._put(project_path, signature, metadata, entries)
+        if signature is not None or cached is not None:
+            self._notify(project_path, metadata)
+        return metadata
+
+    def get_snippet(self, project_path, filename):
+        """返回单个片段的元数据副本，缺失时给出默认值"""
+        data = self.get(project_path).get(filename, {})
+        return {"tags": list(data.get("tags", [])), "code_type": data.get("code_type", "txt")}
+
+    def set_snippet(self, project_path, filename, tags, code_type):
+        """写入单个片段的元数据，内容未变化时不写盘；返回是否发生写入"""
+        return self.update(project_path, {filename: {"tags": list(tags), "code_type": code_type}})
+
+    def update(self, project_path, entries):
+        """批量写入多个片段的元数据，每个项目只追加一次日志"""
+        project_path = str(project_path)
+        with self._lock:
+            metadata = self.get(project_path)
+            changed = {name: entry for name, entry in entries.items() if metadata.get(name) != entry}
+            if not changed:
+                return False
+            metadata = dict(metadata)
+            metadata.update(changed)
+            self._log(project_path, metadata, changed)
+        self._notify(project_path, metadata)
+        return True
+
+    def remove_snippet(self, project_path, filename):
+        project_path = str(project_path)
+        with self._lock:
+            metadata = self.get(project_path)
+            if filename not in metadata:
+                return False
+            metadata = dict(metadata)
+            del metadata[filename]
+            self._log(project_path, metadata, {filename: None})
+        self._notify(project_path, metadata)
+        return True
+
+    def create_project(self, project_path):
+        """为新项目创建空的 metadata.json"""
+        self.save(project_path, {})
+
+    def save(self, project_path, metadata):
+        """整体写入项目元数据（写快照并删除日志），并用写入后的 stat 刷新缓存"""
+        project_path = str(project_path)
+        with self._lock:
+            self._write(project_path, metadata)
+        self._notify(project_path, metadata)
+
+    def compact(self, project_path):
+        """把日志合并进 metadata.json，返回是否有日志被合并"""
+        project_path = str(project_path)
+        with self._lock:
+            if not os.path.exists(self.journal_path(project_path)):
+                return False
+            self._write(project_path, self.get(project_path))
+        return True
+
+    def invalidate(self, project_path=None):
+        with self._lock:
+            if project_path is None:
+                self._cache.clear()
+                self._total_bytes = 0
+            else:
+                self._drop(str(project_path))
+
+    # ---- 快照和日志 ----
+    def _read(self, project_path):
+        """读快照并重放日志，返回 (metadata, 日志条目数)"""
+        metadata = {}
+        try:
+            with open(self.metadata_path(project_path), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            print(f"加载 metadata.json 失败: {e}")
+        entries = 0
+        try:
+            with open(self.journal_path(project_path), 'rb') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return metadata, entries
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except (ValueError, UnicodeDecodeError):
+                # 写到一半时崩溃留下的不完整记录
+                continue
+            if "version" in record:
+                if record["version"] != JOURNAL_VERSION:
+                    print(f"不支持的元数据日志版本 {record['version']}: {self.journal_path(project_path)}")
+                    break
+                continue
+            if record.get("d"):
+                metadata.pop(record["s"], None)
+            else:
+                metadata[record["s"]] = record["m"]
+            entries += 1
+        return metadata, entries
+
+    def _log(self, project_path, metadata, changes):
+        """记录一批修改（entry 为 None 表示删除）：追加到日志，日志过长时改为整体写快照"""
+        cached = self._cache.get(project_path)
+        entries = (cached[3] if cached is not None else 0) + len(changes)
+        if entries > max(COMPACT_MIN_ENTRIES, len(metadata)):
+            self._write(project_path, metadata)
+            return
+        records = [{"s": name, "d": True} if entry is None else {"s": name, "m": entry} for name, entry in changes.items()]
+        with span("metadata_append", project=os.path.basename(project_path), entries=len(records)):
+            with open(self.journal_path(project_path), 'a+b') as f:
+                prefix = b""
+                created = f.tell() == 0
+                if created:
+                    prefix = json.dumps({"version": JOURNAL_VERSION}).encode('utf-8') + b"\n"
+                else:
+                    # 上次写到一半崩溃时最后一行没有换行符，先补上，不让新记录接在残缺的行后面
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        prefix = b"\n"
+                f.write(prefix + "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            if created:
+                # 新建的日志文件本身也要落盘，否则断电后可能整个文件都不见了
+                fsync_directory(project_path)
+        self._put(project_path, self._signature(project_path), metadata, entries)
+
+    def _write(self, project_path, metadata):
+        with span("metadata_save", project=os.path.basename(project_path)):
+            # 快照要确实落盘（内容和重命名）之后才能删除日志，否则断电后可能只剩残缺的快照而没有日志
+            atomic_write_text(self.metadata_path(project_path), json.dumps(metadata, indent=4), durable=True)
+            # 快照已包含日志中的所有修改；删除日志前崩溃的话，重放日志得到的结果也一样
+            try:
+                os.remove(self.journal_path(project_path))
+            except FileNotFoundError:
+                pass
+        self._put(project_path, self._signature(project_path), metadata, 0)
+
+    def _put(self, project_path, signature, metadata, entries):
+        self._drop(project_path)
+        size = sum(part[1] for part in signature if part is not None) if signature else 0
+        self._cache[project_path] = (signature, metadata, size, entries)
+        self._total_bytes += size
+        # 至少保留最近使用的一个项目
+        while self._total_bytes > self.max_bytes and len(self._cache) > 1:
+            _, (_, _, old_size, _) = self._cache.popitem(last=False)
+            self._total_bytes -= old_size
+
+    def _drop(self, project_path):
+        cached = self._cache.pop(project_path, None)
+        if cached is not None:
+            self._total_bytes -= cached[2]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把各项目的 metadata.journal 合并进 metadata.json（例如换回旧版本之前）")
+    parser.add_argument("code_dir", nargs="?", default=os.path.join(os.getcwd(), "code_dir"))
+    args = parser.parse_args()
+
+    store = MetadataStore()
+    started = time.perf_counter()
+    compacted = sum(store.compact(project_path) for _, project_path in iter_projects(args.code_dir))
+    print(f"合并了 {compacted} 个项目的元数据日志，用时 {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,91 @@
+import os
+
+from PySide6.QtCore import Qt, Signal, QTimer
+from PySide6.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QListWidget, QListWidgetItem
+
+from tracing import span
+
+
+class QuickOpenDialog(QDialog):
+    """Ctrl+P 快速打开：输入文件名或 "项目/文件名" 中的字符（可以不连续），回车打开选中的片段
+
+    每次输入都在 FuzzyIndex 中重新查询；查询没有筛完的部分在空闲时分批补完，
+    补完后用完整的匹配结果重新排一次序，下一次输入时也只需在更小的范围内查找。
+    """
+    snippet_chosen = Signal(str, str)  # project_path, filename
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent, Qt.Popup)
+        self.index = index
+        self.setMinimumWidth(520)
+        self.input = QLineEdit()
+        self.input.setPlaceholderText("输入文件名快速打开…")
+        self.input.setStyleSheet("QLineEdit { padding: 6px; }")
+        self.input.textChanged.connect(self.update_results)
+        self.input.installEventFilter(self)
+        self.results = QListWidget()
+        self.results.itemActivated.connect(self.choose)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(6, 6, 6, 6)
+        layout.addWidget(self.input)
+        layout.addWidget(self.results)
+        self.setLayout(layout)
+        # 空闲时继续为当前查询筛选，每次只处理一批
+        self._idle = QTimer(self)
+        self._idle.setInterval(0)
+        self._idle.timeout.connect(self._complete_pending)
+
+    def open_palette(self):
+        parent = self.parentWidget()
+        if parent is not None:
+            top_left = parent.mapToGlobal(parent.rect().topLeft())
+            self.move(top_left.x() + (parent.width() - self.width()) // 2, top_left.y() + 60)
+        self.input.clear()
+        self.results.clear()
+        self.show()
+        self.input.setFocus()
+
+    def update_results(self, text):
+        with span("quick_open_search", query=text) as s:
+            hits = self.index.search(text)
+            self.results.clear()
+            for project_path, filename in hits:
+                item = QListWidgetItem(f"{filename}    —  {os.path.basename(project_path)}")
+                item.setData(Qt.UserRole, (project_path, filename))
+                self.results.addItem(item)
+            if hits:
+                self.results.setCurrentRow(0)
+            s.set(hits=len(hits))
+        if self.index.has_pending():
+            self._idle.start()
+
+    def _complete_pending(self):
+        if not self.isVisible():
+            self._idle.stop()
+        elif not self.index.complete_pending():
+            self._idle.stop()
+            # 匹配结果已完整，重新排序（选中项回到第一个，只在用户还没有移动选中项时这样做）
+            if self.results.currentRow() <= 0:
+                self.update_results(self.input.text())
+
+    def choose(self, item=None):
+        item = item or self.results.currentItem()
+        if item is None:
+            return
+        project_path, filename = item.data(Qt.UserRole)
+        self.hide()
+        self.snippet_chosen.emit(project_path, filename)
+
+    def eventFilter(self, obj, event):
+        # 焦点留在输入框，上下键移动结果中的选中项
+        if obj is self.input and event.type() == event.Type.KeyPress:
+            key = event.key()
+            if key in (Qt.Key_Down, Qt.Key_Up):
+                row = self.results.currentRow() + (1 if key == Qt.Key_Down else -1)
+                if 0 <= row < self.results.count():
+                    self.results.setCurrentRow(row)
+                return True
+            if key in (Qt.Key_Return, Qt.Key_Enter):
+                self.choose()
+                return True
+        return super().eventFilter(obj, event)
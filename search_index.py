@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import heapq
+import threading
+from collections import Counter
+
+from file_utils import atomic_write_text, internal_path, iter_projects, is_snippet_name
+
+INDEX_VERSION = 2
+# 超过这个大小的文件只索引文件名和标签
+MAX_CONTENT_BYTES = 2 * 1024 * 1024
+# 一两个字符的查询词按前缀匹配时最多展开的词数
+MAX_PREFIX_EXPANSION = 50
+
+TOKEN_RE = re.compile(r"\w+")
+
+# 同一个词出现在不同位置的权重
+NAME_WEIGHT = 20
+TAG_WEIGHT = 10
+MAX_CONTENT_WEIGHT = 10
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex:
+    """code_dir 下所有片段的倒排索引（文件名、内容、标签）
+
+    词 -> {文档号: 权重} 的倒排表持久化在 .codecapsule/search_index.json 中；
+    另外在内存中维护 三元组 -> 词 的索引，用于子串查询。查询完全不读片段文件。
+    文档用 "项目名/文件名" 标识，按 (mtime, size) 和标签判断是否需要重建。
+    """
+
+    def __init__(self, code_dir, metadata_store):
+        self.code_dir = str(code_dir)
+        self.metadata_store = metadata_store
+        self.index_path = internal_path(self.code_dir, "search_index.json")
+        # doc_key -> [doc_id, mtime_ns, size, tags]
+        self._docs = {}
+        # doc_id -> doc_key
+        self._keys = {}
+        # doc_id -> [token, ...]，删除文档时使用
+        self._doc_tokens = {}
+        # token -> {doc_id: weight}
+        self._postings = {}
+        # trigram -> set(token)
+        self._trigrams = {}
+        # 一两个字符的前缀 -> set(token)
+        self._prefixes = {}
+        self._next_id = 0
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ---- 持久化 ----
+    def load(self):
+        """读取磁盘上的索引；倒排表以 [文档号, 权重, 文档号, 权重...] 的扁平列表存储"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+            return False
+        if data.get("version") != INDEX_VERSION:
+            return False
+        docs = data["docs"]
+        keys = {doc[0]: key for key, doc in docs.items()}
+        postings = {}
+        doc_tokens = {doc_id: [] for doc_id in keys}
+        for token, flat in data["postings"].items():
+            postings[token] = dict(zip(flat[::2], flat[1::2]))
+            for doc_id in flat[::2]:
+                doc_tokens[doc_id].append(token)
+        with self._lock:
+            self._docs = docs
+            self._keys = keys
+            self._doc_tokens = doc_tokens
+            self._postings = postings
+            self._next_id = max(keys, default=-1) + 1
+            self._trigrams = {}
+            self._prefixes = {}
+            for token in postings:
+                self._add_vocab(token)
+            self._dirty = False
+        return True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            postings = {}
+            for token, docs in self._postings.items():
+                flat = []
+                for doc_id, weight in docs.items():
+                    flat.append(doc_id)
+                    flat.append(weight)
+                postings[token] = flat
+            payload = json.dumps({"version": INDEX_VERSION, "docs": self._docs, "postings": postings},
+                                 ensure_ascii=False, separators=(",", ":"))
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        atomic_write_text(self.index_path, payload)
+
+    # ---- 增量更新 ----
+    def refresh(self, cancelled=None):
+        """stat 所有片段，只重建 (mtime, size) 或标签变化的文档，删除已不存在的文档"""
+        seen = set()
+        for project_name, project_path in iter_projects(self.code_dir):
+            metadata = self.metadata_store.get(project_path)
+            with os.scandir(project_path) as it:
+                for entry in it:
+                    if cancelled is not None and cancelled():
+                        return
+                    if not is_snippet_name(entry.name) or not entry.is_file():
+                        continue
+                    key = f"{project_name}/{entry.name}"
+                    seen.add(key)
+                    st = entry.stat()
+                    tags = metadata.get(entry.name, {}).get("tags", [])
+                    doc = self._docs.get(key)
+                    if doc is None or doc[1:] != [st.st_mtime_ns, st.st_size, tags]:
+                        self._index_file(key, entry.path, st, tags)
+        with self._lock:
+            for key in set(self._docs) - seen:
+                self._remove(key)
+
+    def update_document(self, project_path, filename):
+        """片段保存或新建后更新单个文档"""
+        project_name = os.path.basename(project_path)
+        key = f"{project_name}/{filename}"
+        path = os.path.join(project_path, filename)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.remove_document(project_path, filename)
+            return
+        tags = self.metadata_store.get(project_path).get(filename, {}).get("tags", [])
+        self._index_file(key, path, st, tags)
+
+    def remove_document(self, project_path, filename):
+        with self._lock:
+            self._remove(f"{os.path.basename(project_path)}/{filename}")
+
+    def _index_file(self, key, path, st, tags):
+        weights = Counter()
+        if st.st_size <= MAX_CONTENT_BYTES:
+            try:
+                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                    for token, count in Counter(tokenize(f.read())).items():
+                        weights[token] = min(count, MAX_CONTENT_WEIGHT)
+            except OSError:
+                pass
+        for token in tokenize(os.path.basename(path)):
+            weights[token] += NAME_WEIGHT
+        for tag in tags:
+            for token in tokenize(tag):
+                weights[token] += TAG_WEIGHT
+        with self._lock:
+            self._remove(key)
+            doc_id = self._next_id
+            self._next_id += 1
+            self._docs[key] = [doc_id, st.st_mtime_ns, st.st_size, list(tags)]
+            self._keys[doc_id] = key
+            self._doc_tokens[doc_id] = list(weights)
+            for token, weight in weights.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    self._add_vocab(token)
+                postings[doc_id] = weight
+            self._dirty = True
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        doc_id = doc[0]
+        del self._keys[doc_id]
+        for token in self._doc_tokens.pop(doc_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                self._remove_vocab(token)
+        self._dirty = True
+
+    def _add_vocab(self, token):
+        for gram in trigrams(token):
+            self._trigrams.setdefault(gram, set()).add(token)
+        for prefix in (token[:1], token[:2]):
+            self._prefixes.setdefault(prefix, set()).add(token)
+
+    def _remove_vocab(self, token):
+        for table, grams in ((self._trigrams, trigrams(token)), (self._prefixes, {token[:1], token[:2]})):
+            for gram in grams:
+                tokens = table.get(gram)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del table[gram]
+
+    # ---- 查询 ----
+    def _matching_tokens(self, term):
+        """返回 [(词, 匹配质量)]：完全匹配 3，前缀 2，子串 1"""
+        if len(term) >= 3:
+            candidates = None
+            for gram in sorted(trigrams(term), key=lambda g: len(self._trigrams.get(g, ()))):
+                tokens = self._trigrams.get(gram)
+                if not tokens:
+                    return []
+                candidates = set(tokens) if candidates is None else candidates & tokens
+                if not candidates:
+                    return []
+            return [(token, 3 if token == term else 2 if token.startswith(term) else 1)
+                    for token in candidates if term in token]
+        # 一两个字符的查询词按前缀匹配，只展开最短的若干个词
+        tokens = heapq.nsmallest(MAX_PREFIX_EXPANSION, self._prefixes.get(term, ()), key=len)
+        return [(token, 3 if token == term else 2) for token in tokens]
+
+    def search(self, query, project_path=None, limit=100):
+        """返回按相关度排序的 [(项目名, 文件名, mtime)]，多个词之间为“与”关系"""
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return []
+        prefix = f"{os.path.basename(project_path)}/" if project_path else None
+        with self._lock:
+            keys = self._keys
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token, quality in self._matching_tokens(term):
+                    for doc_id, weight in self._postings[token].items():
+                        if scores is not None and doc_id not in scores:
+                            continue
+                        if prefix is not None and not keys[doc_id].startswith(prefix):
+                            continue
+                        score = weight * quality
+                        if score > term_scores.get(doc_id, 0):
+                            term_scores[doc_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {doc_id: scores[doc_id] + score for doc_id, score in term_scores.items()}
+                if not scores:
+                    return []
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            results = []
+            for doc_id, _ in best:
+                key = keys[doc_id]
+                project_name, filename = key.split("/", 1)
+                results.append((project_name, filename, self._docs[key][1] / 1e9))
+        return results
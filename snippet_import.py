@@ -0,0 +1,252 @@
+import os
+import time
+import codecs
+import argparse
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from file_utils import atomic_write_text, content_hash, is_internal_name, is_snippet_name
+from metadata_store import MetadataStore
+from snippet_store import SnippetStore, check_name, code_type_for, parse_tags
+
+# 超过这个大小的文件不导入
+MAX_IMPORT_BYTES = 1024 * 1024
+# 判断是否为二进制文件时检查的字节数
+SNIFF_BYTES = 8192
+# 不进入的目录（隐藏目录如 .git 也会跳过）
+SKIP_DIRS = {"node_modules", "__pycache__", "venv", "build", "dist"}
+# 子目录中的文件导入后以 "目录__文件名" 命名
+PATH_SEPARATOR = "__"
+# 带 BOM 的编码；UTF-32 LE 的 BOM 以 UTF-16 LE 的 BOM 开头，需要先判断
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+# 没有 BOM 时依次尝试；latin-1 能解码任意字节，作为最后的兜底
+FALLBACK_ENCODINGS = ("utf-8", "gb18030", "latin-1")
+# 文本中可能出现的字节：可打印字符和常见的控制字符（\a \b \t \n \f \r ESC）
+TEXT_BYTES = bytes([7, 8, 9, 10, 12, 13, 27]) + bytes(range(32, 256))
+
+# 导入结果：各类文件数，是否被取消，以及导入的 [(项目路径, 文件名)]
+ImportResult = namedtuple("ImportResult", "imported duplicates skipped failed cancelled snippets")
+
+
+def detect_encoding(data):
+    """返回 data 的编码；判断为二进制时返回 None"""
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding
+    sample = data[:SNIFF_BYTES]
+    if b"\0" in sample:
+        return None
+    # 删掉文本字节后剩下的就是其他控制字符
+    control = len(sample.translate(None, TEXT_BYTES))
+    if sample and control / len(sample) > 0.1:
+        return None
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return None
+
+
+def walk_source(source):
+    """递归列出源目录中可能导入的文件，返回 (路径, 相对路径的各级名称, 大小)；不跟随符号链接"""
+    stack = [(source, ())]
+    while stack:
+        directory, parts = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"无法读取目录 {directory}: {e}")
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith(".") and entry.name not in SKIP_DIRS:
+                        stack.append((entry.path, parts + (entry.name,)))
+                elif entry.is_file(follow_symlinks=False) and not is_internal_name(entry.name):
+                    yield entry.path, parts + (entry.name,), entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+
+
+def read_text(path):
+    """读入并解码一个源文件，返回 (文本, 内容哈希)；二进制文件返回 None"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    encoding = detect_encoding(data)
+    if encoding is None:
+        return None
+    text = data.decode(encoding)
+    return text, content_hash(text)
+
+
+class _Target:
+    """导入目标项目：已占用的文件名、已有内容的哈希和待写入的元数据"""
+
+    def __init__(self, project, project_path):
+        self.project = project
+        self.project_path = project_path
+        self.names = set()
+        self.hashes = set()
+        self.metadata = {}
+
+    def unique_name(self, name):
+        stem, ext = os.path.splitext(name)
+        candidate, n = name, 1
+        while candidate in self.names or not is_snippet_name(candidate):
+            n += 1
+            candidate = f"{stem}-{n}{ext}"
+        self.names.add(candidate)
+        return candidate
+
+
+def _hash_existing(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return content_hash(data.decode('utf-8', errors='replace'))
+
+
+def import_folders(code_dir, sources, metadata_store=None, tags=(), workers=None, progress=None, cancelled=None):
+    """把若干源目录导入为片段，每个源目录对应主文件夹下的同名项目（不存在时新建）
+
+    文件的读取、编码识别和写入在线程池中并行进行；二进制文件、过大的文件被跳过，
+    所有内容统一保存为 UTF-8，code_type 按扩展名推断。与目标项目中已有片段或本次已导入的
+    文件内容相同的文件只算重复，不再写入。子目录中的文件按 "目录__文件名" 命名，重名时加序号。
+    progress(done, total) 报告进度，cancelled() 返回 True 时尽快停止；
+    无论是否取消，每个项目的 metadata.json 都只在最后写一次。
+    """
+    store = SnippetStore(code_dir, metadata_store)
+    cancelled = cancelled or (lambda: False)
+    tags = list(tags)
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+
+    # 先列出所有文件，得到总数
+    targets = {}
+    plan = []
+    skipped = 0
+    for source in sources:
+        source = os.path.abspath(source)
+        project = os.path.basename(source.rstrip(os.sep))
+        check_name(project, snippet=False)
+        if project not in targets:
+            targets[project] = _Target(project, store.project_path(project))
+        for path, parts, size in walk_source(source):
+            if size > MAX_IMPORT_BYTES:
+                skipped += 1
+            else:
+                plan.append((targets[project], path, PATH_SEPARATOR.join(parts)))
+    total = len(plan) + skipped
+    done = skipped
+    imported, duplicates, failed = [], 0, 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="import") as executor:
+        # 目标项目中已有的片段参与去重
+        existing = []
+        for target in targets.values():
+            if os.path.isdir(target.project_path):
+                with os.scandir(target.project_path) as it:
+                    for entry in it:
+                        target.names.add(entry.name)
+                        if is_snippet_name(entry.name) and entry.is_file():
+                            existing.append((target, executor.submit(_hash_existing, entry.path)))
+        for target, future in existing:
+            digest = future.result()
+            if digest is not None:
+                target.hashes.add(digest)
+
+        # 读取结果按列出的顺序处理，重复的文件总是保留先列出的那个；写入完成的先后不限。
+        # 在途的读写任务数有上限，内存占用与文件总数无关
+        window = workers * 4
+        pending = iter(plan)
+        reads = deque()
+        writes = {}
+        stopped = False
+
+        def finish_write(future):
+            nonlocal failed
+            target, filename, code_type = writes.pop(future)
+            try:
+                future.result()
+            except OSError as e:
+                print(f"写入失败: {os.path.join(target.project_path, filename)} {e}")
+                failed += 1
+                return
+            target.metadata[filename] = {"tags": list(tags), "code_type": code_type}
+            imported.append((target.project_path, filename))
+
+        while True:
+            for future in [future for future in writes if future.done()]:
+                finish_write(future)
+            while not stopped and len(reads) + len(writes) < window:
+                item = next(pending, None)
+                if item is None:
+                    break
+                reads.append((executor.submit(read_text, item[1]), item))
+            if not reads:
+                if not writes:
+                    break
+                wait(list(writes), return_when=FIRST_COMPLETED)
+                continue
+
+            future, (target, path, name) = reads.popleft()
+            try:
+                result = future.result()
+            except OSError as e:
+                print(f"读取失败: {path} {e}")
+                failed += 1
+                result = False
+            if result is None:
+                skipped += 1
+            elif result and result[1] in target.hashes:
+                duplicates += 1
+            elif result:
+                text, digest = result
+                target.hashes.add(digest)
+                if not os.path.isdir(target.project_path):
+                    store.create_project(target.project)
+                filename = target.unique_name(name)
+                write = executor.submit(atomic_write_text, os.path.join(target.project_path, filename), text)
+                writes[write] = (target, filename, code_type_for(name))
+            done += 1
+            if progress is not None:
+                progress(done, total)
+            if cancelled():
+                # 丢弃尚未处理的读取；已经提交的写入要等它完成，才能把元数据记下来
+                stopped = True
+                for future, _ in reads:
+                    future.cancel()
+                reads.clear()
+
+    for target in targets.values():
+        if target.metadata:
+            store.metadata_store.update(target.project_path, target.metadata)
+    return ImportResult(len(imported), duplicates, skipped, failed, stopped, imported)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把文件夹批量导入为代码片段，每个文件夹成为同名项目")
+    parser.add_argument("sources", nargs="+")
+    parser.add_argument("--code-dir", default=os.path.join(os.getcwd(), "code_dir"))
+    parser.add_argument("--tags", default="", help="为导入的片段添加这些标签（逗号分隔）")
+    parser.add_argument("--workers", type=int, help="读写线程数")
+    args = parser.parse_args()
+
+    def report(done, total):
+        if done % 1000 == 0 or done == total:
+            print(f"已处理 {done}/{total}")
+
+    started = time.perf_counter()
+    result = import_folders(args.code_dir, args.sources, MetadataStore(), parse_tags(args.tags), args.workers, report)
+    print(f"导入 {result.imported} 个，重复 {result.duplicates} 个，跳过 {result.skipped} 个，失败 {result.failed} 个，"
+          f"用时 {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,250 @@
+import os
+from datetime import datetime
+
+from PySide6.QtWidgets import QStyledItemDelegate, QStyle
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QRectF, QSize
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QPen
+
+from file_utils import is_snippet_name
+from snippet_store import SnippetEntry
+from tracing import span
+
+# 每次 fetchMore 载入的行数
+PAGE_SIZE = 200
+
+FilenameRole = Qt.UserRole + 1
+MtimeRole = Qt.UserRole + 2
+ProjectRole = Qt.UserRole + 3
+
+
+def iter_snippet_names(project_path):
+    """按目录顺序列出项目中的代码片段文件名（不做 stat，文件类型来自 DirEntry 的缓存）"""
+    with os.scandir(project_path) as it:
+        for entry in it:
+            # 与 scan_project 一致，跳过项目中的子目录
+            if is_snippet_name(entry.name) and entry.is_file():
+                yield entry.name
+
+
+def stat_entry(project_path, filename):
+    try:
+        mtime = os.stat(os.path.join(project_path, filename)).st_mtime
+    except FileNotFoundError:
+        return None
+    return SnippetEntry(project_path, filename, mtime)
+
+
+class SnippetListModel(QAbstractListModel):
+    """代码片段列表模型
+
+    目录中的文件只在需要显示时按页 stat 并载入（canFetchMore/fetchMore），刷新时与已载入的行做差异对比，
+    只插入、删除或更新发生变化的行，当前选中和滚动位置因此得以保留。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.project_path = None
+        self._entries = []
+        # (project, filename) -> row
+        self._rows = {}
+        # 尚未载入的 SnippetEntry
+        self._pending = iter(())
+        self._exhausted = True
+
+    # ---- Qt 模型接口 ----
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._entries):
+            return None
+        entry = self._entries[index.row()]
+        if role in (Qt.DisplayRole, FilenameRole):
+            return entry.filename
+        if role == MtimeRole:
+            return entry.mtime
+        if role == ProjectRole:
+            return entry.project
+        if role == Qt.ToolTipRole:
+            return os.path.join(entry.project, entry.filename)
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        with span("card_build") as s:
+            s.set(rows=self._fetch_page())
+
+    def _fetch_page(self):
+        """载入下一页，返回载入的行数"""
+        page = []
+        for entry in self._pending:
+            if (entry.project, entry.filename) in self._rows:
+                continue
+            if entry.mtime is None:
+                entry = stat_entry(entry.project, entry.filename)
+            if entry is not None:
+                page.append(entry)
+            if len(page) >= PAGE_SIZE:
+                break
+        else:
+            self._exhausted = True
+        if page:
+            self._append(page)
+        return len(page)
+
+    # ---- 对外接口 ----
+    def load_project(self, project_path, entries=None):
+        """切换到新项目：清空模型，只载入第一页
+
+        entries 为上一次扫描得到的 [SnippetEntry] 时直接使用，不访问磁盘；
+        否则只列出文件名（很便宜），stat 留到载入每一页时再做。
+        """
+        if entries is None:
+            names = list(iter_snippet_names(project_path)) if project_path and os.path.isdir(project_path) else []
+            entries = [SnippetEntry(project_path, name, None) for name in names]
+        self._reset(project_path, entries)
+
+    def refresh(self):
+        """重新扫描目录，只对变化的行发出增删改信号"""
+        if not self.project_path or not os.path.isdir(self.project_path):
+            self.load_project(None)
+            return
+        project_path = self.project_path
+        self.reconcile([SnippetEntry(project_path, name, None) for name in iter_snippet_names(project_path)])
+
+    def reconcile(self, entries):
+        """与新的完整条目列表对比：删除消失的行，更新修改时间变化的行，新条目在滚动时按页载入"""
+        latest = {(entry.project, entry.filename): entry for entry in entries}
+
+        # 删除已不存在的行：连续的行合并成一次删除，倒序进行以保持前面行的索引有效
+        removed = [row for row, entry in enumerate(self._entries) if (entry.project, entry.filename) not in latest]
+        while removed:
+            last = first = removed.pop()
+            while removed and removed[-1] == first - 1:
+                first = removed.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._entries[first:last + 1]
+            self.endRemoveRows()
+            self._reindex()
+
+        # 已载入的行只在修改时间变化时更新
+        for row, entry in enumerate(self._entries):
+            updated = latest[(entry.project, entry.filename)]
+            if updated.mtime is None:
+                updated = stat_entry(entry.project, entry.filename)
+            if updated is not None and updated.mtime != entry.mtime:
+                self._entries[row] = updated
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+
+        self._pending = iter([entry for key, entry in latest.items() if key not in self._rows])
+        self._exhausted = False
+        self.fetchMore()
+
+    def show_results(self, entries):
+        """显示一组固定的条目（如搜索结果），条目可以来自不同项目"""
+        self._reset(None, entries)
+
+    def show_snippets(self, snippets):
+        """显示一组 (项目路径, 文件名)，与目录一样在滚动时按页 stat 载入"""
+        self._reset(None, (SnippetEntry(project_path, filename, None) for project_path, filename in snippets))
+
+    def update_mtime(self, project_path, filename):
+        """片段保存后只刷新这一行"""
+        row = self._rows.get((project_path, filename))
+        if row is None:
+            return
+        updated = stat_entry(project_path, filename)
+        if updated is not None:
+            self._entries[row] = updated
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def row_of(self, project_path, filename):
+        return self._rows.get((project_path, filename))
+
+    def entry(self, row):
+        return self._entries[row]
+
+    def _append(self, entries):
+        first = len(self._entries)
+        self.beginInsertRows(QModelIndex(), first, first + len(entries) - 1)
+        for offset, entry in enumerate(entries):
+            self._rows[(entry.project, entry.filename)] = first + offset
+        self._entries.extend(entries)
+        self.endInsertRows()
+
+    def _reset(self, project_path, entries):
+        self.beginResetModel()
+        self.project_path = project_path
+        self._entries = []
+        self._rows = {}
+        self._pending = iter(entries)
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def _reindex(self):
+        self._rows = {(entry.project, entry.filename): row for row, entry in enumerate(self._entries)}
+
+
+class SnippetCardDelegate(QStyledItemDelegate):
+    """绘制卡片样式的列表项：左侧文件名，右侧修改时间；只有可见行才会被绘制"""
+    CARD_HEIGHT = 44
+    MARGIN = 5
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 字体和颜色只创建一次，所有行复用
+        self.name_font = QFont()
+        self.name_font.setPixelSize(14)
+        self.name_font.setBold(True)
+        self.name_metrics = QFontMetrics(self.name_font)
+        self.time_font = QFont()
+        self.time_font.setPixelSize(12)
+        self.time_metrics = QFontMetrics(self.time_font)
+        self.background = QColor("#F5F5F5")
+        self.hover_background = QColor("#E0E0E0")
+        self.selected_background = QColor("#D6E8FF")
+        self.border = QPen(QColor("#D3D3D3"))
+        self.time_color = QColor("#999999")
+        self.text_color = QColor("#000000")
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.CARD_HEIGHT + 2 * self.MARGIN)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(painter.RenderHint.Antialiasing)
+        rect = QRectF(option.rect).adjusted(1, self.MARGIN, -1, -self.MARGIN)
+        if option.state & QStyle.State_Selected:
+            background = self.selected_background
+        elif option.state & QStyle.State_MouseOver:
+            background = self.hover_background
+        else:
+            background = self.background
+        painter.setPen(self.border)
+        painter.setBrush(background)
+        painter.drawRoundedRect(rect, 5, 5)
+
+        text_rect = rect.adjusted(15, 0, -15, 0)
+        mtime = index.data(MtimeRole)
+        time_text = datetime.fromtimestamp(mtime).strftime("%H:%M") if mtime is not None else ""
+        time_width = self.time_metrics.horizontalAdvance(time_text)
+
+        painter.setFont(self.time_font)
+        painter.setPen(self.time_color)
+        painter.drawText(text_rect, Qt.AlignRight | Qt.AlignVCenter, time_text)
+
+        painter.setFont(self.name_font)
+        painter.setPen(self.text_color)
+        name_rect = text_rect.adjusted(0, 0, -(time_width + 10), 0)
+        name = self.name_metrics.elidedText(
+            index.data(FilenameRole), Qt.ElideRight, int(name_rect.width())
+        )
+        painter.drawText(name_rect, Qt.AlignLeft | Qt.AlignVCenter, name)
+        painter.restore()
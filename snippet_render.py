@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import markdown
+
+from file_utils import content_hash, atomic_write_bytes, atomic_write_text, internal_path, iter_projects, is_snippet_name
+from metadata_store import MetadataStore
+from code_image import CodeImageRenderer, theme_key
+
+# 默认样式，与最初的 md2img 输出保持一致
+DEFAULT_STYLE = """
+body { font-family: Arial, sans-serif; padding: 20px; background-color: #f5f5f5; }
+pre, code { background-color: #e0e0e0; padding: 5px; border-radius: 3px; }
+"""
+
+# 超过这个大小的片段不导出图片
+MAX_RENDER_BYTES = 256 * 1024
+# 批量导出的清单：图片相对路径 -> 渲染时的 render_key
+MANIFEST_FILENAME = "manifest.json"
+# code_type -> 代码块的语言标记
+FENCE_LANGUAGES = {"python": "python", "java": "java", "bash": "bash"}
+# 代码块的语言标记 -> code_type（含常见别名），其余标记按 txt 绘制
+FENCE_CODE_TYPES = {**{language: code_type for code_type, language in FENCE_LANGUAGES.items()},
+                    "py": "python", "sh": "bash", "shell": "bash"}
+# 整段 Markdown 只有一个代码块：围栏、语言标记、内容、同样的围栏
+CODE_BLOCK_RE = re.compile(r"\s*(`{3,}|~{3,})[ \t]*([^\s`]*)[^\n]*\n(.*?)\n?\1[ \t]*\s*", re.DOTALL)
+
+# wkhtmltoimage 参数：直接输出 PNG 到标准输出，不写临时文件
+IMGKIT_OPTIONS = {"format": "png", "quiet": ""}
+
+
+def build_html(markdown_text, style=DEFAULT_STYLE):
+    """Markdown -> 带样式的完整 HTML"""
+    body = markdown.markdown(markdown_text, extensions=['fenced_code'])
+    return f"<html><head><meta charset=\"utf-8\"><style>{style}</style></head><body>{body}</body></html>"
+
+
+def render_key(markdown_text, style=DEFAULT_STYLE):
+    """渲染缓存的键：内容和样式任一变化都会得到新键"""
+    return content_hash(style + "\0" + markdown_text)
+
+
+def render_png(markdown_text, style=DEFAULT_STYLE):
+    """把 Markdown 渲染为 PNG，返回图片字节；HTML 通过管道交给 wkhtmltoimage"""
+    # 只有 html 引擎需要 imgkit 和 wkhtmltoimage
+    import imgkit
+    return imgkit.from_string(build_html(markdown_text, style), False, options=IMGKIT_OPTIONS)
+
+
+def snippet_markdown(text, code_type):
+    """把片段内容包成 Markdown 代码块；围栏比内容中最长的连续反引号更长"""
+    longest = max((len(run) for run in re.findall(r"`+", text)), default=0)
+    fence = "`" * max(3, longest + 1)
+    return f"{fence}{FENCE_LANGUAGES.get(code_type, '')}\n{text.rstrip()}\n{fence}\n"
+
+
+def parse_code_block(markdown_text):
+    """snippet_markdown 的逆操作：整段内容只是一个代码块时返回 (代码, code_type)，否则返回 None"""
+    match = CODE_BLOCK_RE.fullmatch(markdown_text)
+    if match is None:
+        return None
+    fence, language, text = match.groups()
+    # 内容中还有同样的围栏时是多个代码块，中间夹着其他 Markdown
+    if re.search(rf"^{re.escape(fence)}[ \t]*$", text, re.MULTILINE):
+        return None
+    return text, FENCE_CODE_TYPES.get(language.lower(), "txt")
+
+
+# 子进程内复用的 QPainter 渲染器（字体和度量只创建一次）
+_native_renderer = None
+
+
+def _render_job(job):
+    # 在子进程中执行：渲染并原子写入一张图片
+    global _native_renderer
+    engine, source, option, out_path = job
+    try:
+        if engine == "native":
+            if _native_renderer is None:
+                _native_renderer = CodeImageRenderer()
+            png = _native_renderer.render_png(source, option)
+        else:
+            png = render_png(source, option)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        atomic_write_bytes(out_path, png)
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def export_images(code_dir, out_dir=None, project=None, workers=None, style=DEFAULT_STYLE, engine="native"):
+    """把片段批量渲染为 PNG（可只导出一个项目），内容和样式未变的片段直接跳过
+
+    engine 为 native 时用 QPainter 直接绘制（code_image），为 html 时经 Markdown 交给 wkhtmltoimage。
+    渲染分发到进程池，默认进程数等于 CPU 核数。返回 (渲染数, 跳过数, 失败数, 用时秒数)。
+    """
+    code_dir = str(code_dir)
+    out_dir = out_dir or internal_path(code_dir, "images")
+    manifest_path = os.path.join(out_dir, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    started = time.perf_counter()
+    metadata_store = MetadataStore()
+    jobs = {}
+    skipped = 0
+    for project_name, project_path in iter_projects(code_dir):
+        if project is not None and project_name != project:
+            continue
+        metadata = metadata_store.get(project_path)
+        with os.scandir(project_path) as it:
+            for entry in it:
+                if not is_snippet_name(entry.name) or not entry.is_file() or entry.stat().st_size > MAX_RENDER_BYTES:
+                    continue
+                with open(entry.path, 'r', encoding='utf-8', errors='replace') as f:
+                    text = f.read()
+                code_type = metadata.get(entry.name, {}).get("code_type", "txt")
+                if engine == "native":
+                    key = render_key(code_type + "\0" + text, theme_key())
+                    job = (engine, text, code_type)
+                else:
+                    markdown_text = snippet_markdown(text, code_type)
+                    key = render_key(markdown_text, style)
+                    job = (engine, markdown_text, style)
+                relative = f"{project_name}/{entry.name}.png"
+                out_path = os.path.join(out_dir, project_name, entry.name + ".png")
+                if manifest.get(relative) == key and os.path.exists(out_path):
+                    skipped += 1
+                    continue
+                jobs[relative] = (key, job + (out_path,))
+
+    rendered = failed = 0
+    if jobs:
+        os.makedirs(out_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_render_job, job): relative for relative, (_, job) in jobs.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                relative = futures[future]
+                error = future.result()
+                if error is None:
+                    manifest[relative] = jobs[relative][0]
+                    rendered += 1
+                else:
+                    print(f"渲染失败: {relative} {error}")
+                    failed += 1
+                if done % 100 == 0:
+                    print(f"已渲染 {done}/{len(jobs)}")
+        atomic_write_text(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1))
+    return rendered, skipped, failed, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把代码片段批量导出为图片")
+    parser.add_argument("code_dir", nargs="?", default=os.path.join(os.getcwd(), "code_dir"))
+    parser.add_argument("--project", help="只导出这个项目")
+    parser.add_argument("--out", help="输出目录，默认为 <code_dir>/.codecapsule/images")
+    parser.add_argument("--workers", type=int, help="渲染进程数，默认等于 CPU 核数")
+    parser.add_argument("--engine", choices=["native", "html"], default="native",
+                        help="native：QPainter 直接绘制；html：Markdown + wkhtmltoimage")
+    args = parser.parse_args()
+
+    rendered, skipped, failed, elapsed = export_images(
+        args.code_dir, args.out, args.project, args.workers, engine=args.engine
+    )
+    rate = rendered / elapsed if elapsed else 0
+    print(f"渲染 {rendered} 张，跳过 {skipped} 张，失败 {failed} 张，用时 {elapsed:.1f}s（{rate:.1f} 张/秒）")
@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import namedtuple
+
+from file_utils import atomic_write_text, is_internal_name, is_snippet_name, iter_projects
+from metadata_store import MetadataStore
+
+# 列表中的一行：所属项目路径、文件名、修改时间戳（None 表示载入时再 stat）
+SnippetEntry = namedtuple("SnippetEntry", ["project", "filename", "mtime"])
+
+# 界面中可选的代码类型
+CODE_TYPES = ["txt", "python", "java", "bash"]
+# 扩展名 -> code_type，其余扩展名为 txt
+EXTENSION_CODE_TYPES = {
+    ".py": "python", ".pyw": "python", ".pyi": "python",
+    ".java": "java",
+    ".sh": "bash", ".bash": "bash", ".zsh": "bash",
+}
+
+
+def code_type_for(filename):
+    """按扩展名推断代码类型"""
+    return EXTENSION_CODE_TYPES.get(os.path.splitext(filename)[1].lower(), "txt")
+
+
+def parse_tags(text):
+    """"a, b,,c" -> ["a", "b", "c"]"""
+    return [tag.strip() for tag in text.split(",") if tag.strip()]
+
+
+def check_name(name, snippet=True):
+    """项目名和片段文件名只能是单层名称，且不能与程序内部文件冲突"""
+    if (not name or name in (".", "..") or "/" in name or os.sep in name
+            or is_internal_name(name) or (snippet and not is_snippet_name(name))):
+        raise ValueError(f"无效的{'文件' if snippet else '文件夹'}名: {name!r}")
+
+
+def scan_project(project_path):
+    """用 os.scandir 列出项目中的片段；DirEntry 缓存了类型信息，stat 只做一次"""
+    entries = []
+    with os.scandir(project_path) as it:
+        for entry in it:
+            if not is_snippet_name(entry.name):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                entries.append(SnippetEntry(project_path, entry.name, entry.stat().st_mtime))
+            except FileNotFoundError:
+                continue
+    return entries
+
+
+class SnippetStore:
+    """主文件夹下项目（文件夹）和代码片段的增删改查，不依赖 Qt
+
+    界面和命令行共用这里的逻辑。标签和 code_type 统一经过 MetadataStore 读写，
+    批量操作先按项目分组，每个项目只写一次 metadata.json。
+    """
+
+    def __init__(self, code_dir, metadata_store=None):
+        self.code_dir = str(code_dir)
+        self.metadata_store = metadata_store or MetadataStore()
+        self._search_index = None
+
+    def project_path(self, project):
+        """项目文件夹的路径；所有操作都经过这里，项目名无效（如 ".."）时抛出 ValueError"""
+        check_name(project, snippet=False)
+        return os.path.join(self.code_dir, project)
+
+    # ---- 项目 ----
+    def list_projects(self):
+        return sorted(name for name, _ in iter_projects(self.code_dir))
+
+    def create_project(self, project):
+        """新建项目文件夹和空的 metadata.json，已存在时抛出 FileExistsError"""
+        project_path = self.project_path(project)
+        os.makedirs(project_path)
+        self.metadata_store.create_project(project_path)
+        return project_path
+
+    # ---- 片段 ----
+    def list_snippets(self, project):
+        return scan_project(self.project_path(project))
+
+    def iter_snippets(self, projects=None):
+        """依次列出指定项目（默认所有项目）中的片段"""
+        for project in self.list_projects() if projects is None else projects:
+            yield from self.list_snippets(project)
+
+    def get_metadata(self, project, filename):
+        return self.metadata_store.get_snippet(self.project_path(project), filename)
+
+    def read_snippet(self, project, filename):
+        with open(os.path.join(self.project_path(project), filename), 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+
+    def create_snippet(self, project, filename, text="", tags=(), code_type="txt"):
+        """新建一个片段，已存在时抛出 FileExistsError"""
+        check_name(filename)
+        if os.path.exists(os.path.join(self.project_path(project), filename)):
+            raise FileExistsError(f"片段已存在: {filename}")
+        self.add_snippets(project, [(filename, text, tags, code_type)])
+        return os.path.join(self.project_path(project), filename)
+
+    def add_snippets(self, project, snippets, overwrite=False):
+        """批量添加 (filename, text, tags, code_type)，返回写入的文件名
+
+        已存在的文件默认跳过；所有片段写完后只更新一次 metadata.json，
+        没有标签且类型为 txt 的片段不写元数据（与界面中新建片段一致）。
+        """
+        project_path = self.project_path(project)
+        written = []
+        entries = {}
+        for filename, text, tags, code_type in snippets:
+            check_name(filename)
+            file_path = os.path.join(project_path, filename)
+            if not overwrite and os.path.exists(file_path):
+                continue
+            atomic_write_text(file_path, text)
+            written.append(filename)
+            tags = list(tags or [])
+            code_type = code_type or "txt"
+            if tags or code_type != "txt":
+                entries[filename] = {"tags": tags, "code_type": code_type}
+        if entries:
+            self.metadata_store.update(project_path, entries)
+        return written
+
+    def update_tags(self, targets, add=(), remove=(), tags=None, code_type=None):
+        """批量修改标签和类型，返回实际发生变化的片段数
+
+        targets 为 (项目名, 文件名)；tags 不为 None 时替换原有标签，否则在原有标签上增删。
+        """
+        by_project = {}
+        for project, filename in targets:
+            by_project.setdefault(project, []).append(filename)
+        changed = 0
+        for project, filenames in by_project.items():
+            project_path = self.project_path(project)
+            metadata = self.metadata_store.get(project_path)
+            entries = {}
+            for filename in filenames:
+                old = metadata.get(filename, {})
+                new_tags = list(old.get("tags", [])) if tags is None else list(tags)
+                new_tags += [tag for tag in add if tag not in new_tags]
+                new_tags = [tag for tag in new_tags if tag not in remove]
+                entry = dict(old, tags=new_tags, code_type=code_type or old.get("code_type", "txt"))
+                if entry != old:
+                    entries[filename] = entry
+            if entries:
+                self.metadata_store.update(project_path, entries)
+                changed += len(entries)
+        return changed
+
+    # ---- 搜索与导出 ----
+    def search(self, query, project=None, limit=100):
+        """用持久化的倒排索引搜索（先与磁盘同步），返回 [(项目名, 文件名, mtime)]"""
+        if self._search_index is None:
+            from search_index import SearchIndex
+            self._search_index = SearchIndex(self.code_dir, self.metadata_store)
+            self._search_index.load()
+        self._search_index.refresh()
+        self._search_index.save()
+        return self._search_index.search(query, self.project_path(project) if project else None, limit)
+
+    def export(self, targets):
+        """依次给出片段的完整记录（内容、标签、类型、修改时间），targets 为 SnippetEntry"""
+        for entry in targets:
+            project = os.path.basename(entry.project)
+            metadata = self.get_metadata(project, entry.filename)
+            yield {
+                "project": project,
+                "filename": entry.filename,
+                "tags": metadata["tags"],
+                "code_type": metadata["code_type"],
+                "mtime": entry.mtime,
+                "content": self.read_snippet(project, entry.filename),
+            }
+
+
+# ---- 命令行 ----
+def _resolve_targets(store, targets, all_snippets=False):
+    """"项目" 表示项目中的所有片段，"项目/文件名" 表示单个片段，"-" 从标准输入逐行读取"""
+    if all_snippets:
+        yield from store.iter_snippets()
+        return
+    for target in targets:
+        lines = (line.strip() for line in sys.stdin) if target == "-" else [target]
+        for line in lines:
+            if not line:
+                continue
+            project, _, filename = line.partition("/")
+            # 不允许用 ".." 等名称读写主文件夹以外的文件
+            try:
+                project_path = store.project_path(project)
+                if filename:
+                    check_name(filename)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                continue
+            if not os.path.isdir(project_path):
+                print(f"项目不存在: {project}", file=sys.stderr)
+            elif not filename:
+                yield from store.list_snippets(project)
+            elif os.path.isfile(os.path.join(project_path, filename)):
+                yield SnippetEntry(project_path, filename, None)
+            else:
+                print(f"片段不存在: {line}", file=sys.stderr)
+
+
+def _cmd_list(store, args):
+    projects = args.project or None
+    for entry in store.iter_snippets(projects):
+        project = os.path.basename(entry.project)
+        metadata = store.get_metadata(project, entry.filename)
+        if args.tag and args.tag not in metadata["tags"]:
+            continue
+        if args.json:
+            print(json.dumps({"project": project, "filename": entry.filename, "mtime": entry.mtime, **metadata},
+                             ensure_ascii=False))
+        else:
+            print(f"{project}/{entry.filename}\t{metadata['code_type']}\t{', '.join(metadata['tags'])}")
+
+
+def _cmd_add(store, args):
+    if not os.path.isdir(store.project_path(args.project)):
+        if not args.create:
+            sys.exit(f"项目不存在: {args.project}（使用 --create 新建）")
+        store.create_project(args.project)
+    tags = parse_tags(args.tags)
+    snippets = []
+    for source in args.sources:
+        try:
+            with open(source, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"跳过 {source}: {e}", file=sys.stderr)
+            continue
+        filename = os.path.basename(source)
+        snippets.append((filename, text, tags, args.code_type or code_type_for(filename)))
+    written = store.add_snippets(args.project, snippets, overwrite=args.overwrite)
+    print(f"添加 {len(written)} 个片段，跳过 {len(args.sources) - len(written)} 个")
+
+
+def _cmd_tag(store, args):
+    targets = [(os.path.basename(entry.project), entry.filename)
+               for entry in _resolve_targets(store, args.targets, args.all)]
+    changed = store.update_tags(
+        targets,
+        add=parse_tags(args.add),
+        remove=parse_tags(args.remove),
+        tags=parse_tags(args.set) if args.set is not None else None,
+        code_type=args.code_type,
+    )
+    print(f"修改 {changed} 个片段（共 {len(targets)} 个）")
+
+
+def _cmd_search(store, args):
+    for project, filename, _ in store.search(args.query, args.project, args.limit):
+        print(f"{project}/{filename}")
+
+
+def _cmd_export(store, args):
+    out = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+    try:
+        count = 0
+        for record in store.export(_resolve_targets(store, args.targets, args.all or not args.targets)):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"导出 {count} 个片段", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="不启动界面，批量管理代码片段")
+    parser.add_argument("--code-dir", default=os.path.join(os.getcwd(), "code_dir"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="列出片段：项目/文件名、类型、标签")
+    list_parser.add_argument("--project", action="append", help="只列出这个项目，可重复")
+    list_parser.add_argument("--tag", help="只列出带有这个标签的片段")
+    list_parser.add_argument("--json", action="store_true", help="每行输出一个 JSON 对象")
+    list_parser.set_defaults(handler=_cmd_list)
+
+    add_parser = commands.add_parser("add", help="把文件作为片段加入项目（以文件名命名）")
+    add_parser.add_argument("project")
+    add_parser.add_argument("sources", nargs="+")
+    add_parser.add_argument("--tags", default="", help="逗号分隔的标签")
+    add_parser.add_argument("--code-type", choices=CODE_TYPES, help="默认按扩展名推断")
+    add_parser.add_argument("--create", action="store_true", help="项目不存在时新建")
+    add_parser.add_argument("--overwrite", action="store_true", help="覆盖同名片段")
+    add_parser.set_defaults(handler=_cmd_add)
+
+    tag_parser = commands.add_parser("tag", help="批量修改标签和类型，每个项目只写一次 metadata.json")
+    tag_parser.add_argument("targets", nargs="*", help="项目 或 项目/文件名，- 表示从标准输入读取")
+    tag_parser.add_argument("--all", action="store_true", help="所有项目中的所有片段")
+    tag_parser.add_argument("--add", default="", help="添加这些标签（逗号分隔）")
+    tag_parser.add_argument("--remove", default="", help="移除这些标签（逗号分隔）")
+    tag_parser.add_argument("--set", help="替换为这些标签（逗号分隔）")
+    tag_parser.add_argument("--code-type", choices=CODE_TYPES)
+    tag_parser.set_defaults(handler=_cmd_tag)
+
+    search_parser = commands.add_parser("search", help="搜索文件名、内容和标签")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--project")
+    search_parser.add_argument("--limit", type=int, default=100)
+    search_parser.set_defaults(handler=_cmd_search)
+
+    export_parser = commands.add_parser("export", help="导出片段（含内容）为 JSON Lines")
+    export_parser.add_argument("targets", nargs="*", help="项目 或 项目/文件名，默认导出所有片段")
+    export_parser.add_argument("--all", action="store_true")
+    export_parser.add_argument("--out", help="输出文件，默认为标准输出")
+    export_parser.set_defaults(handler=_cmd_export)
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.code_dir):
+        sys.exit(f"主文件夹不存在: {args.code_dir}")
+    started = time.perf_counter()
+    try:
+        args.handler(SnippetStore(args.code_dir), args)
+    except ValueError as e:
+        sys.exit(str(e))
+    except BrokenPipeError:
+        # 输出被 head 等命令提前关闭
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    print(f"用时 {time.perf_counter() - started:.2f}s", file=sys.stderr)
@@ -0,0 +1,277 @@
+import os
+import json
+import sqlite3
+import argparse
+import threading
+
+from file_utils import internal_path, iter_projects, is_snippet_name
+from search_index import tokenize, MAX_CONTENT_BYTES
+from snippet_store import SnippetEntry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snippets (
+    id INTEGER PRIMARY KEY,
+    project TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    code_type TEXT NOT NULL DEFAULT 'txt',
+    tags TEXT NOT NULL DEFAULT '[]',
+    UNIQUE (project, filename)
+);
+CREATE INDEX IF NOT EXISTS snippets_mtime ON snippets (mtime_ns);
+CREATE INDEX IF NOT EXISTS snippets_filename ON snippets (filename);
+CREATE TABLE IF NOT EXISTS snippet_tags (
+    tag TEXT NOT NULL,
+    snippet_id INTEGER NOT NULL REFERENCES snippets (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, snippet_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS snippet_tags_snippet ON snippet_tags (snippet_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS snippet_fts USING fts5 (filename, content, tags);
+"""
+
+# 排序方式 -> ORDER BY 子句
+ORDERS = {
+    "mtime": "s.mtime_ns DESC",
+    "name": "s.filename COLLATE NOCASE",
+    "project": "s.project COLLATE NOCASE, s.filename COLLATE NOCASE",
+}
+
+
+class SqliteCatalog:
+    """可选的 SQLite 存储后端：一个数据库保存所有片段记录、标签和 FTS5 全文索引
+
+    与 SearchIndex 提供相同的 load/refresh/update_document/search 接口，可以直接替换；
+    目录 + metadata.json 仍是原始数据，refresh() 把它们同步进数据库，
+    export_to_folders() 则把数据库中的标签和 code_type 写回各项目的 metadata.json。
+    启用后界面的“所有片段”（iter_sorted）、标签列表（tag_counts）和按标签列出片段也都直接查询数据库。
+    """
+
+    def __init__(self, code_dir, metadata_store, db_path=None):
+        self.code_dir = str(code_dir)
+        self.metadata_store = metadata_store
+        self.db_path = db_path or internal_path(self.code_dir, "catalog.sqlite3")
+        # sqlite3 连接不能跨线程共享，每个线程各用一个；WAL 模式下读写互不阻塞
+        self._local = threading.local()
+        self._conn()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            # 相同的 SQL 语句会复用已编译的预处理语句
+            conn = sqlite3.connect(self.db_path, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            try:
+                conn.executescript(SCHEMA)
+            except sqlite3.OperationalError as e:
+                conn.close()
+                raise RuntimeError(f"当前 SQLite 不支持 FTS5: {e}")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM snippets").fetchone()[0]
+
+    # ---- 与 SearchIndex 相同的接口 ----
+    def load(self):
+        return True
+
+    def save(self):
+        # 每次更新都在事务中提交，无需额外保存
+        pass
+
+    def refresh(self, cancelled=None):
+        """目录 -> 数据库：只更新 (mtime, size)、标签或类型变化的片段，删除已不存在的片段"""
+        conn = self._conn()
+        seen_projects = []
+        for project_name, project_path in iter_projects(self.code_dir):
+            if cancelled is not None and cancelled():
+                return
+            seen_projects.append(project_name)
+            self._refresh_project(conn, project_name, project_path)
+        with conn:
+            placeholders = ",".join("?" * len(seen_projects))
+            for (snippet_id,) in conn.execute(
+                f"SELECT id FROM snippets WHERE project NOT IN ({placeholders})", seen_projects
+            ).fetchall():
+                self._delete(conn, snippet_id)
+
+    def refresh_project(self, project_path):
+        """只同步一个项目（如外部修改了其中的片段或 metadata.json）；项目已不存在时删除它的所有片段"""
+        self._refresh_project(self._conn(), os.path.basename(project_path), project_path)
+
+    def update_document(self, project_path, filename):
+        project_name = os.path.basename(project_path)
+        path = os.path.join(project_path, filename)
+        conn = self._conn()
+        with conn:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self._delete_by_name(conn, project_name, filename)
+                return
+            data = self.metadata_store.get(project_path).get(filename, {})
+            self._upsert(conn, project_name, filename, path, st, data.get("tags", []), data.get("code_type", "txt"))
+
+    def remove_document(self, project_path, filename):
+        conn = self._conn()
+        with conn:
+            self._delete_by_name(conn, os.path.basename(project_path), filename)
+
+    def search(self, query, project_path=None, limit=100):
+        """FTS5 查询，返回按 bm25 排序的 [(项目名, 文件名, mtime)]，每个词按前缀匹配"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " AND ".join(f'"{term}"*' for term in terms)
+        sql = (
+            "SELECT s.project, s.filename, s.mtime_ns FROM snippet_fts "
+            "JOIN snippets s ON s.id = snippet_fts.rowid WHERE snippet_fts MATCH ?"
+        )
+        params = [match]
+        if project_path:
+            sql += " AND s.project = ?"
+            params.append(os.path.basename(project_path))
+        # 列权重：文件名 > 标签 > 内容
+        sql += " ORDER BY bm25(snippet_fts, 20.0, 1.0, 10.0) LIMIT ?"
+        params.append(limit)
+        return [(project, filename, mtime_ns / 1e9) for project, filename, mtime_ns in self._conn().execute(sql, params)]
+
+    # ---- 跨项目查询 ----
+    def list_snippets(self, project_name=None, tag=None, order="mtime", limit=100, offset=0):
+        """跨项目列出片段，可按项目和标签过滤，返回 [(项目名, 文件名, mtime)]"""
+        sql, params = self._listing_sql(project_name, tag, order)
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        return [(project, filename, mtime_ns / 1e9) for project, filename, mtime_ns in self._conn().execute(sql, params)]
+
+    def iter_sorted(self, order="mtime", tag=None, page_size=200):
+        """与 GlobalSnippetIndex.iter_sorted 相同：按页依次给出全部 SnippetEntry，供“所有片段”和标签视图使用
+
+        只执行一条查询，逐页从同一个游标读取；WAL 模式下整个过程读到的都是开始时的快照，
+        翻页期间索引线程写入的变化不会让后面的页漏掉或重复片段。
+        """
+        sql, params = self._listing_sql(None, tag, order)
+        cursor = self._conn().execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    return
+                for project, filename, mtime_ns in rows:
+                    yield SnippetEntry(os.path.join(self.code_dir, project), filename, mtime_ns / 1e9)
+        finally:
+            cursor.close()
+
+    def count(self):
+        return len(self)
+
+    def tag_counts(self):
+        return dict(self._conn().execute("SELECT tag, COUNT(*) FROM snippet_tags GROUP BY tag"))
+
+    def export_to_folders(self):
+        """数据库 -> 目录：把标签和 code_type 写回 metadata.json，每个项目只写一次"""
+        by_project = {}
+        for project, filename, code_type, tags in self._conn().execute(
+            "SELECT project, filename, code_type, tags FROM snippets"
+        ):
+            by_project.setdefault(project, {})[filename] = {"tags": json.loads(tags), "code_type": code_type}
+        for project, entries in by_project.items():
+            project_path = os.path.join(self.code_dir, project)
+            if os.path.isdir(project_path):
+                self.metadata_store.update(project_path, entries)
+
+    # ---- 内部方法 ----
+    def _listing_sql(self, project_name, tag, order):
+        sql = "SELECT s.project, s.filename, s.mtime_ns FROM snippets s"
+        conditions, params = [], []
+        if tag is not None:
+            sql += " JOIN snippet_tags t ON t.snippet_id = s.id"
+            conditions.append("t.tag = ?")
+            params.append(tag)
+        if project_name is not None:
+            conditions.append("s.project = ?")
+            params.append(project_name)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql + f" ORDER BY {ORDERS[order]}", params
+
+    def _refresh_project(self, conn, project_name, project_path):
+        existing = {
+            row[0]: row[1:]
+            for row in conn.execute(
+                "SELECT filename, id, mtime_ns, size, code_type, tags FROM snippets WHERE project = ?",
+                (project_name,),
+            )
+        }
+        with conn:
+            if os.path.isdir(project_path):
+                metadata = self.metadata_store.get(project_path)
+                with os.scandir(project_path) as it:
+                    for entry in it:
+                        if not is_snippet_name(entry.name) or not entry.is_file():
+                            continue
+                        st = entry.stat()
+                        data = metadata.get(entry.name, {})
+                        tags = data.get("tags", [])
+                        code_type = data.get("code_type", "txt")
+                        row = existing.pop(entry.name, None)
+                        if row is None or tuple(row[1:]) != (st.st_mtime_ns, st.st_size, code_type, json.dumps(tags)):
+                            self._upsert(conn, project_name, entry.name, entry.path, st, tags, code_type)
+            for snippet_id, *_ in existing.values():
+                self._delete(conn, snippet_id)
+
+    def _upsert(self, conn, project_name, filename, path, st, tags, code_type):
+        content = ""
+        if st.st_size <= MAX_CONTENT_BYTES:
+            try:
+                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                    content = f.read()
+            except OSError:
+                pass
+        snippet_id = conn.execute(
+            "INSERT INTO snippets (project, filename, mtime_ns, size, code_type, tags) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (project, filename) DO UPDATE SET mtime_ns = excluded.mtime_ns, size = excluded.size, "
+            "code_type = excluded.code_type, tags = excluded.tags RETURNING id",
+            (project_name, filename, st.st_mtime_ns, st.st_size, code_type, json.dumps(tags)),
+        ).fetchone()[0]
+        conn.execute("DELETE FROM snippet_tags WHERE snippet_id = ?", (snippet_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO snippet_tags (tag, snippet_id) VALUES (?, ?)",
+            [(tag, snippet_id) for tag in tags if tag],
+        )
+        conn.execute("DELETE FROM snippet_fts WHERE rowid = ?", (snippet_id,))
+        conn.execute(
+            "INSERT INTO snippet_fts (rowid, filename, content, tags) VALUES (?, ?, ?, ?)",
+            (snippet_id, filename, content, " ".join(tags)),
+        )
+
+    def _delete(self, conn, snippet_id):
+        conn.execute("DELETE FROM snippet_fts WHERE rowid = ?", (snippet_id,))
+        conn.execute("DELETE FROM snippets WHERE id = ?", (snippet_id,))
+
+    def _delete_by_name(self, conn, project_name, filename):
+        row = conn.execute(
+            "SELECT id FROM snippets WHERE project = ? AND filename = ?", (project_name, filename)
+        ).fetchone()
+        if row is not None:
+            self._delete(conn, row[0])
+
+
+if __name__ == "__main__":
+    from metadata_store import MetadataStore
+
+    parser = argparse.ArgumentParser(description="在目录 + metadata.json 与 SQLite 目录数据库之间同步")
+    parser.add_argument("code_dir", nargs="?", default=os.path.join(os.getcwd(), "code_dir"))
+    parser.add_argument("--export", action="store_true", help="把数据库中的标签和类型写回 metadata.json")
+    args = parser.parse_args()
+
+    catalog = SqliteCatalog(args.code_dir, MetadataStore())
+    if args.export:
+        catalog.export_to_folders()
+    else:
+        catalog.refresh()
+    print(f"{catalog.db_path}: {len(catalog)} 个代码片段")
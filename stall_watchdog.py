@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import logging
+import threading
+import traceback
+from logging.handlers import RotatingFileHandler
+
+from PySide6.QtCore import QObject, QTimer
+
+from tracing import tracer
+
+# 界面线程心跳的间隔
+HEARTBEAT_MS = 25
+# 卡顿日志单个文件的大小上限和保留的旧文件数
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+
+
+class StallWatchdog(QObject):
+    """检测界面线程的卡顿，记录卡顿时界面线程的 Python 调用栈
+
+    界面线程中的定时器每 HEARTBEAT_MS 毫秒更新一次心跳；看门狗线程发现心跳超过 threshold_ms
+    没有更新时，抓取界面线程当时的调用栈，连同最近一次用户操作（切换文件夹、点击片段、保存）
+    写入轮转的卡顿日志；卡顿结束后再记一行总时长，并作为 ui_stall 记入追踪。
+    注意：界面线程在不释放 GIL 的 C 代码（如 json.load）中时，看门狗要等它让出 GIL 才能运行，
+    抓到的是紧接着的那一帧。
+    """
+
+    def __init__(self, threshold_ms=100, log_path=None, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.stall_count = 0
+        self._gui_ident = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        # (操作名, 说明, 时间)
+        self._action = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(HEARTBEAT_MS)
+        self._timer.timeout.connect(self._beat)
+        self._stop = threading.Event()
+        self._thread = None
+        self._logger = logging.getLogger("codecapsule.stall")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._handler = None
+        if log_path:
+            self.set_log_path(log_path)
+
+    def set_log_path(self, log_path):
+        """切换卡顿日志文件（例如换了主文件夹）"""
+        try:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        except OSError as e:
+            print(f"无法打开卡顿日志: {e}")
+            return
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        if self._handler is not None:
+            self._logger.removeHandler(self._handler)
+            self._handler.close()
+        self._handler = handler
+        self._logger.addHandler(handler)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._last_beat = time.perf_counter()
+        self._timer.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._timer.stop()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._handler is not None:
+            self._logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+    def note_action(self, name, detail=""):
+        """记录界面线程正在进行的操作，卡顿日志中会注明卡顿前最近的操作"""
+        self._action = (name, detail, time.perf_counter())
+
+    def _beat(self):
+        self._last_beat = time.perf_counter()
+
+    def _run(self):
+        # 看门狗线程
+        stalled_beat = None
+        stalled_action = None
+        poll = max(self.threshold / 4, HEARTBEAT_MS / 1000)
+        while not self._stop.wait(poll):
+            last_beat = self._last_beat
+            if stalled_beat is None:
+                lag = time.perf_counter() - last_beat - HEARTBEAT_MS / 1000
+                if lag > self.threshold:
+                    stalled_beat = last_beat
+                    stalled_action = self._action
+                    self._report(lag, stalled_action)
+            elif last_beat != stalled_beat:
+                # 心跳恢复：卡顿大约从上一次心跳之后一个间隔开始
+                duration = last_beat - stalled_beat - HEARTBEAT_MS / 1000
+                self._logger.info(f"卡顿结束，共 {duration * 1000:.0f} ms（{self._describe(stalled_action)}）")
+                if tracer.enabled:
+                    started_ns = int((stalled_beat + HEARTBEAT_MS / 1000) * 1e9)
+                    tracer.record("ui_stall", started_ns, int(duration * 1e9),
+                                  {"action": stalled_action[0] if stalled_action else ""})
+                stalled_beat = None
+
+    def _report(self, lag, action):
+        self.stall_count += 1
+        frame = sys._current_frames().get(self._gui_ident)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "（无法获取调用栈）\n"
+        self._logger.info(f"界面卡顿 {lag * 1000:.0f} ms 以上，{self._describe(action, time.perf_counter())}\n"
+                          f"界面线程调用栈：\n{stack.rstrip()}")
+
+    @staticmethod
+    def _describe(action, now=None):
+        if action is None:
+            return "之前没有记录到操作"
+        name, detail, started = action
+        text = f"最近的操作：{name} {detail}".rstrip()
+        if now is not None:
+            text += f"（{(now - started) * 1000:.0f} ms 前开始）"
+        return text
@@ -0,0 +1,58 @@
+import os
+import json
+
+from file_utils import atomic_write_text, internal_path
+
+SNAPSHOT_VERSION = 1
+# 只保存当前项目前面这么多个片段，足够填满第一屏并让列表可以滚动
+MAX_SNAPSHOT_ENTRIES = 1000
+
+
+def snapshot_path(code_dir):
+    return internal_path(code_dir, "startup_snapshot.json")
+
+
+def load_snapshot(code_dir):
+    """读取上次退出时的界面快照，不存在或格式不对时返回 None
+
+    返回 {"folders": [folder_name], "project": folder_name 或 None,
+          "entries": [(filename, mtime)], "current_file": filename 或 None}
+    快照只用于启动时先把窗口画出来，之后总会在后台与磁盘重新同步。
+    """
+    try:
+        with open(snapshot_path(code_dir), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        return None
+    try:
+        return {
+            "folders": [str(folder) for folder in data["folders"]],
+            "project": data.get("project"),
+            "entries": [(str(filename), float(mtime)) for filename, mtime in data.get("entries", [])],
+            "current_file": data.get("current_file"),
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def save_snapshot(code_dir, folders, project=None, entries=(), current_file=None):
+    """保存文件夹列表和当前项目的片段列表（entries 为 SnippetEntry 或 (filename, mtime)）"""
+    rows = []
+    for entry in entries:
+        if len(rows) >= MAX_SNAPSHOT_ENTRIES:
+            break
+        filename, mtime = entry[-2:]
+        if mtime is not None:
+            rows.append([filename, mtime])
+    payload = json.dumps({
+        "version": SNAPSHOT_VERSION,
+        "folders": list(folders),
+        "project": project,
+        "entries": rows,
+        "current_file": current_file,
+    }, ensure_ascii=False, separators=(",", ":"))
+    path = snapshot_path(code_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write_text(path, payload)
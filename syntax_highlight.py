@@ -0,0 +1,195 @@
+import time
+
+from PySide6.QtCore import QObject, QTimer
+from PySide6.QtGui import QColor, QFont, QTextCharFormat, QTextLayout
+
+from syntax_lexers import get_lexer
+
+# 编辑后同步高亮到可见区域之外多少行，其余交给空闲时处理
+VISIBLE_MARGIN = 20
+# 空闲时每次最多处理的时间（秒），保证不阻塞输入
+IDLE_BUDGET = 0.008
+# QTextBlock 默认的 userState，表示尚未高亮
+UNHIGHLIGHTED = -1
+
+
+def _format(color, bold=False, italic=False):
+    fmt = QTextCharFormat()
+    fmt.setForeground(QColor(color))
+    if bold:
+        fmt.setFontWeight(QFont.Bold)
+    fmt.setFontItalic(italic)
+    return fmt
+
+
+FORMATS = {
+    "keyword": _format("#0033B3", bold=True),
+    "builtin": _format("#000080"),
+    "string": _format("#067D17"),
+    "comment": _format("#8C8C8C", italic=True),
+    "number": _format("#1750EB"),
+    "decorator": _format("#9E880D"),
+    "definition": _format("#00627A", bold=True),
+    "variable": _format("#871094"),
+}
+
+
+class IncrementalHighlighter(QObject):
+    """按 code_type 为 QPlainTextEdit 做增量语法高亮
+
+    每个文本块（行）的行尾词法状态保存在 QTextBlock.userState 中。编辑后只重新分析被修改的行，
+    并继续向后分析直到某一行的行尾状态与之前相同为止（例如补上一个三引号会影响后面所有行）。
+    同步处理只到可见区域为止，屏幕外剩余的行在空闲时分批处理。
+    与 QSyntaxHighlighter 不同，打开大文件或切换语言时不会一次性高亮整篇文档。
+    """
+
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self.document = editor.document()
+        self.lexer = None
+        self.code_type = None
+        # 该行号之前的所有行都已高亮；None 表示没有待处理的行
+        self._frontier = None
+        # 正在应用格式时 markContentsDirty 也会发出 contentsChange，需要忽略
+        self._applying = False
+        # 本轮格式发生变化的字符范围 [start, end]
+        self._dirty = None
+        self._idle = QTimer(self)
+        self._idle.setSingleShot(True)
+        self._idle.setInterval(0)
+        self._idle.timeout.connect(self._continue)
+        self.document.contentsChange.connect(self._on_contents_change)
+
+    def set_language(self, code_type):
+        """切换语言：所有行标记为未高亮，先同步处理可见区域"""
+        if code_type == self.code_type:
+            return
+        self.code_type = code_type
+        self.lexer = get_lexer(code_type)
+        block = self.document.firstBlock()
+        while block.isValid():
+            block.setUserState(UNHIGHLIGHTED)
+            block = block.next()
+        self._defer(0)
+        # 可见区域在文档后部时也无法跳过前面的行，同步部分只处理一屏，其余交给空闲处理
+        self._highlight_from(self.document.firstBlock(), self._visible_limit() - self.editor.firstVisibleBlock().blockNumber())
+
+    def _on_contents_change(self, position, removed, added):
+        if self._applying:
+            return
+        first = self.document.findBlock(position)
+        if not first.isValid():
+            return
+        # 在待处理区域之前删除行会让行号前移，待处理的起点也要跟着前移
+        if self._frontier is not None and first.blockNumber() < self._frontier:
+            self._frontier = first.blockNumber()
+        # 插入多行时最后一行由原来的行拆分而来，其旧状态不可信；中间的新行本来就是未高亮状态
+        last = self.document.findBlock(position + added)
+        if last.isValid() and last != first:
+            last.setUserState(UNHIGHLIGHTED)
+        # 删除的内容可能跨行，此时被修改行的旧状态不能用来判断是否收敛，下一行也要重新分析
+        force = 2 if removed else 1
+        self._highlight_from(first, self._visible_limit(), force)
+
+    def _visible_limit(self):
+        first = self.editor.firstVisibleBlock()
+        line_height = max(1, self.editor.fontMetrics().height())
+        visible_lines = self.editor.viewport().height() // line_height + 1
+        return max(0, first.blockNumber()) + visible_lines + VISIBLE_MARGIN
+
+    def _highlight_from(self, block, limit, force=0, deadline=None):
+        try:
+            self._highlight_range(block, limit, force, deadline)
+        finally:
+            self._flush_dirty()
+
+    def _highlight_range(self, block, limit, force, deadline):
+        """从 block 开始重新分析，直到某行的行尾状态不再变化
+
+        开头的 force 行无论如何都重新分析；超过 limit 行或 deadline 时剩余部分交给空闲处理。
+        deadline 不为 None 时为空闲处理，会一直扫描到文档末尾，跳过已高亮且不受影响的行。
+        """
+        previous = block.previous()
+        if previous.isValid() and previous.userState() == UNHIGHLIGHTED:
+            # 上一行还没有高亮，无法得知起始状态
+            limit = -1
+        state = max(previous.userState(), 0) if previous.isValid() else 0
+        changed = False
+        while block.isValid():
+            old_state = block.userState()
+            if force > 0 or changed or old_state == UNHIGHLIGHTED:
+                if block.blockNumber() > limit or (deadline is not None and time.perf_counter() > deadline):
+                    if force > 0 or changed:
+                        block.setUserState(UNHIGHLIGHTED)
+                        if force > 1 and block.next().isValid():
+                            block.next().setUserState(UNHIGHLIGHTED)
+                    self._defer(block.blockNumber())
+                    return
+                state = self._highlight_block(block, state)
+                changed = state != old_state
+                force -= 1
+            elif deadline is None:
+                # 行尾状态已收敛，后面的行不受这次编辑影响
+                return
+            else:
+                state = old_state
+            block = block.next()
+
+    def _highlight_block(self, block, state):
+        text = block.text()
+        ranges = []
+        if self.lexer is not None:
+            tokens, state = self.lexer.lex(text, state)
+            for start, length, kind in tokens:
+                fmt = FORMATS.get(kind)
+                if fmt is not None:
+                    format_range = QTextLayout.FormatRange()
+                    format_range.start = start
+                    format_range.length = length
+                    format_range.format = fmt
+                    ranges.append(format_range)
+        else:
+            state = 0
+        layout = block.layout()
+        if ranges or layout.formats():
+            layout.setFormats(ranges)
+            self._mark_dirty(block)
+        block.setUserState(state)
+        return state
+
+    def _mark_dirty(self, block):
+        # 记录格式发生变化的范围，一轮处理结束后只通知文档一次
+        start = block.position()
+        end = start + block.length()
+        if self._dirty is None:
+            self._dirty = [start, end]
+        else:
+            self._dirty[0] = min(self._dirty[0], start)
+            self._dirty[1] = max(self._dirty[1], end)
+
+    def _flush_dirty(self):
+        if self._dirty is None:
+            return
+        start, end = self._dirty
+        self._dirty = None
+        self._applying = True
+        try:
+            self.document.markContentsDirty(start, end - start)
+        finally:
+            self._applying = False
+
+    def _defer(self, block_number):
+        self._frontier = block_number if self._frontier is None else min(self._frontier, block_number)
+        self._idle.start()
+
+    def _continue(self):
+        # 空闲时从最早的未处理行继续，每次只用一小段时间
+        if self._frontier is None:
+            return
+        block = self.document.findBlockByNumber(self._frontier)
+        self._frontier = None
+        while block.previous().isValid() and block.previous().userState() == UNHIGHLIGHTED:
+            block = block.previous()
+        if block.isValid():
+            self._highlight_from(block, self.document.blockCount(), deadline=time.perf_counter() + IDLE_BUDGET)
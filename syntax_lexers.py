@@ -0,0 +1,127 @@
+import re
+
+# 状态 0 表示行尾处于普通代码中；大于 0 表示停在第 n 个跨行结构（多行字符串、块注释）内部
+
+
+class LineLexer:
+    """基于正则的逐行词法分析器
+
+    rules: [(kind, pattern)]，按顺序尝试；multiline: [(kind, open_pattern, close_pattern)]，
+    匹配到 open 后在后续文本中寻找 close，找不到时该行以状态 n 结束。
+    lex() 只依赖“上一行的结束状态”，所以编辑后只需重新分析状态发生变化的行。
+    """
+
+    def __init__(self, rules, multiline=()):
+        self.multiline = [(kind, re.compile(close)) for kind, _, close in multiline]
+        parts = [f"(?P<ml{i}>{opening})" for i, (_, opening, _) in enumerate(multiline)]
+        self._kinds = {}
+        for i, (kind, pattern) in enumerate(rules):
+            parts.append(f"(?P<r{i}>{pattern})")
+            self._kinds[f"r{i}"] = kind
+        self._master = re.compile("|".join(parts))
+
+    def lex(self, text, state=0):
+        """返回 ([(起始位置, 长度, 类型)], 行尾状态)"""
+        tokens = []
+        pos = 0
+        if state:
+            kind, close = self.multiline[state - 1]
+            match = close.search(text)
+            if match is None:
+                return [(0, len(text), kind)] if text else [], state
+            tokens.append((0, match.end(), kind))
+            pos = match.end()
+        while True:
+            match = self._master.search(text, pos)
+            if match is None:
+                return tokens, 0
+            name = match.lastgroup
+            start = match.start()
+            if name.startswith("ml"):
+                index = int(name[2:])
+                kind, close = self.multiline[index]
+                end_match = close.search(text, match.end())
+                if end_match is None:
+                    tokens.append((start, len(text) - start, kind))
+                    return tokens, index + 1
+                tokens.append((start, end_match.end() - start, kind))
+                pos = end_match.end()
+                continue
+            if match.end() > start:
+                tokens.append((start, match.end() - start, self._kinds[name]))
+            pos = max(match.end(), pos + 1)
+
+
+def _words(words):
+    return r"\b(?:" + "|".join(words.split()) + r")\b"
+
+
+NUMBER = r"\b(?:0[xX][0-9a-fA-F_]+|\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?[jJlLfFdD]?)\b"
+
+PYTHON = LineLexer(
+    rules=[
+        ("comment", r"#.*"),
+        ("string", r"""[rRbBfFuU]{0,2}(?:"(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?)"""),
+        ("decorator", r"@[\w.]+"),
+        ("definition", r"(?<=\bdef\s)\w+|(?<=\bclass\s)\w+"),
+        ("keyword", _words(
+            "False None True and as assert async await break class continue def del elif else except "
+            "finally for from global if import in is lambda nonlocal not or pass raise return try while with yield"
+        )),
+        ("builtin", _words(
+            "self cls print len range open int str float bool list dict set tuple object super isinstance "
+            "enumerate zip map filter sorted min max sum any all repr type Exception"
+        )),
+        ("number", NUMBER),
+    ],
+    multiline=[
+        ("string", r"""[rRbBfFuU]{0,2}'''""", r"'''"),
+        ("string", r'''[rRbBfFuU]{0,2}"""''', r'"""'),
+    ],
+)
+
+JAVA = LineLexer(
+    rules=[
+        ("comment", r"//.*"),
+        ("string", r'"(?:[^"\\]|\\.)*"?' + r"|'(?:[^'\\]|\\.)*'?"),
+        ("decorator", r"@\w+"),
+        ("definition", r"(?<=\bclass\s)\w+|(?<=\binterface\s)\w+|(?<=\benum\s)\w+"),
+        ("keyword", _words(
+            "abstract assert boolean break byte case catch char class const continue default do double else enum "
+            "extends final finally float for goto if implements import instanceof int interface long native new "
+            "package private protected public return short static strictfp super switch synchronized this throw "
+            "throws transient try var void volatile while true false null record"
+        )),
+        ("builtin", _words("String Object Integer Long Double Boolean System Math List Map Set ArrayList HashMap")),
+        ("number", NUMBER),
+    ],
+    multiline=[
+        ("comment", r"/\*", r"\*/"),
+        ("string", r'"""', r'"""'),
+    ],
+)
+
+BASH = LineLexer(
+    rules=[
+        ("comment", r"(?:(?<=\s)|^)#.*"),
+        ("string", r'"(?:[^"\\]|\\.)*"?' + r"|'[^']*'?"),
+        ("variable", r"\$\{[^}]*\}?|\$\w+|\$[@#?$!*0-9-]"),
+        ("keyword", _words(
+            "if then else elif fi for while until do done case esac function in select return local export "
+            "readonly declare unset break continue exit"
+        )),
+        ("builtin", _words("echo printf cd pwd read source eval exec set shift test trap alias cat grep sed awk")),
+        ("number", r"\b\d+\b"),
+    ],
+)
+
+# code_type -> 词法分析器；txt 等未知类型不做高亮
+LEXERS = {
+    "python": PYTHON,
+    "java": JAVA,
+    "bash": BASH,
+}
+
+
+def get_lexer(code_type):
+    return LEXERS.get(code_type)
@@ -0,0 +1,90 @@
+import os
+import threading
+
+from file_utils import iter_projects
+
+
+class TagIndex:
+    """标签索引：tag -> {(项目名, 文件名)}
+
+    由 MetadataStore 在每次读入或写入某个项目的元数据时调用 update_project，
+    与上一次记录的标签做差异对比，只改动受影响的标签；监听者收到变化的 {tag: count}，
+    count 为 0 表示该标签已不存在。
+    """
+
+    def __init__(self):
+        self._tags = {}
+        # (项目名, 文件名) -> frozenset(tags)
+        self._snippet_tags = {}
+        # 项目名 -> set(文件名)，用于识别从 metadata.json 中被移除的片段
+        self._project_snippets = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        # 构建期间合并所有变化，结束时只通知一次
+        self._batch = None
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def build(self, code_dir, metadata_store):
+        """从所有项目的元数据构建索引（之后由元数据写入增量更新）"""
+        with self._lock:
+            self._batch = set()
+        try:
+            for _, project_path in iter_projects(code_dir):
+                # MetadataStore.get 首次解析时也会通知 update_project，重复调用不会产生变化
+                self.update_project(project_path, metadata_store.get(project_path))
+        finally:
+            with self._lock:
+                changed, self._batch = self._batch, None
+                counts = {tag: len(self._tags.get(tag, ())) for tag in changed}
+            self._emit(counts)
+
+    def update_project(self, project_path, metadata):
+        project_name = os.path.basename(str(project_path))
+        changed = set()
+        with self._lock:
+            old_names = self._project_snippets.get(project_name, set())
+            new_names = set(metadata)
+            for filename in old_names | new_names:
+                key = (project_name, filename)
+                old_tags = self._snippet_tags.get(key, frozenset())
+                new_tags = frozenset(tag for tag in metadata.get(filename, {}).get("tags", []) if tag)
+                if old_tags == new_tags:
+                    continue
+                for tag in old_tags - new_tags:
+                    snippets = self._tags[tag]
+                    snippets.discard(key)
+                    if not snippets:
+                        del self._tags[tag]
+                    changed.add(tag)
+                for tag in new_tags - old_tags:
+                    self._tags.setdefault(tag, set()).add(key)
+                    changed.add(tag)
+                if new_tags:
+                    self._snippet_tags[key] = new_tags
+                else:
+                    self._snippet_tags.pop(key, None)
+            self._project_snippets[project_name] = new_names
+            if self._batch is not None:
+                self._batch |= changed
+                return
+            counts = {tag: len(self._tags.get(tag, ())) for tag in changed}
+        self._emit(counts)
+
+    def _emit(self, counts):
+        if counts:
+            for callback in self._listeners:
+                callback(counts)
+
+    def remove_project(self, project_path):
+        self.update_project(project_path, {})
+
+    def counts(self):
+        with self._lock:
+            return {tag: len(snippets) for tag, snippets in self._tags.items()}
+
+    def snippets_for(self, tag):
+        """返回带有该标签的 [(项目名, 文件名)]"""
+        with self._lock:
+            return sorted(self._tags.get(tag, ()))
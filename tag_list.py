@@ -0,0 +1,70 @@
+import bisect
+
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex
+
+TagRole = Qt.UserRole + 1
+# 一次变化的标签超过这个数量时整体重置模型，比逐行插入更快
+RESET_THRESHOLD = 64
+
+
+class TagListModel(QAbstractListModel):
+    """按名称排序的标签列表，显示 “🏷️ 标签 (数量)”
+
+    update() 只插入、删除或更新变化的标签行；只有一次变化很多标签（如首次构建）时才整体重置。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tags = []
+        self._counts = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._tags)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._tags):
+            return None
+        tag = self._tags[index.row()]
+        if role == Qt.DisplayRole:
+            return f"🏷️ {tag} ({self._counts[tag]})"
+        if role == TagRole:
+            return tag
+        return None
+
+    def update(self, counts):
+        """counts: {tag: count}，count 为 0 表示删除该标签"""
+        if len(counts) > RESET_THRESHOLD:
+            self.beginResetModel()
+            for tag, count in counts.items():
+                if count:
+                    self._counts[tag] = count
+                else:
+                    self._counts.pop(tag, None)
+            self._tags = sorted(self._counts)
+            self.endResetModel()
+            return
+        for tag, count in counts.items():
+            row = bisect.bisect_left(self._tags, tag)
+            exists = row < len(self._tags) and self._tags[row] == tag
+            if count == 0:
+                if exists:
+                    self.beginRemoveRows(QModelIndex(), row, row)
+                    del self._tags[row]
+                    del self._counts[tag]
+                    self.endRemoveRows()
+            elif exists:
+                if self._counts[tag] != count:
+                    self._counts[tag] = count
+                    index = self.index(row)
+                    self.dataChanged.emit(index, index)
+            else:
+                self.beginInsertRows(QModelIndex(), row, row)
+                self._tags.insert(row, tag)
+                self._counts[tag] = count
+                self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._tags = []
+        self._counts = {}
+        self.endResetModel()
@@ -0,0 +1,52 @@
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QFont
+from PySide6.QtWidgets import QLabel
+
+from tracing import tracer
+
+# 刷新统计的间隔
+REFRESH_MS = 1000
+
+
+class TraceOverlay(QLabel):
+    """浮在窗口右上角的半透明面板，显示每个 span 最近的 p50/p95 耗时
+
+    显示时自动开启追踪；不拦截鼠标事件，不影响下面的控件。
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        font = QFont("monospace")
+        font.setStyleHint(QFont.Monospace)
+        font.setPointSize(9)
+        self.setFont(font)
+        self.setTextFormat(Qt.PlainText)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet("QLabel { background: rgba(0, 0, 0, 170); color: #E0E0E0; padding: 6px; border-radius: 4px; }")
+        self._timer = QTimer(self)
+        self._timer.setInterval(REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def toggle(self):
+        if self.isVisible():
+            self._timer.stop()
+            self.hide()
+            return
+        tracer.enable()
+        self.refresh()
+        self.show()
+        self.raise_()
+        self._timer.start()
+
+    def refresh(self):
+        stats = tracer.stats()
+        lines = [f"{'span':<26}{'次数':>6}{'p50 ms':>10}{'p95 ms':>10}"]
+        for name, s in sorted(stats.items(), key=lambda item: item[1]["p95"], reverse=True):
+            lines.append(f"{name:<26}{s['count']:>6}{s['p50']:>10.2f}{s['p95']:>10.2f}")
+        if not stats:
+            lines.append("（还没有记录）")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        parent = self.parentWidget()
+        self.move(parent.width() - self.width() - 10, 10)
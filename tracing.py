@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+# 最多保留的事件数，超出后丢弃最早的
+MAX_EVENTS = 200000
+# 每个 span 用于统计 p50/p95 的最近耗时个数
+STATS_WINDOW = 1000
+
+
+class _NullSpan:
+    """未开启追踪时 span() 返回的空对象，进出都不做任何事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "started")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, self.started, time.perf_counter_ns() - self.started, self.args)
+        return False
+
+    def set(self, **args):
+        """补充在 span 结束前才知道的参数（如读入的字节数）"""
+        self.args.update(args)
+
+
+class Tracer:
+    """记录命名的耗时区间（span），可导出为 Chrome trace（chrome://tracing、Perfetto 可直接打开）
+
+    关闭时 span() 只做一次属性判断并返回共享的空对象，开销可以忽略。
+    记录时各线程直接向 deque 追加，不加锁。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._origin = time.perf_counter_ns()
+        self._events = deque(maxlen=MAX_EVENTS)
+        # name -> 最近 STATS_WINDOW 次耗时（纳秒）
+        self._durations = {}
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def clear(self):
+        self._events.clear()
+        self._durations = {}
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def instant(self, name, **args):
+        """没有持续时间的事件，例如“文件在外部被修改”"""
+        if self.enabled:
+            self._events.append((name, time.perf_counter_ns(), None, threading.get_ident(), args))
+
+    def record(self, name, started_ns, duration_ns, args=None):
+        self._events.append((name, started_ns, duration_ns, threading.get_ident(), args))
+        durations = self._durations.get(name)
+        if durations is None:
+            durations = self._durations.setdefault(name, deque(maxlen=STATS_WINDOW))
+        durations.append(duration_ns)
+
+    # ---- 统计和导出 ----
+    def stats(self):
+        """每个 span 最近的耗时统计（毫秒）：{name: {"count", "p50", "p95", "max"}}"""
+        result = {}
+        for name, durations in list(self._durations.items()):
+            ordered = sorted(durations)
+            if not ordered:
+                continue
+            last = len(ordered) - 1
+            result[name] = {
+                "count": len(ordered),
+                "p50": ordered[last // 2] / 1e6,
+                "p95": ordered[round(last * 0.95)] / 1e6,
+                "max": ordered[-1] / 1e6,
+            }
+        return result
+
+    def chrome_trace(self):
+        """Chrome trace 事件格式（时间单位为微秒）"""
+        pid = os.getpid()
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        events = []
+        seen = set()
+        for name, started_ns, duration_ns, tid, args in list(self._events):
+            event = {"name": name, "ts": (started_ns - self._origin) / 1000, "pid": pid, "tid": tid}
+            if duration_ns is None:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=duration_ns / 1000)
+            if args:
+                event["args"] = {key: value if isinstance(value, (int, float, bool)) else str(value)
+                                 for key, value in args.items()}
+            events.append(event)
+            seen.add(tid)
+        for tid in seen:
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": threads.get(tid, str(tid))}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        """写出 Chrome trace JSON 文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+
+# 进程内共享的追踪器；设置环境变量 CODECAPSULE_TRACE=1 时从启动起就开启
+tracer = Tracer()
+tracer.enable(bool(os.environ.get("CODECAPSULE_TRACE")))
+span = tracer.span
+instant = tracer.instant
@@ -0,0 +1,173 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, Signal
+
+from file_utils import is_internal_name
+from snippet_store import scan_project
+from tracing import span
+
+# 一次文件系统变化的差异：新增/删除的文件夹名，新增/删除/修改的 (项目路径, 文件名)，
+# 以及发生变化且仍存在的项目路径
+WorkspaceDelta = namedtuple("WorkspaceDelta", "folders_added folders_removed added removed modified projects")
+
+# 每批发送给界面的文件夹数量
+FOLDER_BATCH_SIZE = 100
+# 每扫描多少个项目报告一次进度
+PROGRESS_INTERVAL = 20
+
+
+class WorkspaceScanner(QObject):
+    """在后台线程扫描主文件夹，分批把结果发回界面
+
+    folders_found 分批给出项目文件夹名；深度扫描时再逐个扫描项目，通过 project_scanned
+    给出每个项目的片段列表，progress 报告进度。每次新的扫描都会让上一次扫描自动取消。
+    最近一次的扫描结果保存在 folders / projects 中，切换文件夹时可直接使用。
+    """
+    scan_started = Signal(int)                 # generation
+    folders_found = Signal(int, list)          # generation, [folder_name]
+    project_scanned = Signal(str, list)        # project_path, [SnippetEntry]
+    progress = Signal(int, int)                # done, total
+    finished = Signal(int, list)               # generation, 全部 folder_name
+    changes_found = Signal(object)             # WorkspaceDelta
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="workspace-scan")
+        # 单个项目的扫描单独排队，不必等待整个主文件夹的深度扫描
+        self._project_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="project-scan")
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.folders = []
+        # project_path -> [SnippetEntry]
+        self.projects = {}
+
+    def scan(self, code_dir, deep=True):
+        """开始新的扫描并返回其编号；deep 为 False 时只列出项目文件夹"""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        self._executor.submit(self._scan, generation, str(code_dir), deep)
+        return generation
+
+    def scan_project_async(self, project_path):
+        """在后台重新扫描单个项目，完成后发出 project_scanned"""
+        self._project_executor.submit(self._scan_one, project_path)
+
+    def scan_changes(self, code_dir, paths):
+        """只重新扫描发生变化的目录，与缓存对比后发出 changes_found"""
+        self._project_executor.submit(self._scan_changes, str(code_dir), set(paths))
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=True)
+        self._project_executor.shutdown(wait=True)
+
+    def _cancelled(self, generation):
+        return generation != self._generation
+
+    def _scan(self, generation, code_dir, deep):
+        with span("scan_workspace", deep=deep):
+            self._scan_workspace(generation, code_dir, deep)
+
+    def _scan_workspace(self, generation, code_dir, deep):
+        self.scan_started.emit(generation)
+        folders = []
+        batch = []
+        try:
+            with os.scandir(code_dir) as it:
+                for entry in it:
+                    if self._cancelled(generation):
+                        return
+                    if is_internal_name(entry.name) or not entry.is_dir():
+                        continue
+                    folders.append(entry.name)
+                    batch.append(entry.name)
+                    if len(batch) >= FOLDER_BATCH_SIZE:
+                        self.folders_found.emit(generation, batch)
+                        batch = []
+        except FileNotFoundError as e:
+            print(f"扫描主文件夹失败: {e}")
+        if batch:
+            self.folders_found.emit(generation, batch)
+        self.folders = folders
+
+        if deep:
+            total = len(folders)
+            for done, folder in enumerate(folders, 1):
+                if self._cancelled(generation):
+                    return
+                self._scan_one(os.path.join(code_dir, folder))
+                if done % PROGRESS_INTERVAL == 0 or done == total:
+                    self.progress.emit(done, total)
+        self.finished.emit(generation, folders)
+
+    def _scan_one(self, project_path):
+        try:
+            with span("scan_project", project=os.path.basename(project_path)):
+                entries = scan_project(project_path)
+        except (FileNotFoundError, NotADirectoryError):
+            self.projects.pop(project_path, None)
+            return
+        self.projects[project_path] = entries
+        self.project_scanned.emit(project_path, entries)
+
+    def _scan_changes(self, code_dir, paths):
+        root = os.path.normpath(code_dir)
+        projects = set()
+        root_changed = False
+        for path in paths:
+            path = os.path.normpath(path)
+            if path == root:
+                root_changed = True
+            elif os.path.dirname(path) == root and not is_internal_name(os.path.basename(path)):
+                projects.add(path)
+
+        folders_added, folders_removed = [], []
+        if root_changed:
+            try:
+                with os.scandir(root) as it:
+                    folders = [entry.name for entry in it if not is_internal_name(entry.name) and entry.is_dir()]
+            except FileNotFoundError:
+                folders = []
+            old_folders = set(self.folders)
+            new_folders = set(folders)
+            folders_added = [folder for folder in folders if folder not in old_folders]
+            folders_removed = [folder for folder in self.folders if folder not in new_folders]
+            self.folders = folders
+            projects.update(os.path.join(root, folder) for folder in folders_added)
+            projects.difference_update(os.path.join(root, folder) for folder in folders_removed)
+
+        added, removed, modified = [], [], []
+        for folder in folders_removed:
+            project_path = os.path.join(root, folder)
+            removed.extend((project_path, entry.filename) for entry in self.projects.pop(project_path, []))
+        for project_path in sorted(projects):
+            old = {entry.filename: entry.mtime for entry in self.projects.get(project_path, [])}
+            try:
+                entries = scan_project(project_path)
+            except (FileNotFoundError, NotADirectoryError):
+                # 项目文件夹已被删除，等主文件夹的事件移除它
+                removed.extend((project_path, filename) for filename in old)
+                self.projects.pop(project_path, None)
+                continue
+            self.projects[project_path] = entries
+            for entry in entries:
+                mtime = old.pop(entry.filename, None)
+                if mtime is None:
+                    added.append((project_path, entry.filename))
+                elif mtime != entry.mtime:
+                    modified.append((project_path, entry.filename))
+            removed.extend((project_path, filename) for filename in old)
+
+        existing = sorted(project for project in projects if project in self.projects)
+        if folders_added or folders_removed or added or removed or modified or existing:
+            self.changes_found.emit(
+                WorkspaceDelta(folders_added, folders_removed, added, removed, modified, existing)
+            )
@@ -0,0 +1,100 @@
+import os
+
+from PySide6.QtCore import QObject, QTimer, QElapsedTimer, QFileSystemWatcher
+
+from file_utils import METADATA_FILENAME, METADATA_JOURNAL_FILENAME
+
+# 最后一个事件之后等待多久再处理，连续的事件（如 git checkout）合并成一次
+COALESCE_MS = 200
+# 事件持续不断时最多等待这么久也要处理一次
+MAX_DELAY_MS = 2000
+# 当前项目中最多单独监听的文件数
+MAX_FILE_WATCHES = 2000
+
+
+class WorkspaceWatcher(QObject):
+    """监听主文件夹、所有项目文件夹以及当前项目中的文件
+
+    目录事件只记录“哪个目录脏了”，合并一段时间后交给 WorkspaceScanner.scan_changes
+    在后台计算新增、删除和修改的文件夹与片段，结果通过扫描器的 changes_found 发出。
+    目录监听在 Linux 上不会报告文件内容被原地修改，所以当前项目的片段和 metadata.json
+    另外按文件监听。
+    """
+
+    def __init__(self, scanner, parent=None):
+        super().__init__(parent)
+        self.scanner = scanner
+        self.code_dir = None
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_path_changed)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        self._dirty = set()
+        self._since = QElapsedTimer()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(COALESCE_MS)
+        self._timer.timeout.connect(self.flush)
+
+        scanner.folders_found.connect(lambda generation, folders: self._watch_folders(folders))
+        scanner.changes_found.connect(self._on_changes)
+
+    def set_code_dir(self, code_dir):
+        """切换主文件夹：清空所有监听，项目文件夹随扫描结果逐批加入"""
+        paths = self._watcher.directories() + self._watcher.files()
+        if paths:
+            self._watcher.removePaths(paths)
+        self._dirty.clear()
+        self._timer.stop()
+        self.code_dir = str(code_dir)
+        self._watcher.addPath(self.code_dir)
+
+    def stop(self):
+        """关闭窗口时停止监听；之后到达的事件和计时都不再触发扫描"""
+        paths = self._watcher.directories() + self._watcher.files()
+        if paths:
+            self._watcher.removePaths(paths)
+        self._dirty.clear()
+        self._timer.stop()
+        self.code_dir = None
+
+    def watch_files(self, project_path, filenames):
+        """单独监听当前项目中的文件，替换之前的文件监听"""
+        files = self._watcher.files()
+        if files:
+            self._watcher.removePaths(files)
+        if not project_path or not self.code_dir:
+            return
+        paths = [os.path.join(project_path, name) for name in (METADATA_FILENAME, METADATA_JOURNAL_FILENAME)]
+        paths += [os.path.join(project_path, filename) for filename in filenames[:MAX_FILE_WATCHES]]
+        paths = [path for path in paths if os.path.isfile(path)]
+        # 空列表会让 Qt 在 stderr 上打印警告
+        if paths:
+            self._watcher.addPaths(paths)
+
+    def flush(self):
+        """把积累的脏目录交给扫描器"""
+        self._timer.stop()
+        if self._dirty and self.code_dir:
+            dirty, self._dirty = self._dirty, set()
+            self.scanner.scan_changes(self.code_dir, dirty)
+
+    def _on_path_changed(self, path):
+        if not self._dirty:
+            self._since.start()
+        self._dirty.add(path)
+        # 每个新事件都重新计时，但总等待不超过 MAX_DELAY_MS
+        if not self._timer.isActive() or self._since.elapsed() < MAX_DELAY_MS:
+            self._timer.start()
+
+    def _on_file_changed(self, path):
+        # 原子替换（写临时文件再重命名）会让监听失效，文件仍存在时重新监听
+        if os.path.isfile(path) and path not in self._watcher.files():
+            self._watcher.addPath(path)
+        self._on_path_changed(os.path.dirname(path))
+
+    def _watch_folders(self, folders):
+        if self.code_dir and folders:
+            self._watcher.addPaths([os.path.join(self.code_dir, folder) for folder in folders])
+
+    def _on_changes(self, delta):
+        self._watch_folders(delta.folders_added)